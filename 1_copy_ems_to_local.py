@@ -1,9 +1,19 @@
 import psycopg2
 import pymysql
 import json
+import os
 import re
+import tempfile
+import time
 from psycopg2 import sql
 
+from mysql_bulk_load import LOAD_BACKENDS, load_file, load_rows
+from schema_cache import (build_create_sql, ensure_cache_table, is_cache_fresh, load_schema_cache, prepare_table,
+                          save_schema_cache)
+
+# 数据迁移方式：batch 为原有的整表读取 + 小批量插入；stream 为服务端游标/COPY 流式迁移
+TRANSFER_MODES = ('batch', 'stream')
+
 
 def clean_name(name):
     """清理名称中的特殊字符"""
@@ -76,26 +86,101 @@ def get_table_description(pg_conn, table_schema, table_name):
         return cur.fetchall()
 
 
-def copy_table(pg_conn, mysql_conn, src_schema, src_table, dest_table, col_mapping=None):
-    """复制表结构和数据，支持列名映射"""
+def build_select_query(src_schema, src_table, columns):
+    """按源表列顺序构建显式列名的查询（避免 SELECT * 与缓存的表结构不一致）"""
+    return sql.SQL("SELECT {} FROM {}.{}").format(
+        sql.SQL(', ').join([sql.Identifier(col[0]) for col in columns]),
+        sql.Identifier(src_schema),
+        sql.Identifier(src_table)
+    )
+
+
+def build_copy_query(src_schema, src_table, columns):
+    """构建 COPY 导出语句：布尔列转为 0/1，使文本输出可被 MySQL LOAD DATA 直接导入"""
+    select_items = []
+    for col in columns:
+        if col[1].lower() in ('boolean', 'bool'):
+            select_items.append(sql.SQL("{}::int").format(sql.Identifier(col[0])))
+        else:
+            select_items.append(sql.Identifier(col[0]))
+    return sql.SQL("COPY (SELECT {} FROM {}.{}) TO STDOUT WITH (FORMAT text, ENCODING 'UTF8')").format(
+        sql.SQL(', ').join(select_items),
+        sql.Identifier(src_schema),
+        sql.Identifier(src_table)
+    )
+
+
+def transfer_via_copy(pg_conn, mysql_cur, src_schema, src_table, dest_table, columns, mapped_col_names):
+    """
+    COPY ... TO STDOUT 导出为临时文件后直接 LOAD DATA 导入，返回导入行数。
+    PostgreSQL 文本格式（制表符分隔、\\N 表示 NULL、反斜杠转义）与 LOAD DATA 默认格式一致，无需逐行解析。
+    """
+    fd, path = tempfile.mkstemp(prefix='ems_copy_', suffix='.tsv')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            with pg_conn.cursor() as pg_cur:
+                pg_cur.copy_expert(build_copy_query(src_schema, src_table, columns), fp)
+                row_count = pg_cur.rowcount
+        load_file(mysql_cur, dest_table, mapped_col_names, path)
+        return row_count
+    finally:
+        os.remove(path)
+
+
+def transfer_via_cursor(pg_conn, mysql_cur, src_schema, src_table, dest_table, columns, mapped_col_names,
+                        batch_size, load_backend):
+    """使用命名（服务端）游标按 batch_size 分批读取，逐批写入 MySQL，返回写入行数"""
+    placeholders = ', '.join(['%s'] * len(mapped_col_names))
+    insert_sql = f"INSERT INTO `{dest_table}` ({', '.join([f'`{c}`' for c in mapped_col_names])}) VALUES ({placeholders})"
+
+    total = 0
+    with pg_conn.cursor(name=f"ems_stream_{src_table}") as pg_cur:
+        pg_cur.itersize = batch_size
+        pg_cur.execute(build_select_query(src_schema, src_table, columns))
+        while True:
+            batch = pg_cur.fetchmany(batch_size)
+            if not batch:
+                break
+            if load_backend == 'load_data':
+                load_rows(mysql_cur, dest_table, mapped_col_names, batch)
+            else:
+                mysql_cur.executemany(insert_sql, batch)
+            total += len(batch)
+            print(f"已写入 {total} 行到 {dest_table}")
+    return total
+
+
+def copy_table(pg_conn, mysql_conn, src_schema, src_table, dest_table, col_mapping=None, load_backend='insert',
+               transfer_mode='batch', batch_size=10000, schema_cache=False, schema_cache_ttl_hours=0):
+    """
+    复制表结构和数据，支持列名映射。
+    load_backend='load_data' 时使用 LOAD DATA LOCAL INFILE 批量导入；
+    transfer_mode='stream' 时流式迁移：配合 load_data 使用 COPY TO STDOUT 直接导入，
+    否则使用服务端游标按 batch_size 分批读写，内存占用与表大小无关。
+    schema_cache=True 时缓存表结构：DDL 未变化时 TRUNCATE 重载，变化时按差异 ALTER，
+    缓存有效期（schema_cache_ttl_hours）内不再查询源库的 information_schema。
+    """
     try:
         print(f"开始迁移表: {src_schema}.{src_table} -> {dest_table}")
 
-        # 获取源表结构
-        columns = get_table_description(pg_conn, src_schema, src_table)
+        mysql_cur = mysql_conn.cursor()
+
+        # 获取源表结构（表结构缓存有效期内直接使用缓存）
+        source_key = f"ems/{src_schema}.{src_table}"
+        cache = load_schema_cache(mysql_cur, source_key) if schema_cache else None
+        schema_from_cache = is_cache_fresh(cache, schema_cache_ttl_hours)
+        if schema_from_cache:
+            columns = cache['source_columns']
+        else:
+            columns = get_table_description(pg_conn, src_schema, src_table)
 
         if not columns:
             print(f"警告: 没有找到 {src_schema}.{src_table} 的列定义，跳过该表")
             return
 
-        # 创建目标表
-        mysql_cur = mysql_conn.cursor()
-
-        # 构建CREATE TABLE语句
-        create_sql = f"CREATE TABLE IF NOT EXISTS `{dest_table}` ("
-
-        # 列处理：应用列名映射或默认清理
+        # 列处理：应用列名映射或默认清理，并生成目标列定义
         mapped_columns = []
+        column_defs = {}
         for col in columns:
             orig_name = col[0]
             # 应用列名映射或清理名称
@@ -107,42 +192,61 @@ def copy_table(pg_conn, mysql_conn, src_schema, src_table, dest_table, col_mappi
 
             # 特殊处理：JSON类型不需要指定COLLATE
             if 'JSON' in mysql_type.upper():
-                create_sql += f"\n  `{final_name}` {mysql_type},"
+                column_defs[final_name] = mysql_type
             else:
-                create_sql += f"\n  `{final_name}` {mysql_type} COLLATE utf8mb4_0900_ai_ci,"
+                column_defs[final_name] = f"{mysql_type} COLLATE utf8mb4_0900_ai_ci"
 
-        # 完成CREATE TABLE语句，指定默认字符集和校对规则
-        create_sql = create_sql.rstrip(',') + "\n) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;"
-
-        # 执行创建表操作
-        mysql_cur.execute(f"DROP TABLE IF EXISTS `{dest_table}`;")
-        mysql_cur.execute(create_sql)
-        print(f"表 {dest_table} 创建成功")
+        # 准备目标表：启用缓存时按 DDL 差异 TRUNCATE/ALTER，否则删表重建（指定默认字符集和校对规则）
+        if schema_cache:
+            action = prepare_table(mysql_cur, dest_table, column_defs, cache=cache)
+            print(f"表 {dest_table} 准备完成 ({action})")
+        else:
+            mysql_cur.execute(f"DROP TABLE IF EXISTS `{dest_table}`;")
+            mysql_cur.execute(build_create_sql(dest_table, column_defs))
+            print(f"表 {dest_table} 创建成功")
 
         # 复制数据
-        pg_cur = pg_conn.cursor()
-        pg_cur.execute(sql.SQL("SELECT * FROM {}.{}").format(
-            sql.Identifier(src_schema),
-            sql.Identifier(src_table)
-        ))
-
-        rows = pg_cur.fetchall()
-        if rows:
-            # 构建映射后的列名列表
-            mapped_col_names = [mc[1] for mc in mapped_columns]
-
-            placeholders = ', '.join(['%s'] * len(mapped_col_names))
-            insert_sql = f"INSERT INTO `{dest_table}` ({', '.join([f'`{c}`' for c in mapped_col_names])}) VALUES ({placeholders})"
-
-            # 分批次插入数据
-            batch_size = 100
-            for i in range(0, len(rows), batch_size):
-                batch = rows[i:i + batch_size]
-                mysql_cur.executemany(insert_sql, batch)
-                print(f"插入 {len(batch)} 行到 {dest_table}")
-
-            mysql_conn.commit()
-            print(f"共插入 {len(rows)} 行到 {dest_table}")
+        mapped_col_names = [mc[1] for mc in mapped_columns]
+        start_time = time.time()
+
+        # bytea 的 COPY 文本输出为十六进制转义，无法直接导入 BLOB 列，此时改用游标读取
+        has_bytea = any(col[1].lower() == 'bytea' for col in columns)
+
+        if transfer_mode == 'stream' and load_backend == 'load_data' and not has_bytea:
+            row_count = transfer_via_copy(pg_conn, mysql_cur, src_schema, src_table, dest_table,
+                                          columns, mapped_col_names)
+        elif transfer_mode == 'stream':
+            row_count = transfer_via_cursor(pg_conn, mysql_cur, src_schema, src_table, dest_table,
+                                            columns, mapped_col_names, batch_size, load_backend)
+        else:
+            pg_cur = pg_conn.cursor()
+            pg_cur.execute(build_select_query(src_schema, src_table, columns))
+
+            rows = pg_cur.fetchall()
+            row_count = len(rows)
+            if rows:
+                if load_backend == 'load_data':
+                    # 经临时文件一次性 LOAD DATA 导入
+                    load_rows(mysql_cur, dest_table, mapped_col_names, rows)
+                else:
+                    placeholders = ', '.join(['%s'] * len(mapped_col_names))
+                    insert_sql = f"INSERT INTO `{dest_table}` ({', '.join([f'`{c}`' for c in mapped_col_names])}) VALUES ({placeholders})"
+
+                    # 分批次插入数据
+                    batch_size = 100
+                    for i in range(0, len(rows), batch_size):
+                        batch = rows[i:i + batch_size]
+                        mysql_cur.executemany(insert_sql, batch)
+                        print(f"插入 {len(batch)} 行到 {dest_table}")
+
+        if schema_cache and (action != 'truncate' or not schema_from_cache):
+            save_schema_cache(mysql_cur, source_key, dest_table, columns, column_defs,
+                              refreshed_at=cache['refreshed_at'] if schema_from_cache else None)
+
+        mysql_conn.commit()
+        elapsed = time.time() - start_time
+        print(f"共插入 {row_count} 行到 {dest_table}, 耗时 {elapsed:.2f}秒, "
+              f"吞吐 {row_count / elapsed if elapsed > 0 else 0:.0f} 行/秒")
 
         print(f"表 {src_schema}.{src_table} -> {dest_table} 迁移完成\n")
 
@@ -163,6 +267,23 @@ def main():
     pg_config.setdefault('port', 5432)
     mysql_config.setdefault('port', 3306)
 
+    # 本地库写入方式：insert（默认）或 load_data
+    load_backend = config.get('load_backend', 'insert')
+    if load_backend not in LOAD_BACKENDS:
+        print(f"load_backend 配置无效: {load_backend}，可选值: {', '.join(LOAD_BACKENDS)}")
+        return
+
+    # 迁移方式：batch（默认）或 stream，stream 模式下的分批行数
+    transfer_mode = config.get('transfer_mode', 'batch')
+    if transfer_mode not in TRANSFER_MODES:
+        print(f"transfer_mode 配置无效: {transfer_mode}，可选值: {', '.join(TRANSFER_MODES)}")
+        return
+    batch_size = int(config.get('batch_size', 10000))
+
+    # 表结构缓存及其有效期（小时，0 表示每次都查询源库表结构）
+    schema_cache = bool(config.get('schema_cache', False))
+    schema_cache_ttl_hours = config.get('schema_cache_ttl_hours', 0)
+
     # 连接数据库前先初始化为None
     pg_conn = None
     mysql_conn = None
@@ -186,8 +307,12 @@ def main():
             user=mysql_config['user'],
             password=mysql_config['password'],
             database=mysql_config['database'],
-            charset='utf8mb4'
+            charset='utf8mb4',
+            local_infile=load_backend == 'load_data'
         )
+        if schema_cache:
+            with mysql_conn.cursor() as cur:
+                ensure_cache_table(cur)
 
         # 定义表映射 - 使用特定的中文表名和列名映射
         table_mappings = [
@@ -211,7 +336,12 @@ def main():
                 mapping['src_schema'],
                 mapping['src_table'],
                 mapping['dest_table'],
-                mapping.get('col_mapping')  # 获取列名映射配置
+                mapping.get('col_mapping'),  # 获取列名映射配置
+                load_backend,
+                transfer_mode,
+                batch_size,
+                schema_cache,
+                schema_cache_ttl_hours
             )
 
     except Exception as e:
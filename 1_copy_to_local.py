@@ -1,9 +1,48 @@
 import pymysql
+import hashlib
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import os
 
+from mysql_bulk_load import LOAD_BACKENDS, load_rows
+from schema_cache import (build_create_sql, ddl_hash, ensure_cache_table, is_cache_fresh, load_schema_cache,
+                          prepare_table, save_schema_cache, table_exists)
+
+
+# 可选同步参数及默认值（可在配置文件顶层覆盖）
+DEFAULT_SYNC_OPTIONS = {
+    'max_workers': 1,      # 基地并发同步数
+    'chunk_size': 5000,    # 流式复制时每批读取/写入的行数
+    'sync_mode': 'full',   # full: 每次全量重建; incremental: 按 update_time 水位增量同步
+    'full_sync_interval_hours': 24,  # 增量模式下全量对账（重建）的周期，用于清理源端硬删除的数据
+    'load_backend': 'insert',  # insert: executemany 参数化写入; load_data: LOAD DATA LOCAL INFILE 批量导入
+    'schema_mode': 'varchar',  # varchar: 统一字符串列; typed: 沿用源表列类型并为关联键建索引
+    'skip_unchanged': False,   # 源表指纹与上次同步一致时跳过该表
+    'fingerprint_method': 'stats',  # stats: 行数 + MAX(update_time); checksum: CHECKSUM TABLE
+    'schema_cache': False,     # 缓存源表结构与目标 DDL，结构未变时 TRUNCATE 重载，变化时按差异 ALTER
+    'schema_cache_ttl_hours': 0,  # 缓存有效期内直接使用缓存的源表结构，不再查询源库（0 表示每次都查询）
+}
+
+# 增量同步使用的水位列与主键列
+WATERMARK_COLUMN = 'update_time'
+KEY_COLUMN = 'id'
+
+# 2_table_aggregator 关联时使用的键列，typed 模式下在目标表上为其建立索引
+JOIN_KEY_COLUMNS = ['id', 'tag_id', 'aggregation_relation_id', 'equipment_id', 'device_id', 'agg_relation_id']
+
+# 需要指定校对规则的字符串类型
+STRING_TYPES = ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'set')
+
+# 本地库中记录各目标表同步水位/指纹的状态表，及其状态列
+STATE_TABLE = '0_同步状态表'
+STATE_COLUMNS = {
+    'watermark': 'VARCHAR(64)',
+    'last_full_sync': 'DATETIME',
+    'fingerprint': 'VARCHAR(128)',
+}
+
 
 def load_config():
     """加载配置文件"""
@@ -12,10 +51,258 @@ def load_config():
         return json.load(f)
 
 
-def sync_table(base_config, common_config, table_mapping, local_db_config):
+def get_sync_options(config):
+    """从配置中读取可选同步参数，未配置的使用默认值"""
+    return {key: config.get(key, default) for key, default in DEFAULT_SYNC_OPTIONS.items()}
+
+
+def to_str_row(row):
+    """将一行数据转换为字符串，确保能插入VARCHAR列"""
+    return tuple(None if value is None else str(value) for value in row)
+
+
+def copy_rows(company_conn, local_cursor, source_table, target_table, columns, chunk_size, base_name,
+              where_sql='', params=None, upsert=False, load_backend='insert', typed=False):
+    """
+    使用无缓冲的服务端游标分块读取源表，并逐块写入目标表。
+    upsert=True 时按唯一键覆盖已有行（增量同步使用）。
+    load_backend='load_data' 时每块经临时文件以 LOAD DATA LOCAL INFILE 导入。
+    typed=True 时按源类型原样写入，否则统一转换为字符串。
+    返回 (复制行数, 本次读取到的最大水位值)
+    """
+    columns_str = ', '.join([f"`{col}`" for col in columns])
+    placeholders = ', '.join(['%s'] * len(columns))
+    insert_sql = f"INSERT INTO `{target_table}` ({columns_str}) VALUES ({placeholders})"
+    if upsert:
+        updates = ', '.join([f"`{col}` = VALUES(`{col}`)" for col in columns if col != KEY_COLUMN])
+        insert_sql += f" ON DUPLICATE KEY UPDATE {updates}"
+
+    watermark_idx = columns.index(WATERMARK_COLUMN) if WATERMARK_COLUMN in columns else None
+    max_watermark = None
+
+    total = 0
+    start_time = time.time()
+    with company_conn.cursor(pymysql.cursors.SSCursor) as stream_cursor:
+        stream_cursor.execute(f"SELECT {columns_str} FROM `{source_table}` {where_sql}", params)
+        while True:
+            rows = stream_cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            if watermark_idx is not None:
+                for row in rows:
+                    value = row[watermark_idx]
+                    if value is not None and (max_watermark is None or value > max_watermark):
+                        max_watermark = value
+            if not typed:
+                rows = [to_str_row(row) for row in rows]
+            if load_backend == 'load_data':
+                load_rows(local_cursor, target_table, columns, rows, replace=upsert)
+            else:
+                local_cursor.executemany(insert_sql, rows)
+            total += len(rows)
+            print(f"[{base_name}]   |- {target_table}: 已写入 {total} 条 ({time.time() - start_time:.2f}秒)")
+    return total, max_watermark
+
+
+def get_column_type(column):
+    """获取 SHOW COLUMNS 结果中的列类型字符串，如 'varchar(64)'"""
+    return column[1].decode() if isinstance(column[1], bytes) else column[1]
+
+
+def get_base_type(column_type):
+    """提取列类型中的基础类型名，如 'varchar(64)' -> 'varchar'"""
+    return column_type.split('(')[0].split()[0].lower()
+
+
+def build_column_definitions(columns, typed=False):
+    """
+    根据源表列信息（SHOW COLUMNS 结果）构建目标表列定义：列名 -> 类型定义。
+    typed=False 时统一使用字符串列；typed=True 时沿用源表列类型。
+    """
+    column_defs = {}
+    for column in columns:
+        column_name = column[0]
+        if typed:
+            column_type = get_column_type(column)
+            if get_base_type(column_type) in STRING_TYPES:
+                column_defs[column_name] = f"{column_type} COLLATE utf8mb4_0900_ai_ci"
+            else:
+                column_defs[column_name] = column_type
+        # 特殊处理 tag_desc 列，使用 TEXT 类型
+        elif column_name == 'tag_desc':
+            column_defs[column_name] = "TEXT COLLATE utf8mb4_0900_ai_ci"
+        else:
+            # 其他列使用 VARCHAR(200) 并指定校对规则
+            column_defs[column_name] = "VARCHAR(200) COLLATE utf8mb4_0900_ai_ci"
+    return column_defs
+
+
+def build_key_definitions(unique_key=None):
+    """构建建表时的索引定义（增量同步依赖 id 唯一键）"""
+    return [f"UNIQUE KEY `uk_{unique_key}` (`{unique_key}`)"] if unique_key else []
+
+
+def add_join_indexes(local_cursor, target_table, columns, unique_key=None):
+    """为目标表上存在的关联键列建立普通索引（数据导入后执行，避免逐行维护索引），返回新建的索引列"""
+    local_cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s",
+        (target_table,)
+    )
+    existing_indexes = {row[0] for row in local_cursor.fetchall()}
+
+    index_columns = []
+    for column in columns:
+        column_name = column[0]
+        if column_name not in JOIN_KEY_COLUMNS or column_name == unique_key:
+            continue
+        # 保留表结构（TRUNCATE 重载）时索引已存在
+        if f"idx_{column_name}" in existing_indexes:
+            continue
+        # TEXT/BLOB 列无法直接建索引，跳过
+        base_type = get_base_type(get_column_type(column))
+        if 'text' in base_type or 'blob' in base_type:
+            continue
+        index_columns.append(column_name)
+
+    if index_columns:
+        index_defs = ', '.join([f"ADD INDEX `idx_{col}` (`{col}`)" for col in index_columns])
+        local_cursor.execute(f"ALTER TABLE `{target_table}` {index_defs}")
+    return index_columns
+
+
+def ensure_state_table(local_cursor):
+    """确保本地同步状态表存在，并补齐后续版本新增的状态列"""
+    column_defs = ',\n        '.join([f"`{col}` {col_type}" for col, col_type in STATE_COLUMNS.items()])
+    local_cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{STATE_TABLE}` (
+        `target_table` VARCHAR(255) NOT NULL PRIMARY KEY,
+        {column_defs},
+        `updated_at` DATETIME
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+    """)
+
+    local_cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s",
+        (STATE_TABLE,)
+    )
+    existing = {row[0] for row in local_cursor.fetchall()}
+    for col, col_type in STATE_COLUMNS.items():
+        if col not in existing:
+            local_cursor.execute(f"ALTER TABLE `{STATE_TABLE}` ADD COLUMN `{col}` {col_type}")
+
+
+def load_sync_state(local_cursor, target_table):
+    """读取目标表的同步状态，不存在时返回 None"""
+    columns = list(STATE_COLUMNS)
+    local_cursor.execute(
+        f"SELECT {', '.join([f'`{col}`' for col in columns])} FROM `{STATE_TABLE}` WHERE `target_table` = %s",
+        (target_table,)
+    )
+    row = local_cursor.fetchone()
+    if not row:
+        return None
+    return dict(zip(columns, row))
+
+
+def save_sync_state(local_cursor, target_table, **fields):
+    """写入目标表的同步状态，只更新传入的字段"""
+    columns = list(fields)
+    # None 与 datetime 原样写入（last_full_sync 为 DATETIME 列），其余水位/指纹转为字符串
+    values = [fields[col] if fields[col] is None or isinstance(fields[col], datetime) else str(fields[col])
+              for col in columns]
+    columns_str = ', '.join([f"`{col}`" for col in ['target_table'] + columns])
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    updates = ', '.join([f"`{col}` = VALUES(`{col}`)" for col in columns + ['updated_at']])
+    local_cursor.execute(
+        f"""
+        INSERT INTO `{STATE_TABLE}` ({columns_str}, `updated_at`)
+        VALUES ({placeholders}, NOW())
+        ON DUPLICATE KEY UPDATE {updates}
+        """,
+        [target_table] + values
+    )
+
+
+def get_table_fingerprint(company_cursor, source_table, column_names, method):
+    """
+    计算源表的轻量指纹，用于判断自上次同步后是否有变化：
+    stats: 行数 + MAX(update_time)（源表无 update_time 时退化为 checksum）
+    checksum: CHECKSUM TABLE
+    """
+    if method == 'stats' and WATERMARK_COLUMN in column_names:
+        company_cursor.execute(f"SELECT COUNT(*), MAX(`{WATERMARK_COLUMN}`) FROM `{source_table}`")
+        count, max_watermark = company_cursor.fetchone()
+        return f"stats:{count}:{max_watermark}"
+
+    company_cursor.execute(f"CHECKSUM TABLE `{source_table}`")
+    return f"checksum:{company_cursor.fetchone()[1]}"
+
+
+def get_schema_signature(columns, schema_mode):
+    """源表列定义（列名 + 类型）与 schema_mode 的短哈希，拼入指纹，使表结构或模式变化时不会被判为未变化"""
+    payload = json.dumps([[column[0], get_column_type(column)] for column in columns] + [schema_mode])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def has_unique_key(local_cursor, table_name, column_name):
+    """检查本地表是否存在且在指定列上有唯一索引（增量覆盖写入依赖该索引）"""
+    local_cursor.execute(
+        """
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s AND non_unique = 0
+        """,
+        (table_name, column_name)
+    )
+    return local_cursor.fetchone()[0] > 0
+
+
+def can_sync_incrementally(local_cursor, target_table, state, sync_options):
+    """判断本次是否可以增量同步：需要已有水位、目标表带唯一键且未到全量对账周期"""
+    if not state or state['watermark'] is None or state['last_full_sync'] is None:
+        return False
+    if not has_unique_key(local_cursor, target_table, KEY_COLUMN):
+        return False
+    interval = timedelta(hours=float(sync_options['full_sync_interval_hours']))
+    return datetime.now() - state['last_full_sync'] < interval
+
+
+def prepare_local_database(local_db_config, sync_options):
+    """
+    在并发同步各基地之前建好共用的状态表 / 结构缓存表并补齐状态列（只执行一次，
+    避免多个线程同时执行 ALTER TABLE ADD COLUMN 冲突）
+    """
+    track_state = sync_options['sync_mode'] == 'incremental' or sync_options['skip_unchanged']
+    if not track_state and not sync_options['schema_cache']:
+        return
+    local_conn = pymysql.connect(
+        host=local_db_config['host'],
+        port=local_db_config['port'],
+        user=local_db_config['user'],
+        password=local_db_config['password'],
+        database=local_db_config['database'],
+        charset='utf8mb4'
+    )
+    try:
+        with local_conn.cursor() as local_cursor:
+            # 增量同步和变更检测都需要在状态表中记录水位/指纹
+            if track_state:
+                ensure_state_table(local_cursor)
+            if sync_options['schema_cache']:
+                ensure_cache_table(local_cursor)
+        local_conn.commit()
+    finally:
+        local_conn.close()
+
+
+def sync_table(base_config, common_config, table_mapping, local_db_config, sync_options=None):
+    """同步单个基地的全部映射表，返回该基地的同步结果（每个基地独立连接、独立提交）"""
+    sync_options = sync_options or get_sync_options({})
+    base_name = base_config['name']
+    result = {'base': base_name, 'success': False, 'tables': 0, 'rows': 0, 'skipped': [], 'elapsed': 0.0,
+              'error': None}
+    start_time = time.time()
     try:
-        print(f"\n开始同步基地: {base_config['name']}")
-        start_time = time.time()
+        print(f"\n开始同步基地: {base_name}")
 
         # 优先使用基地配置中的端口，若未配置则使用通用端口
         port = base_config.get('port', common_config['port'])
@@ -44,77 +331,116 @@ def sync_table(base_config, common_config, table_mapping, local_db_config):
             user=local_db_config['user'],
             password=local_db_config['password'],
             database=local_db_config['database'],
-            charset='utf8mb4'
+            charset='utf8mb4',
+            local_infile=sync_options['load_backend'] == 'load_data'
         )
 
         with company_conn.cursor() as company_cursor, local_conn.cursor() as local_cursor:
+            # 状态表 / 结构缓存表已由 prepare_local_database 在启动并发同步前建好
+            track_state = sync_options['sync_mode'] == 'incremental' or sync_options['skip_unchanged']
+            use_schema_cache = sync_options['schema_cache']
+            typed = sync_options['schema_mode'] == 'typed'
+
             for source_table, table_prefix in table_mapping.items():
                 # 生成目标表名
                 target_table = f"{table_prefix}_{base_config['id']}_{base_config['name']}"
 
-                print(f"同步表: {source_table} -> {target_table}")
+                print(f"[{base_name}] 同步表: {source_table} -> {target_table}")
+
+                # 1. 获取源表列信息（表结构缓存有效期内直接使用缓存，省去一次远程元数据查询）
+                source_key = f"{base_name}/{source_table}"
+                schema = load_schema_cache(local_cursor, source_key) if use_schema_cache else None
+                schema_from_cache = is_cache_fresh(schema, sync_options['schema_cache_ttl_hours'])
+                if schema_from_cache:
+                    columns = schema['source_columns']
+                else:
+                    company_cursor.execute(f"SHOW COLUMNS FROM `{source_table}`")
+                    columns = company_cursor.fetchall()
+                column_names = [column[0] for column in columns]
+
+                # 增量模式要求源表具备水位列和主键列，否则回退为全量同步
+                incremental = (sync_options['sync_mode'] == 'incremental'
+                               and WATERMARK_COLUMN in column_names and KEY_COLUMN in column_names)
+                state = load_sync_state(local_cursor, target_table) if track_state else None
 
-                # 1. 获取源表列信息
-                company_cursor.execute(f"SHOW COLUMNS FROM `{source_table}`")
-                columns = company_cursor.fetchall()
+                unique_key = KEY_COLUMN if incremental else None
+                column_defs = build_column_definitions(columns, typed)
+                key_defs = build_key_definitions(unique_key)
+                # 目标表 DDL 相对缓存是否有变化（未启用缓存时视为未变化，沿用原有逻辑）
+                schema_changed = use_schema_cache and (schema is None
+                                                       or schema['ddl_hash'] != ddl_hash(column_defs, key_defs))
 
-                # 2. 构建新的创建表语句
-                column_definitions = []
-                for column in columns:
-                    column_name = column[0]
-                    # 特殊处理 tag_desc 列，使用 TEXT 类型
-                    if column_name == 'tag_desc':
-                        column_definitions.append(f"`{column_name}` TEXT COLLATE utf8mb4_0900_ai_ci")
+                # 2. 变更检测：源表指纹（数据 + 表结构 + schema_mode）与上次成功同步时一致则跳过
+                fingerprint = None
+                if sync_options['skip_unchanged']:
+                    fingerprint = get_table_fingerprint(company_cursor, source_table, column_names,
+                                                        sync_options['fingerprint_method'])
+                    fingerprint += f":{get_schema_signature(columns, sync_options['schema_mode'])}"
+                    if state and state['fingerprint'] == fingerprint and table_exists(local_cursor, target_table):
+                        print(f"[{base_name}]   |- 源表未变化 ({fingerprint})，跳过")
+                        result['skipped'].append(target_table)
+                        continue
+
+                if (incremental and not schema_changed
+                        and can_sync_incrementally(local_cursor, target_table, state, sync_options)):
+                    # 3a. 增量同步：只拉取水位之后的数据，按 id 覆盖写入
+                    print(f"[{base_name}]   |- 增量同步, 水位: {state['watermark']}")
+                    row_count, max_watermark = copy_rows(
+                        company_conn, local_cursor, source_table, target_table, column_names,
+                        sync_options['chunk_size'], base_name,
+                        where_sql=f"WHERE `{WATERMARK_COLUMN}` >= %s", params=(state['watermark'],), upsert=True,
+                        load_backend=sync_options['load_backend'], typed=typed
+                    )
+                    watermark = max_watermark if max_watermark is not None else state['watermark']
+                    save_sync_state(local_cursor, target_table, watermark=watermark, fingerprint=fingerprint)
+                    local_conn.commit()
+                else:
+                    # 3b. 全量同步：准备目标表（启用表结构缓存时按 DDL 差异 TRUNCATE/ALTER，否则删表重建）
+                    full_sync_time = datetime.now()
+                    if track_state:
+                        # 先作废旧状态（随后的 DDL 会隐式提交），避免中途失败后被误判为未变化
+                        save_sync_state(local_cursor, target_table, watermark=None, fingerprint=None)
+                    if use_schema_cache:
+                        action = prepare_table(local_cursor, target_table, column_defs, key_defs, schema)
+                        print(f"[{base_name}]   |- 目标表准备: {action}")
                     else:
-                        # 其他列使用 VARCHAR(200) 并指定校对规则
-                        column_definitions.append(f"`{column_name}` VARCHAR(200) COLLATE utf8mb4_0900_ai_ci")
-
-                # 创建表语句中指定字符集和校对规则
-                create_table_sql = f"""
-                CREATE TABLE `{target_table}` (
-                    {', '.join(column_definitions)}
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
-                """
-
-                # 3. 在本地库创建表(如果存在则先删除)
-                local_cursor.execute(f"DROP TABLE IF EXISTS `{target_table}`")
-                local_cursor.execute(create_table_sql)
-
-                # 4. 同步数据
-                company_cursor.execute(f"SELECT * FROM `{source_table}`")
-                rows = company_cursor.fetchall()
-
-                # 获取列名
-                columns = [column[0] for column in columns]
-                columns_str = ', '.join([f"`{col}`" for col in columns])
-                placeholders = ', '.join(['%s'] * len(columns))
-
-                # 批量插入数据
-                if rows:
-                    # 将所有数据转换为字符串，确保能插入VARCHAR列
-                    str_rows = []
-                    for row in rows:
-                        str_row = []
-                        for value in row:
-                            if value is None:
-                                str_row.append(None)
-                            else:
-                                str_row.append(str(value))
-                        str_rows.append(tuple(str_row))
-
-                    local_cursor.executemany(
-                        f"INSERT INTO `{target_table}` ({columns_str}) VALUES ({placeholders})",
-                        str_rows
+                        local_cursor.execute(f"DROP TABLE IF EXISTS `{target_table}`")
+                        local_cursor.execute(build_create_sql(target_table, column_defs, key_defs))
+
+                    # 4. 同步数据（服务端游标流式读取 + 分块写入，内存占用与表大小无关）
+                    row_count, max_watermark = copy_rows(
+                        company_conn, local_cursor, source_table, target_table, column_names,
+                        sync_options['chunk_size'], base_name, load_backend=sync_options['load_backend'],
+                        typed=typed
                     )
 
-                print(f"  |- 同步完成: {len(rows)} 条数据")
+                    # 5. typed 模式下为关联键建索引
+                    if typed:
+                        index_columns = add_join_indexes(local_cursor, target_table, columns, unique_key)
+                        if index_columns:
+                            print(f"[{base_name}]   |- 已建立索引: {', '.join(index_columns)}")
+                    if track_state:
+                        save_sync_state(local_cursor, target_table, watermark=max_watermark,
+                                        last_full_sync=full_sync_time, fingerprint=fingerprint)
+                        local_conn.commit()
+
+                # 表结构缓存在目标表成功准备并写入后更新
+                if use_schema_cache and (schema_changed or not schema_from_cache):
+                    save_schema_cache(local_cursor, source_key, target_table, columns, column_defs, key_defs,
+                                      refreshed_at=schema['refreshed_at'] if schema_from_cache else None)
+                    local_conn.commit()
+
+                print(f"[{base_name}]   |- 同步完成: {row_count} 条数据")
+                result['tables'] += 1
+                result['rows'] += row_count
 
         local_conn.commit()
-        end_time = time.time()
-        print(f"基地同步完成, 总耗时: {end_time - start_time:.2f}秒")
+        result['success'] = True
+        print(f"[{base_name}] 基地同步完成, 总耗时: {time.time() - start_time:.2f}秒")
 
     except Exception as e:
-        print(f"同步过程中出现错误: {str(e)}")
+        result['error'] = str(e)
+        print(f"[{base_name}] 同步过程中出现错误: {str(e)}")
         if 'local_conn' in locals():
             local_conn.rollback()
     finally:
@@ -122,21 +448,63 @@ def sync_table(base_config, common_config, table_mapping, local_db_config):
             company_conn.close()
         if 'local_conn' in locals():
             local_conn.close()
+        result['elapsed'] = time.time() - start_time
+
+    return result
+
+
+def print_summary(results):
+    """打印各基地同步结果汇总"""
+    print("\n=== 同步结果汇总 ===")
+    for r in results:
+        if r['success']:
+            print(f"  ✅ {r['base']}: {r['tables']} 张表, {r['rows']} 条数据, 跳过 {len(r['skipped'])} 张未变化表, "
+                  f"耗时 {r['elapsed']:.2f}秒")
+            if r['skipped']:
+                print(f"     跳过: {', '.join(r['skipped'])}")
+        else:
+            print(f"  ❌ {r['base']}: 失败 ({r['error']}), 耗时 {r['elapsed']:.2f}秒")
+    failed = [r['base'] for r in results if not r['success']]
+    print(f"成功 {len(results) - len(failed)} 个, 失败 {len(failed)} 个" + (f": {', '.join(failed)}" if failed else ""))
 
 
 def main():
     config = load_config()
     print(f"开始数据库同步任务: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    start_time = time.time()
 
-    for base in config['bases']:
-        sync_table(
-            base_config=base,
-            common_config=config['common_db_config'],
-            table_mapping=config['table_mappings'],
-            local_db_config=config['local_database']
-        )
+    bases = config['bases']
+    sync_options = get_sync_options(config)
+    if sync_options['load_backend'] not in LOAD_BACKENDS:
+        raise ValueError(f"load_backend 配置无效: {sync_options['load_backend']}，可选值: {', '.join(LOAD_BACKENDS)}")
+    # 并发数：各基地为独立数据库，按 max_workers 并行同步（默认 1 即串行）
+    max_workers = max(1, min(int(sync_options['max_workers']), len(bases)))
+    print(f"共 {len(bases)} 个基地, 并发数: {max_workers}")
+
+    prepare_local_database(config['local_database'], sync_options)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(
+                sync_table,
+                base_config=base,
+                common_config=config['common_db_config'],
+                table_mapping=config['table_mappings'],
+                local_db_config=config['local_database'],
+                sync_options=sync_options
+            )
+            for base in bases
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    # 按配置顺序输出汇总
+    order = {base['name']: idx for idx, base in enumerate(bases)}
+    results.sort(key=lambda r: order[r['base']])
+    print_summary(results)
 
-    print(f"\n所有同步任务完成: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"\n所有同步任务完成: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, 总耗时: {time.time() - start_time:.2f}秒")
 
 
 if __name__ == '__main__':
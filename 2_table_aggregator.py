@@ -1,8 +1,20 @@
+from datetime import datetime, timedelta
+import hashlib
 import json
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
+import time
+
+# 本地数据库连接配置
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'mazhuoran',
+    'password': 'mazhuoran',
+    'database': 'mzr_db'
+}
 
 # 基地名称映射
 BASE_MAPPING = {
@@ -46,6 +58,51 @@ SPECIAL_COLUMNS = {
     "business_info3": ("c", "business_info3"),
 }
 
+# JOIN 条件中引用的列：(SQL表别名, 真实数据库列名)
+JOIN_COLUMNS = [
+    ("c", "tag_id"), ("a", "id"),
+    ("a", "device_id"), ("g", "id"),
+    ("c", "aggregation_relation_id"), ("b", "id"),
+    ("b", "business_attribute"), ("z", "业务属性名称"),
+    ("a", "equipment_id"), ("f", "id"),
+    ("e", "agg_relation_id"),
+    ("e", "interface_id"), ("d", "id"),
+    ("y2", "基地"), ("y2", "车间名称"), ("f", "base_name"), ("f", "workshop"),
+]
+
+# JOIN 边（按连接顺序）：(TABLE_ALIASES 中的表别名, SQL表别名, 连接条件)
+JOIN_EDGES = [
+    ("a", "a", "c.tag_id = a.id"),
+    ("g", "g", "a.device_id = g.id"),
+    ("b", "b", "c.aggregation_relation_id = b.id"),
+    ("z", "z", "b.business_attribute = z.`业务属性名称`"),
+    ("f", "f", "a.equipment_id = f.id"),
+    ("e", "e", "b.id = e.agg_relation_id"),
+    ("d", "d", "e.interface_id = d.id"),
+    ("y", "y2", "y2.`基地` = f.`base_name` AND y2.`车间名称` = f.`workshop`"),
+]
+
+# 服务/接口维度：rows 按服务×接口展开（每个服务一行）；aggregated 按 agg_relation_id 预聚合为一行，多个值拼接
+SERVICE_DIMENSIONS = ('rows', 'aggregated')
+SERVICE_ALIASES = ('e', 'd')
+DIMENSION_SEPARATOR = "; "
+
+# 记录已通过校验的聚合计划（配置 + 各表结构的哈希），命中时跳过校验
+VALIDATION_CACHE_TABLE = "0_聚合校验缓存"
+
+# 汇总表存储方式：per_base 每个基地一张表；partitioned 所有基地共用一张按 base_id 分区的表
+STORAGE_MODES = ('per_base', 'partitioned')
+DEFAULT_UNIFIED_TABLE = "1_汇总表"
+
+# 汇总表刷新方式：full 每次清空重算；incremental 只删除并重算受源表变化影响的采集点
+REFRESH_MODES = ('full', 'incremental')
+REFRESH_STATE_TABLE = "0_聚合刷新状态"
+WATERMARK_COLUMN = "update_time"
+# 增量刷新时按 update_time 追踪变化的源表，变化沿 JOIN 映射回 c.tag_id；其余源表有变化时全量刷新
+DELTA_ALIASES = ['c', 'a', 'b', 'f']
+# 删除检测所用的自增主键列：上次刷新时 id 不超过 MAX(id) 的行数减少即说明有删除（新增行的 id 更大，不会抵消）
+ID_COLUMN = "id"
+
 
 def load_config(config_path):
     """加载并验证JSON配置文件"""
@@ -83,6 +140,13 @@ def load_config(config_path):
             missing_sources = normal_cols - source_columns
             raise ValueError(f"column_sources 缺少以下原始字段的来源定义: {', '.join(missing_sources)}")
 
+        if config.get('storage_mode', 'per_base') not in STORAGE_MODES:
+            raise ValueError(f"storage_mode 仅支持: {', '.join(STORAGE_MODES)}")
+        if config.get('refresh_mode', 'full') not in REFRESH_MODES:
+            raise ValueError(f"refresh_mode 仅支持: {', '.join(REFRESH_MODES)}")
+        if config.get('service_dimension', 'rows') not in SERVICE_DIMENSIONS:
+            raise ValueError(f"service_dimension 仅支持: {', '.join(SERVICE_DIMENSIONS)}")
+
         return config
     except Exception as e:
         print(f"加载配置错误: {e}")
@@ -93,12 +157,7 @@ def load_config(config_path):
 def create_connection():
     """创建数据库连接"""
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='mazhuoran',
-            password='mazhuoran',
-            database='mzr_db'
-        )
+        connection = mysql.connector.connect(**DB_CONFIG)
         print("数据库连接成功")
         return connection
     except Error as e:
@@ -106,19 +165,79 @@ def create_connection():
         sys.exit(1)
 
 
-def create_summary_table(connection, table_name, column_order):
+def create_connection_pool(pool_size):
+    """创建连接池，供并行聚合时各基地独立取用连接"""
+    try:
+        pool = pooling.MySQLConnectionPool(pool_name="table_aggregator", pool_size=pool_size, **DB_CONFIG)
+        print(f"数据库连接池创建成功 (连接数: {pool_size})")
+        return pool
+    except Error as e:
+        print(f"数据库连接池创建错误: {e}")
+        sys.exit(1)
+
+
+def get_table_columns(cursor, table_name):
+    """按顺序返回表的 (列名, 数据类型)，表不存在时返回空列表"""
+    cursor.execute(
+        """
+        SELECT column_name, data_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position
+        """,
+        (table_name,)
+    )
+    return [(name, (data_type.decode() if isinstance(data_type, bytes) else data_type).lower())
+            for name, data_type in cursor.fetchall()]
+
+
+def is_service_aggregated(config):
+    """服务/接口维度是否按 agg_relation_id 预聚合"""
+    return config.get('service_dimension', 'rows') == 'aggregated'
+
+
+def build_column_types(config):
+    """汇总表各列的类型（按 column_order）：预聚合的服务/接口列拼接后可能超长，使用 TEXT"""
+    column_types = {col: "VARCHAR(255)" for col in config['column_order']}
+    if is_service_aggregated(config):
+        for alias, _, new_col in build_select_columns(config):
+            if alias in SERVICE_ALIASES:
+                column_types[new_col] = "TEXT"
+    return column_types
+
+
+def expected_table_columns(column_types):
+    """由列类型定义得到 get_table_columns 的预期结果，用于判断已有表结构是否一致"""
+    return [(col, col_type.split('(')[0].lower()) for col, col_type in column_types.items()]
+
+
+def drop_table_or_view(cursor, name):
+    """删除同名的表或视图（DROP TABLE / DROP VIEW 不能互相删除对方类型的对象）"""
+    cursor.execute(
+        """
+        SELECT table_type FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+        """,
+        (name,)
+    )
+    row = cursor.fetchone()
+    if row:
+        cursor.execute(f"DROP {'VIEW' if row[0] == 'VIEW' else 'TABLE'} `{name}`")
+    return row is not None
+
+
+def create_summary_table(connection, table_name, column_types):
     """创建汇总表"""
     cursor = connection.cursor()
     try:
-        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;")
+        # 从分区模式切换回来时，同名对象可能是兼容视图
+        drop_table_or_view(cursor, table_name)
         print(f"已删除已存在的表: {table_name}")
     except Error as e:
         print(f"删除表错误: {e}")
 
-    column_defs = [f"`{col}` VARCHAR(255)" for col in column_order]
+    column_defs = ",\n        ".join(f"`{col}` {col_type}" for col, col_type in column_types.items())
     create_table_sql = f"""
     CREATE TABLE `{table_name}` (
-        {",\n        ".join(column_defs)}
+        {column_defs}
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """
     try:
@@ -131,6 +250,107 @@ def create_summary_table(connection, table_name, column_order):
         cursor.close()
 
 
+def is_incremental(config):
+    """是否使用增量刷新"""
+    return config.get('refresh_mode', 'full') == 'incremental'
+
+
+def is_partitioned(config):
+    """是否使用按 base_id 分区的统一汇总表"""
+    return config.get('storage_mode', 'per_base') == 'partitioned'
+
+
+def get_unified_table_name(config):
+    """统一汇总表表名"""
+    return config.get('unified_table_name', DEFAULT_UNIFIED_TABLE)
+
+
+def create_unified_table(connection, table_name, column_types):
+    """
+    创建按 base_id 分区（PARTITION BY LIST）的统一汇总表。
+    表已存在且列一致时保留（各基地分区在聚合时单独清空），只补齐缺失的基地分区；列不一致时重建。
+    """
+    cursor = connection.cursor()
+    expected_columns = [('base_id', 'int')] + expected_table_columns(column_types)
+    try:
+        existing_columns = get_table_columns(cursor, table_name)
+        if existing_columns == expected_columns:
+            cursor.execute(
+                """
+                SELECT partition_name FROM information_schema.partitions
+                WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+                """,
+                (table_name,)
+            )
+            existing_partitions = {row[0] for row in cursor.fetchall()}
+            missing = [base_id for base_id in BASE_MAPPING if f"p{base_id}" not in existing_partitions]
+            if missing:
+                partitions = ", ".join([f"PARTITION p{base_id} VALUES IN ({base_id})" for base_id in missing])
+                cursor.execute(f"ALTER TABLE `{table_name}` ADD PARTITION ({partitions})")
+                print(f"表 {table_name} 已补充分区: {', '.join(f'p{base_id}' for base_id in missing)}")
+            else:
+                print(f"表 {table_name} 已存在，结构一致")
+            return
+
+        if existing_columns:
+            print(f"表 {table_name} 结构与配置不一致，重建")
+        drop_table_or_view(cursor, table_name)
+
+        column_defs = ["`base_id` INT NOT NULL"] + [f"`{col}` {col_type}" for col, col_type in column_types.items()]
+        partitions = [f"PARTITION p{base_id} VALUES IN ({base_id})" for base_id in BASE_MAPPING]
+        cursor.execute(
+            f"CREATE TABLE `{table_name}` ({', '.join(column_defs)}) "
+            f"ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 "
+            f"PARTITION BY LIST (`base_id`) ({', '.join(partitions)})"
+        )
+        print(f"分区表 {table_name} 创建成功")
+    except Error as e:
+        print(f"创建分区表错误: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+
+
+def create_compat_view(connection, view_name, unified_table, base_id, column_order):
+    """为单个基地创建与原汇总表同名的兼容视图（只取该基地分区，列与原表一致）"""
+    cursor = connection.cursor()
+    try:
+        drop_table_or_view(cursor, view_name)
+        columns_str = ", ".join([f"`{col}`" for col in column_order])
+        cursor.execute(
+            f"CREATE OR REPLACE VIEW `{view_name}` AS "
+            f"SELECT {columns_str} FROM `{unified_table}` WHERE `base_id` = {int(base_id)}"
+        )
+        print(f"兼容视图 {view_name} 已创建")
+    except Error as e:
+        print(f"创建视图错误: {e}")
+        sys.exit(1)
+    finally:
+        cursor.close()
+
+
+def prepare_base_table(connection, config, base_id, base_name):
+    """
+    准备基地的汇总表：per_base 模式重建汇总表；partitioned 模式创建同名兼容视图。
+    增量刷新时，结构一致的已有汇总表保留不重建。
+    """
+    table_name = config['table_name_template'].format(base_id=base_id, base_name=base_name)
+    if is_partitioned(config):
+        create_compat_view(connection, table_name, get_unified_table_name(config), base_id, config['column_order'])
+        return
+
+    column_types = build_column_types(config)
+    if is_incremental(config):
+        cursor = connection.cursor()
+        try:
+            if get_table_columns(cursor, table_name) == expected_table_columns(column_types):
+                print(f"表 {table_name} 已存在，结构一致（增量刷新）")
+                return
+        finally:
+            cursor.close()
+    create_summary_table(connection, table_name, column_types)
+
+
 def ensure_result_consumed(cursor):
     """确保所有查询结果都被完全读取"""
     try:
@@ -140,112 +360,533 @@ def ensure_result_consumed(cursor):
         pass
 
 
-def aggregate_data(connection, config, base_id, base_name):
-    """聚合数据到新表"""
-    cursor = connection.cursor()
-
-    # 动态生成表名
-    table_name = config['table_name_template'].format(base_id=base_id, base_name=base_name)
+def get_actual_tables(base_id, base_name):
+    """根据表别名模板生成基地的实际表名"""
     actual_tables = {}
     for alias, template in TABLE_ALIASES.items():
         if alias in ['y', 'z']:
             actual_tables[alias] = template
         else:
             actual_tables[alias] = template.format(base_id=base_id, base_name=base_name)
+    return actual_tables
+
 
+def build_select_columns(config):
+    """按 column_order 生成 SELECT 列：[(SQL表别名, 真实数据库列名, 输出列名), ...]"""
     reverse_mapping = {v: k for k, v in config['column_mapping'].items()}
     column_sources = config['column_sources']
 
-    # 构建 SELECT 子句
     select_columns = []
     for new_col in config['column_order']:
         orig_col = reverse_mapping[new_col]
         if orig_col in SPECIAL_COLUMNS:
             table_alias, real_col = SPECIAL_COLUMNS[orig_col]
-            select_columns.append(f"{table_alias}.`{real_col}` AS `{new_col}`")
+            select_columns.append((table_alias, real_col, new_col))
+        else:
+            select_columns.append((column_sources[orig_col], orig_col, new_col))
+    return select_columns
+
+
+def build_service_dimension_sql(config, actual_tables):
+    """
+    构建按 agg_relation_id 预聚合的服务/接口派生表：每个聚合关系一行，
+    e/d 中被选中的列按服务顺序拼接（只有一个服务时保留原值，与 rows 模式一致）
+    """
+    items = []
+    for alias, real_col, _ in build_select_columns(config):
+        if alias in SERVICE_ALIASES:
+            items.append(
+                f"IF(COUNT(*) = 1, MAX({alias}.`{real_col}`), "
+                f"GROUP_CONCAT(IFNULL({alias}.`{real_col}`, '') ORDER BY e.id SEPARATOR '{DIMENSION_SEPARATOR}')) "
+                f"AS `{alias}__{real_col}`"
+            )
+    select_items = ",\n            ".join(["e.agg_relation_id"] + items)
+    return f"""(
+        SELECT
+            {select_items}
+        FROM `{actual_tables['e']}` e
+        LEFT JOIN `{actual_tables['d']}` d ON e.interface_id = d.id
+        GROUP BY e.agg_relation_id
+    )"""
+
+
+def build_join_edges(config, actual_tables):
+    """按连接顺序生成 JOIN 边：[(SQL表别名, 表或派生表SQL, 连接条件), ...]"""
+    edges = []
+    for alias, sql_alias, condition in JOIN_EDGES:
+        if is_service_aggregated(config) and alias in SERVICE_ALIASES:
+            if alias == 'e':
+                edges.append(("ed", build_service_dimension_sql(config, actual_tables), "b.id = ed.agg_relation_id"))
+            continue
+        edges.append((sql_alias, f"`{actual_tables[alias]}`", condition))
+    return edges
+
+
+def build_from_clause(actual_tables, join_edges):
+    """构建以 c 表为主表的 FROM/JOIN 子句"""
+    joins = "".join([f"\n    LEFT JOIN {source} {sql_alias} ON {condition}"
+                     for sql_alias, source, condition in join_edges])
+    return f"FROM `{actual_tables['c']}` c{joins}"
+
+
+def select_expression(config, alias, real_col):
+    """SELECT 中引用源列的表达式（预聚合模式下 e/d 列取自派生表 ed）"""
+    if is_service_aggregated(config) and alias in SERVICE_ALIASES:
+        return f"ed.`{alias}__{real_col}`"
+    return f"{alias}.`{real_col}`"
+
+
+def report_join_fanout(cursor, actual_tables, join_edges, base_name):
+    """逐条 JOIN 边统计连接前后的行数，定位行数膨胀（扇出）发生在哪一步，返回 [(SQL表别名, 行数), ...]"""
+    cursor.execute(f"SELECT COUNT(*) FROM `{actual_tables['c']}` c")
+    counts = [("c", cursor.fetchone()[0])]
+    for i in range(1, len(join_edges) + 1):
+        cursor.execute(f"SELECT COUNT(*) {build_from_clause(actual_tables, join_edges[:i])}")
+        counts.append((join_edges[i - 1][0], cursor.fetchone()[0]))
+
+    print(f"JOIN 基数报告（基地 {base_name}）:")
+    print(f"  {'c':<4} {counts[0][1]:>10} 行")
+    for (sql_alias, _, condition), (_, before), (_, after) in zip(join_edges, counts, counts[1:]):
+        ratio = after / before if before else 0
+        print(f"  ⟕ {sql_alias:<4} {after:>10} 行  ×{ratio:.2f}  ({condition})")
+    return counts
+
+
+def get_table_schemas(cursor, table_names):
+    """一次查询 information_schema 获取各表的列及类型：{表名: [(列名, 类型), ...]}"""
+    table_names = list(dict.fromkeys(table_names))
+    placeholders = ', '.join(['%s'] * len(table_names))
+    cursor.execute(
+        f"""
+        SELECT table_name, column_name, column_type FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name IN ({placeholders})
+        ORDER BY table_name, ordinal_position
+        """,
+        table_names
+    )
+    schemas = {table: [] for table in table_names}
+    for table, column, column_type in cursor.fetchall():
+        if isinstance(column_type, bytes):
+            column_type = column_type.decode()
+        schemas[table].append((column, column_type))
+    return schemas
+
+
+def validate_plan(config, select_columns, actual_tables, schemas):
+    """不读取数据，根据表结构校验聚合计划，返回错误信息列表"""
+    errors = []
+    for table in dict.fromkeys(actual_tables.values()):
+        if not schemas[table]:
+            errors.append(f"表不存在或无列: {table}")
+
+    expected = len(config['column_order'])
+    if len(select_columns) != expected:
+        errors.append(f"列数不匹配！SELECT返回{len(select_columns)}列，期望{expected}列")
+
+    referenced = [(alias, col) for alias, col, _ in select_columns] + JOIN_COLUMNS
+    if is_service_aggregated(config):
+        # 预聚合时按 e.id 排序拼接
+        referenced.append(("e", "id"))
+    for alias, col in dict.fromkeys(referenced):
+        table = actual_tables['y' if alias == 'y2' else alias]
+        if schemas[table] and col not in {name for name, _ in schemas[table]}:
+            errors.append(f"{alias}表 '{table}' 缺少列: {col}")
+    return errors
+
+
+def plan_hash(config, actual_tables, schemas):
+    """计算聚合计划的哈希：配置 + 各表结构任一变化都需要重新校验"""
+    payload = json.dumps({
+        'config': {key: config[key] for key in ['column_mapping', 'column_order', 'column_sources']},
+        'service_dimension': config.get('service_dimension', 'rows'),
+        'tables': {alias: [table, schemas[table]] for alias, table in sorted(actual_tables.items())},
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def is_plan_validated(cursor, validation_hash):
+    """检查聚合计划是否已通过校验"""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{VALIDATION_CACHE_TABLE}` (
+        `plan_hash` CHAR(40) NOT NULL PRIMARY KEY,
+        `table_name` VARCHAR(255),
+        `validated_at` DATETIME
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute(f"SELECT COUNT(*) FROM `{VALIDATION_CACHE_TABLE}` WHERE `plan_hash` = %s", (validation_hash,))
+    return cursor.fetchone()[0] > 0
+
+
+def save_plan_validation(cursor, validation_hash, table_name):
+    """记录已通过校验的聚合计划"""
+    cursor.execute(
+        f"REPLACE INTO `{VALIDATION_CACHE_TABLE}` (`plan_hash`, `table_name`, `validated_at`) VALUES (%s, %s, NOW())",
+        (validation_hash, table_name)
+    )
+
+
+def ensure_refresh_state_table(cursor):
+    """确保汇总表刷新状态表存在"""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{REFRESH_STATE_TABLE}` (
+        `summary_key` VARCHAR(255) NOT NULL PRIMARY KEY,
+        `plan_hash` CHAR(40),
+        `source_stats` LONGTEXT,
+        `summary_rows` BIGINT,
+        `last_full_refresh` DATETIME,
+        `updated_at` DATETIME
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+
+
+def load_refresh_state(cursor, summary_key):
+    """读取汇总表上次刷新的状态，不存在时返回 None"""
+    ensure_refresh_state_table(cursor)
+    cursor.execute(
+        f"""
+        SELECT `plan_hash`, `source_stats`, `summary_rows`, `last_full_refresh`
+        FROM `{REFRESH_STATE_TABLE}` WHERE `summary_key` = %s
+        """,
+        (summary_key,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'plan_hash': row[0],
+        'source_stats': json.loads(row[1]) if row[1] else {},
+        'summary_rows': row[2],
+        'last_full_refresh': row[3],
+    }
+
+
+def save_refresh_state(cursor, summary_key, plan_hash_value, source_stats, summary_rows, last_full_refresh):
+    """写入汇总表刷新状态"""
+    cursor.execute(
+        f"""
+        REPLACE INTO `{REFRESH_STATE_TABLE}`
+            (`summary_key`, `plan_hash`, `source_stats`, `summary_rows`, `last_full_refresh`, `updated_at`)
+        VALUES (%s, %s, %s, %s, %s, NOW())
+        """,
+        (summary_key, plan_hash_value, json.dumps(source_stats, ensure_ascii=False), summary_rows, last_full_refresh)
+    )
+
+
+def collect_source_stats(cursor, actual_tables, schemas):
+    """
+    收集各源表的变化统计：{别名: [行数, MAX(update_time), MAX(id)]}（无 id 列时 MAX(id) 为 None），
+    无 update_time 列的表（如字典表）记录为 {别名: ['checksum', CHECKSUM TABLE 结果]}
+    """
+    stats = {}
+    for alias, table in sorted(actual_tables.items()):
+        columns = {name for name, _ in schemas[table]}
+        if WATERMARK_COLUMN in columns:
+            max_id = f"MAX(`{ID_COLUMN}`)" if ID_COLUMN in columns else "NULL"
+            cursor.execute(f"SELECT COUNT(*), MAX(`{WATERMARK_COLUMN}`), {max_id} FROM `{table}`")
+            count, max_watermark, max_id_value = cursor.fetchone()
+            stats[alias] = [count, str(max_watermark) if max_watermark is not None else None, max_id_value]
+        else:
+            cursor.execute(f"CHECKSUM TABLE `{table}`")
+            stats[alias] = ['checksum', cursor.fetchone()[1]]
+    return stats
+
+
+def detect_deleted_tables(cursor, actual_tables, previous_stats, source_stats):
+    """
+    找出自上次刷新以来有删除的 c/a/b/f 表，返回别名集合。
+    上次刷新时的行即当前 id 不超过上次 MAX(id) 的行（修改不改变 id，新增行 id 更大），其数量少于上次行数即有删除；
+    上次未记录 MAX(id)（无 id 列或旧版刷新状态）时只能按总行数减少判断。
+    """
+    deleted = set()
+    for alias in DELTA_ALIASES:
+        previous, current = previous_stats.get(alias), source_stats[alias]
+        if previous is None or previous[0] == 'checksum' or current[0] == 'checksum':
+            continue
+        previous_max_id = previous[2] if len(previous) > 2 else None
+        if previous_max_id is not None and current[2] is not None:
+            cursor.execute(f"SELECT COUNT(*) FROM `{actual_tables[alias]}` WHERE `{ID_COLUMN}` <= %s",
+                           (previous_max_id,))
+            surviving = cursor.fetchone()[0]
+        else:
+            surviving = current[0]
+        if surviving < previous[0]:
+            deleted.add(alias)
+    return deleted
+
+
+def get_full_refresh_reason(config, state, validation_hash, source_stats, summary_rows, tag_column,
+                            deleted_tables=()):
+    """判断本次是否必须全量刷新，返回原因；可以增量刷新时返回 None"""
+    if state is None:
+        return "无刷新状态"
+    if state['plan_hash'] != validation_hash:
+        return "聚合配置或源表结构有变化"
+    if state['summary_rows'] != summary_rows:
+        return "汇总表行数与上次刷新不一致"
+    if tag_column is None:
+        return "汇总表未包含 c.tag_id 列，无法定位受影响的行"
+
+    interval = float(config.get('full_refresh_interval_hours', 24))
+    if interval and (state['last_full_refresh'] is None
+                     or datetime.now() - state['last_full_refresh'] >= timedelta(hours=interval)):
+        return f"距上次全量刷新已超过 {interval:g} 小时"
+
+    for alias, current in source_stats.items():
+        previous = state['source_stats'].get(alias)
+        if alias in DELTA_ALIASES:
+            if current[0] == 'checksum':
+                return f"{alias}表缺少 {WATERMARK_COLUMN} 列"
+            if previous is None or previous[0] == 'checksum':
+                return f"{alias}表缺少上次刷新水位"
+            if alias == 'c' and alias in deleted_tables:
+                # c 表删除的行无法映射回采集点（同一采集点可能仍有其他行）
+                return "c表有删除"
+        elif current != previous:
+            return f"{alias}表有变化"
+    return None
+
+
+def build_changed_tags_sql(actual_tables, previous_stats, summary_table, base_filter, tag_column,
+                           deleted_tables=()):
+    """
+    构建受影响采集点（c.tag_id）的查询：
+    c/a/b/f 表中 update_time 不早于上次刷新水位的行，沿 JOIN 映射回 c.tag_id；
+    删除无法通过 update_time 追踪：deleted_tables 中的 a/b/f 表按 JOIN 关系定位，引用了已删除行的采集点关联不到对应行，
+    同样重算（只在该表确有删除时查询，长期关联不到的采集点不会每次都重算）；
+    另加汇总表中已在 c 表中不存在的采集点（c 表删除）。
+    返回 (SQL, 参数)
+    """
+    t = actual_tables
+    delta_sql = {
+        'c': f"SELECT c.tag_id FROM `{t['c']}` c WHERE {{condition}}",
+        'a': f"SELECT c.tag_id FROM `{t['c']}` c JOIN `{t['a']}` a ON c.tag_id = a.id WHERE {{condition}}",
+        'b': f"SELECT c.tag_id FROM `{t['c']}` c JOIN `{t['b']}` b ON c.aggregation_relation_id = b.id "
+             f"WHERE {{condition}}",
+        'f': f"SELECT c.tag_id FROM `{t['c']}` c JOIN `{t['a']}` a ON c.tag_id = a.id "
+             f"JOIN `{t['f']}` f ON a.equipment_id = f.id WHERE {{condition}}",
+    }
+    orphan_sql = {
+        'a': f"SELECT c.tag_id FROM `{t['c']}` c LEFT JOIN `{t['a']}` a ON c.tag_id = a.id WHERE a.id IS NULL",
+        'b': f"SELECT c.tag_id FROM `{t['c']}` c LEFT JOIN `{t['b']}` b ON c.aggregation_relation_id = b.id "
+             f"WHERE c.aggregation_relation_id IS NOT NULL AND b.id IS NULL",
+        'f': f"SELECT c.tag_id FROM `{t['c']}` c JOIN `{t['a']}` a ON c.tag_id = a.id "
+             f"LEFT JOIN `{t['f']}` f ON a.equipment_id = f.id WHERE a.equipment_id IS NOT NULL AND f.id IS NULL",
+    }
+    parts, params = [orphan_sql[alias] for alias in orphan_sql if alias in deleted_tables], []
+    for alias in DELTA_ALIASES:
+        watermark = previous_stats[alias][1]
+        if watermark is None:
+            # 上次刷新时表为空，本次全部行都是新增
+            parts.append(delta_sql[alias].format(condition="1 = 1"))
         else:
-            source_alias = column_sources[orig_col]
-            select_columns.append(f"{source_alias}.`{orig_col}` AS `{new_col}`")
+            parts.append(delta_sql[alias].format(condition=f"{alias}.`{WATERMARK_COLUMN}` >= %s"))
+            params.append(watermark)
+    parts.append(
+        f"SELECT s.`{tag_column}` FROM `{summary_table}` s "
+        f"WHERE s.`{tag_column}` IS NOT NULL{base_filter} "
+        f"AND NOT EXISTS (SELECT 1 FROM `{t['c']}` c WHERE c.tag_id = s.`{tag_column}`)"
+    )
+    return "\nUNION\n".join(parts), params
 
-    select_clause = ",\n        ".join(select_columns)
+
+def checksum_sql(source_sql, columns):
+    """对结果集计算与行顺序无关的校验和：(行数, SUM(CRC32(整行)))，NULL 以 CHAR(0) 区分于空串"""
+    row_expr = ", ".join([f"IFNULL(`{col}`, CHAR(0))" for col in columns])
+    return f"SELECT COUNT(*), SUM(CRC32(CONCAT_WS(CHAR(31), {row_expr}))) FROM ({source_sql}) chk"
+
+
+def refresh_incremental(cursor, actual_tables, previous_stats, summary_table, summary_filter, tag_column,
+                        insert_sql, summary_rows, deleted_tables=()):
+    """
+    增量刷新：删除并重算受影响采集点的全部汇总行，返回刷新后的汇总表行数。
+    c 表中有 tag_id 为空的变更行时无法定位，返回 None 由调用方改为全量刷新。
+    """
+    c_watermark = previous_stats['c'][1]
+    null_sql = f"SELECT COUNT(*) FROM `{actual_tables['c']}` WHERE `tag_id` IS NULL"
+    if c_watermark is None:
+        cursor.execute(null_sql)
+    else:
+        cursor.execute(f"{null_sql} AND `{WATERMARK_COLUMN}` >= %s", (c_watermark,))
+    if cursor.fetchone()[0] > 0:
+        return None
+
+    changed_sql, params = build_changed_tags_sql(actual_tables, previous_stats, summary_table, summary_filter,
+                                                 tag_column, deleted_tables)
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS `tmp_changed_tags`")
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE `tmp_changed_tags` "
+        f"SELECT `tag_id` FROM ({changed_sql}) changed WHERE `tag_id` IS NOT NULL",
+        params
+    )
+    try:
+        cursor.execute("SELECT COUNT(*) FROM `tmp_changed_tags`")
+        changed = cursor.fetchone()[0]
+        if changed == 0:
+            print("增量刷新: 源表无变化")
+            return summary_rows
+
+        cursor.execute(
+            f"DELETE s FROM `{summary_table}` s JOIN `tmp_changed_tags` t ON s.`{tag_column}` = t.`tag_id` "
+            f"WHERE 1 = 1{summary_filter}"
+        )
+        deleted = cursor.rowcount
+        cursor.execute(f"{insert_sql}\n    WHERE c.tag_id IN (SELECT `tag_id` FROM `tmp_changed_tags`)")
+        inserted = cursor.rowcount
+        print(f"增量刷新: 受影响采集点 {changed} 个, 删除 {deleted} 行, 插入 {inserted} 行")
+        return summary_rows - deleted + inserted
+    finally:
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS `tmp_changed_tags`")
+
+
+def check_consistency(cursor, summary_table, summary_filter, select_sql, columns):
+    """一致性校验：比较汇总表现有数据与全量重算结果的校验和（不写入数据）"""
+    cursor.execute(checksum_sql(f"SELECT * FROM `{summary_table}` s WHERE 1 = 1{summary_filter}", columns))
+    current = tuple(cursor.fetchone())
+    cursor.execute(checksum_sql(select_sql, columns))
+    expected = tuple(cursor.fetchone())
+    if current != expected:
+        print(f"一致性校验失败: 汇总表 (行数, 校验和) = {current}, 全量重算 = {expected}")
+        return False
+    print(f"一致性校验通过: {current[0]} 行")
+    return True
+
+
+def aggregate_data(connection, config, base_id, base_name):
+    """聚合数据到新表，成功时返回汇总表行数，数据库错误时返回 None"""
+    cursor = connection.cursor()
+    verbose = config.get('verbose', False)
+
+    # 动态生成表名
+    actual_tables = get_actual_tables(base_id, base_name)
+    summary_key = config['table_name_template'].format(base_id=base_id, base_name=base_name)
+
+    # 构建 SELECT 子句
+    select_columns = build_select_columns(config)
+    select_items = [f"{select_expression(config, alias, real_col)} AS `{new_col}`"
+                    for alias, real_col, new_col in select_columns]
+    insert_columns = list(config['column_order'])
+
+    # 分区模式写入统一汇总表的 p{base_id} 分区，只清空该分区
+    if is_partitioned(config):
+        table_name = get_unified_table_name(config)
+        select_items.insert(0, f"{int(base_id)} AS `base_id`")
+        insert_columns.insert(0, 'base_id')
+        clear_sql = f"ALTER TABLE `{table_name}` TRUNCATE PARTITION p{int(base_id)}"
+        summary_filter = f" AND s.`base_id` = {int(base_id)}"
+    else:
+        table_name = summary_key
+        clear_sql = f"TRUNCATE TABLE `{table_name}`"
+        summary_filter = ""
+    sample_sql = f"SELECT * FROM `{table_name}` s WHERE 1 = 1{summary_filter} LIMIT 3"
+
+    select_clause = ",\n        ".join(select_items)
+    join_edges = build_join_edges(config, actual_tables)
+    from_clause = build_from_clause(actual_tables, join_edges)
 
     # 构建完整 SQL（以 c 表为主表）
-    sql = f"""
-    INSERT INTO `{table_name}`
+    select_sql = f"""
     SELECT 
         {select_clause}
-    FROM `{actual_tables['c']}` c
-    LEFT JOIN `{actual_tables['a']}` a ON c.tag_id = a.id
-    LEFT JOIN `{actual_tables['g']}` g ON a.device_id = g.id
-    LEFT JOIN `{actual_tables['b']}` b ON c.aggregation_relation_id = b.id
-    LEFT JOIN `{actual_tables['z']}` z ON b.business_attribute = z.`业务属性名称`
-    LEFT JOIN `{actual_tables['f']}` f ON a.equipment_id = f.id
-    LEFT JOIN `{actual_tables['e']}` e ON b.id = e.agg_relation_id
-    LEFT JOIN `{actual_tables['d']}` d ON e.interface_id = d.id
-    LEFT JOIN `{actual_tables['y']}` y2 ON y2.`基地` = f.`base_name` AND y2.`车间名称` = f.`workshop`;
-    """
+    {from_clause}"""
+    columns_str = ", ".join([f"`{col}`" for col in insert_columns])
+    insert_sql = f"INSERT INTO `{table_name}` ({columns_str}){select_sql}"
+
+    # 增量刷新按 c.tag_id 定位汇总行
+    tag_column = next((new_col for alias, real_col, new_col in select_columns
+                       if alias == 'c' and real_col == 'tag_id'), None)
 
     try:
         print(f"正在为基地 {base_name} 执行数据聚合...")
-
-        # 检查 y 表结构
-        cursor.execute(f"SHOW COLUMNS FROM `{actual_tables['y']}`")
-        y_columns = [col[0] for col in cursor.fetchall()]
-        ensure_result_consumed(cursor)
-        if "基地" not in y_columns or "车间名称" not in y_columns:
-            print("错误: y表缺少必需的列 '基地' 或 '车间名称'")
-            sys.exit(1)
-
-        # 获取各表行数（简化输出）
-        for alias in ['c', 'a', 'b', 'z', 'y']:
-            cursor.execute(f"SELECT COUNT(*) FROM `{actual_tables[alias]}`")
-            count = cursor.fetchone()[0]
-            print(f"{alias}表 '{actual_tables[alias]}' 行数: {count}")
-            ensure_result_consumed(cursor)
-
-        # 测试 SELECT 列数
-        test_sql = f"""
-        SELECT {select_clause}
-        FROM `{actual_tables['c']}` c
-        LEFT JOIN `{actual_tables['a']}` a ON c.tag_id = a.id
-        LEFT JOIN `{actual_tables['g']}` g ON a.device_id = g.id
-        LEFT JOIN `{actual_tables['b']}` b ON c.aggregation_relation_id = b.id
-        LEFT JOIN `{actual_tables['z']}` z ON b.business_attribute = z.`业务属性名称`
-        LEFT JOIN `{actual_tables['f']}` f ON a.equipment_id = f.id
-        LEFT JOIN `{actual_tables['e']}` e ON b.id = e.agg_relation_id
-        LEFT JOIN `{actual_tables['d']}` d ON e.interface_id = d.id
-        LEFT JOIN `{actual_tables['y']}` y2 ON y2.`基地` = f.`base_name` AND y2.`车间名称` = f.`workshop`
-        LIMIT 1;
-        """
-        cursor.execute(test_sql)
-        col_count = len(cursor.description)
-        expected = len(config['column_order'])
-        if col_count != expected:
-            print(f"列数不匹配！SELECT返回{col_count}列，期望{expected}列")
-            sys.exit(1)
-        ensure_result_consumed(cursor)
+        if is_service_aggregated(config):
+            # 拼接后的服务/接口列表可能超过 GROUP_CONCAT 默认的 1024 字节上限
+            cursor.execute("SET SESSION group_concat_max_len = 1048576")
+
+        # 校验聚合计划（基于 information_schema + EXPLAIN，不读取数据；配置与表结构未变时命中缓存跳过）
+        schemas = get_table_schemas(cursor, actual_tables.values())
+        validation_hash = plan_hash(config, actual_tables, schemas)
+        if is_plan_validated(cursor, validation_hash):
+            print("聚合计划校验: 命中缓存")
+        else:
+            errors = validate_plan(config, select_columns, actual_tables, schemas)
+            if errors:
+                for error in errors:
+                    print(f"错误: {error}")
+                sys.exit(1)
+            cursor.execute(f"EXPLAIN {select_sql}")
+            cursor.fetchall()
+            save_plan_validation(cursor, validation_hash, table_name)
+            connection.commit()
+            print("聚合计划校验: 通过")
+
+        # JOIN 基数报告（可选）
+        if config.get('fanout_report', False):
+            report_join_fanout(cursor, actual_tables, join_edges, base_name)
+
+        # 获取各表行数（仅 verbose 模式）
+        if verbose:
+            for alias in ['c', 'a', 'b', 'z', 'y']:
+                cursor.execute(f"SELECT COUNT(*) FROM `{actual_tables[alias]}`")
+                count = cursor.fetchone()[0]
+                print(f"{alias}表 '{actual_tables[alias]}' 行数: {count}")
+                ensure_result_consumed(cursor)
+
+        # 增量刷新：源表变化可追踪时只重算受影响的采集点，否则回退为全量刷新
+        full_reason = "全量刷新模式"
+        if is_incremental(config):
+            source_stats = collect_source_stats(cursor, actual_tables, schemas)
+            state = load_refresh_state(cursor, summary_key)
+            cursor.execute(f"SELECT COUNT(*) FROM `{table_name}` s WHERE 1 = 1{summary_filter}")
+            current_rows = cursor.fetchone()[0]
+            deleted_tables = set() if state is None else detect_deleted_tables(
+                cursor, actual_tables, state['source_stats'], source_stats)
+            full_reason = get_full_refresh_reason(config, state, validation_hash, source_stats, current_rows,
+                                                  tag_column, deleted_tables)
+            if full_reason is None:
+                summary_count = refresh_incremental(cursor, actual_tables, state['source_stats'], table_name,
+                                                    summary_filter, tag_column, insert_sql, current_rows,
+                                                    deleted_tables)
+                if summary_count is None:
+                    full_reason = "c表有 tag_id 为空的变更行"
+            if full_reason:
+                print(f"全量刷新: {full_reason}")
 
         # 执行聚合
-        cursor.execute(f"TRUNCATE TABLE `{table_name}`")
-        cursor.execute(sql)
+        if full_reason:
+            cursor.execute(clear_sql)
+            cursor.execute(insert_sql)
+            summary_count = cursor.rowcount
+
+        if is_incremental(config):
+            # 与汇总数据在同一事务中提交
+            save_refresh_state(cursor, summary_key, validation_hash, source_stats, summary_count,
+                               datetime.now() if full_reason else state['last_full_refresh'])
         connection.commit()
 
-        cursor.execute(f"SELECT COUNT(*) FROM `{table_name}`")
-        summary_count = cursor.fetchone()[0]
-        ensure_result_consumed(cursor)
+        # 一致性校验：增量结果与全量重算不一致时立即全量刷新
+        if not full_reason and config.get('consistency_check', False):
+            if not check_consistency(cursor, table_name, summary_filter, select_sql, config['column_order']):
+                print("全量刷新: 一致性校验失败")
+                cursor.execute(clear_sql)
+                cursor.execute(insert_sql)
+                summary_count = cursor.rowcount
+                save_refresh_state(cursor, summary_key, validation_hash, source_stats, summary_count,
+                                   datetime.now())
+                connection.commit()
 
         print(f"数据已成功聚合到 {table_name}")
         print(f"汇总表行数: {summary_count}")
 
-        # 示例数据
-        if summary_count > 0:
-            cursor.execute(f"SELECT * FROM `{table_name}` LIMIT 3")
+        # 示例数据（仅 verbose 模式）
+        if verbose and summary_count > 0:
+            cursor.execute(sample_sql)
             rows = cursor.fetchall()
             print("示例数据:")
             for row in rows:
                 print(row)
             ensure_result_consumed(cursor)
 
+        return summary_count
+
     except Error as e:
         print(f"数据聚合错误: {e}")
         import traceback
@@ -255,16 +896,69 @@ def aggregate_data(connection, config, base_id, base_name):
         cursor.close()
 
 
+def process_base(connection, config, base_id, base_name):
+    """处理单个基地（建表 + 聚合），返回该基地的结果；异常不外抛，使各基地相互隔离"""
+    result = {'base_id': base_id, 'base': base_name, 'success': False, 'rows': None, 'elapsed': 0.0, 'error': None}
+    start_time = time.time()
+    try:
+        prepare_base_table(connection, config, base_id, base_name)
+        result['rows'] = aggregate_data(connection, config, base_id, base_name)
+        result['success'] = result['rows'] is not None
+        if not result['success']:
+            result['error'] = "数据聚合错误"
+    except SystemExit:
+        # 建表/校验失败时上述函数会调用 sys.exit(1)，这里只记为该基地失败
+        result['error'] = "建表或校验失败"
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        result['elapsed'] = time.time() - start_time
+    return result
+
+
+def process_base_from_pool(pool, config, base_id, base_name):
+    """从连接池取一个连接处理单个基地，处理完归还连接"""
+    try:
+        connection = pool.get_connection()
+    except Error as e:
+        return {'base_id': base_id, 'base': base_name, 'success': False, 'rows': None, 'elapsed': 0.0,
+                'error': f"获取连接失败: {e}"}
+    try:
+        return process_base(connection, config, base_id, base_name)
+    finally:
+        connection.close()
+
+
+def print_summary(results):
+    """打印各基地聚合结果汇总"""
+    print("\n=== 聚合结果汇总 ===")
+    for r in results:
+        if r['success']:
+            print(f"  ✅ {r['base_id']}_{r['base']}: {r['rows']} 行, 耗时 {r['elapsed']:.2f}秒")
+        else:
+            print(f"  ❌ {r['base_id']}_{r['base']}: 失败 ({r['error']}), 耗时 {r['elapsed']:.2f}秒")
+    failed = [r['base'] for r in results if not r['success']]
+    print(f"成功 {len(results) - len(failed)} 个, 失败 {len(failed)} 个" + (f": {', '.join(failed)}" if failed else ""))
+
+
 def main():
     print("开始数据聚合流程...")
     config_path = "2_table_aggregator_config.json"
     config = load_config(config_path)
+
+    # 并行度：各基地写入互不相交的汇总表，可按 max_workers 并行聚合（默认 1 即串行）
+    max_workers = max(1, min(int(config.get('max_workers', 1)), len(BASE_MAPPING)))
+    if max_workers > 1:
+        main_parallel(config, max_workers)
+        return
+
     connection = create_connection()
 
     try:
+        if is_partitioned(config):
+            create_unified_table(connection, get_unified_table_name(config), build_column_types(config))
         for base_id, base_name in BASE_MAPPING.items():
-            table_name = config['table_name_template'].format(base_id=base_id, base_name=base_name)
-            create_summary_table(connection, table_name, config['column_order'])
+            prepare_base_table(connection, config, base_id, base_name)
             aggregate_data(connection, config, base_id, base_name)
             print("-" * 60)
         print("\n✅ 所有基地数据聚合完成!")
@@ -278,5 +972,30 @@ def main():
             print("数据库连接已关闭")
 
 
+def main_parallel(config, max_workers):
+    """并行模式：基于连接池按基地并行聚合，单个基地失败不影响其他基地"""
+    print(f"并行聚合模式, 并行度: {max_workers}")
+    start_time = time.time()
+    pool = create_connection_pool(max_workers)
+
+    # 统一分区表需在各基地并行写入前建好
+    if is_partitioned(config):
+        connection = pool.get_connection()
+        try:
+            create_unified_table(connection, get_unified_table_name(config), build_column_types(config))
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(process_base_from_pool, pool, config, base_id, base_name)
+            for base_id, base_name in BASE_MAPPING.items()
+        ]
+        results = [future.result() for future in futures]
+
+    print_summary(results)
+    print(f"\n所有基地数据聚合完成! 总耗时: {time.time() - start_time:.2f}秒")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,19 +1,169 @@
 import json
 import os
 import pandas as pd
+import pickle
+import shutil
 import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from sqlalchemy import create_engine, text
-
-
-def process_base(i, base, config, timestamp):
-    """处理单个基地：建合并表 + 内存 JOIN 导出 Excel"""
+from excel_export import ShardedSheet, create_workbook, iter_frame_chunks, write_shard_index
+from ledger_snapshot import SnapshotWriter
+
+
+# 基地并行方式：thread 线程池（I/O 为主时足够）；process 进程池（合并、列宽计算、xlsx 序列化等 CPU 密集部分不受 GIL 限制）
+EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+# JOIN 执行位置：database 在 MySQL 中建合并表后直接读取；memory 只读取所需列在内存中 JOIN
+JOIN_LOCATIONS = ('database', 'memory')
+
+# 采集点表需要的列（合并后 id 重命名为 point_id）
+POINT_COLUMNS = ['id', 'tag_name', 'tag_code', 'tag_desc', 'ori_tag_name',
+                 'equipment_id', 'general_attribute', 'business_attribute',
+                 'classification', 'verify_status', 'device_id']
+# 设备表需要的列（不含 id）
+DEVICE_COLUMNS = ['equipment_name', 'equipment_code', 'base_name', 'workshop',
+                  'workshop_section', 'production_processes', 'equipment_type',
+                  'equipment_sub_type', 'equipment_attribute']
+
+# 合并结果的列（重命名前）；device_id 为采集点表的数据源ID
+keep_cols = ['point_id'] + POINT_COLUMNS[1:] + DEVICE_COLUMNS + ['source_device_name']
+
+# 持久化合并表的列（数据库 / 内存两种方式写出同一表结构）：device_id 为设备表 id，
+# source_id 为数据源表 id，point_device_id 为采集点表的 device_id（即导出中的 device_id）
+MERGED_TABLE_COLUMNS = ([('p.id', 'point_id')] + [(f'p.{col}', col) for col in POINT_COLUMNS[1:-1]]
+                        + [('d.id', 'device_id')] + [(f'd.{col}', col) for col in DEVICE_COLUMNS]
+                        + [('g.id', 'source_id'), ('g.device_name', 'source_device_name'),
+                           ('p.device_id', 'point_device_id')])
+
+
+def create_merged_table(conn, point_table, device_table, source_table, merged_table, empty=False):
+    """
+    在数据库中建合并表（持久化），point_device_id 保留采集点表的 device_id 供导出使用；
+    empty=True 时只按同一 SELECT 建出空表（列类型与数据库 JOIN 时一致），供内存合并的结果写回
+    """
+    conn.execute(text(f"DROP TABLE IF EXISTS `{merged_table}`"))
+    select_items = ",\n            ".join(f"{expr} AS {alias}" for expr, alias in MERGED_TABLE_COLUMNS)
+    create_sql = text(f"""
+        CREATE TABLE `{merged_table}` AS
+        SELECT 
+            {select_items}
+        FROM `{point_table}` p
+        LEFT JOIN `{device_table}` d ON p.equipment_id = d.id
+        LEFT JOIN `{source_table}` g ON p.device_id = g.id{" WHERE 1 = 0" if empty else ""}
+    """)
+    conn.execute(create_sql)
+    conn.commit()
+
+
+def read_merged_table(conn, merged_table, chunk_size):
+    """以服务端游标分块读取合并表中导出所需的列（逐块产出），列与内存 JOIN 的结果一致"""
+    columns = [f"`{col}`" if col != 'device_id' else "`point_device_id` AS `device_id`" for col in keep_cols]
+    query = text(f"SELECT {', '.join(columns)} FROM `{merged_table}`")
+    yield from pd.read_sql(query, conn.execution_options(stream_results=True), chunksize=chunk_size)
+
+
+def join_in_memory(conn, point_table, device_table, source_table):
+    """
+    只读取所需列，在内存中完成 采集点 ⟕ 设备 ⟕ 数据源 的合并，
+    返回 (导出所需的列, 合并表结构的结果)，后者仅在写回合并表时使用
+    """
+    print(f"  读取采集点表: {point_table}")
+    df_p = pd.read_sql(text(f"SELECT {', '.join(POINT_COLUMNS)} FROM `{point_table}`"), conn)
+
+    print(f"  读取设备表: {device_table}")
+    df_d = pd.read_sql(text(f"SELECT id, {', '.join(DEVICE_COLUMNS)} FROM `{device_table}`"), conn)
+
+    print(f"  读取数据源表: {source_table}")
+    df_g = pd.read_sql(text(f"SELECT id, device_name AS source_device_name FROM `{source_table}`"), conn)
+
+    df_p_renamed = df_p.rename(columns={'id': 'point_id'})
+
+    # 第一次合并（采集点+设备）
+    df_interim = df_p_renamed.merge(
+        df_d.rename(columns={'id': 'device_id_d'}),
+        left_on='equipment_id',
+        right_on='device_id_d',
+        how='left'
+    )
+
+    # 第二次合并（+数据源）- 使用采集点表的device_id字段
+    df = df_interim.merge(
+        df_g.rename(columns={'id': 'source_id_g'}),
+        left_on='device_id',
+        right_on='source_id_g',
+        how='left'
+    )
+
+    merged = df.rename(columns={'device_id': 'point_device_id', 'device_id_d': 'device_id',
+                                'source_id_g': 'source_id'})
+    return df[keep_cols], merged[[alias for _, alias in MERGED_TABLE_COLUMNS]]
+
+
+def persist_merged_frame(conn, merged, point_table, device_table, source_table, merged_table):
+    """将内存合并的结果写回合并表：先按数据库 JOIN 的 SELECT 建空表，再追加数据，表结构与 database 方式一致"""
+    create_merged_table(conn, point_table, device_table, source_table, merged_table, empty=True)
+    merged.to_sql(merged_table, conn, if_exists='append', index=False, chunksize=5000)
+    conn.commit()
+
+
+def to_export_frame(df, column_mapping, column_order):
+    """重命名列、按 column_order 调整列顺序并去重列名（防止 df[col] 返回 DataFrame），可逐块调用"""
+    df = df.rename(columns=column_mapping)
+    df = df[[col for col in column_order if col in df.columns]]
+    df = df.loc[:, ~df.columns.duplicated(keep='first')]
+    return df.reset_index(drop=True)
+
+
+def write_base_excel(chunks, filepath, chunk_file=None):
+    """
+    将单个基地的合并结果逐块写入 Excel（自适应列宽 + 表格样式），返回写入行数；
+    指定 chunk_file 时各分块同时依次写入该 pickle 中间文件，供合并步骤逐块读回
+    """
+    workbook = create_workbook(filepath)
+    spool = open(chunk_file, 'wb') if chunk_file else None
+    try:
+        # 黄色表头表格样式 + 按内容自适应列宽（最大50字符宽）
+        sheet = ShardedSheet(workbook, "采集点+设备+数据源",
+                             table_style='Table Style Light 11', column_widths='auto', max_width=50)
+        for chunk in chunks:
+            sheet.write_frame(chunk)
+            if spool:
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        sheet.close()
+        return sheet.row_count
+    finally:
+        workbook.close()
+        if spool:
+            spool.close()
+
+
+def iter_chunk_file(chunk_file):
+    """按写入顺序逐块读回 pickle 中间文件"""
+    with open(chunk_file, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def process_base(i, base, config, timestamp, intermediate_dir=None):
+    """
+    处理单个基地：合并 采集点+设备+数据源（数据库或内存中 JOIN 一次）并导出 Excel。
+    结果中附带导出的 DataFrame 供合并步骤直接使用；指定 intermediate_dir 时（进程池）
+    改为写入 pickle 中间文件并只回传路径，避免跨进程传输大对象。
+    """
     try:
         db_config = config["db_config"]
         column_mapping = config["column_mapping"]
         column_order = config["column_order"]
         export_settings = config["export_settings"]
+        join_location = config.get("join_location", "database")
+        if join_location not in JOIN_LOCATIONS:
+            raise ValueError(f"join_location 仅支持: {', '.join(JOIN_LOCATIONS)}")
 
         # 创建数据库连接
         engine = create_engine(
@@ -30,161 +180,70 @@ def process_base(i, base, config, timestamp):
         source_table = f"g数据源表_{i}_{base}"
         merged_table = f"2_采集点+设备+数据源合并表_{i}_{base}"
 
-        with engine.connect() as conn:
-            # === 1. 创建数据库中的合并表（持久化）===
-            print(f"  [1/6] 清理并创建合并表: {merged_table}")
-            conn.execute(text(f"DROP TABLE IF EXISTS `{merged_table}`"))
-            create_sql = text(f"""
-                CREATE TABLE `{merged_table}` AS
-                SELECT 
-                    p.id AS point_id,
-                    p.tag_name,
-                    p.tag_code,
-                    p.tag_desc,
-                    p.ori_tag_name,
-                    p.equipment_id,
-                    p.general_attribute,
-                    p.business_attribute,
-                    p.classification,
-                    p.verify_status,
-                    d.id AS device_id,
-                    d.equipment_name,
-                    d.equipment_code,
-                    d.base_name,
-                    d.workshop,
-                    d.workshop_section,
-                    d.production_processes,
-                    d.equipment_type,
-                    d.equipment_sub_type,
-                    d.equipment_attribute,
-                    g.id AS source_id,
-                    g.device_name AS source_device_name
-                FROM `{point_table}` p
-                LEFT JOIN `{device_table}` d ON p.equipment_id = d.id
-                LEFT JOIN `{source_table}` g ON p.device_id = g.id
-            """)
-            conn.execute(create_sql)
-            conn.commit()
-
-            # === 2. 读取三张原始表 ===
-            print(f"  [2/6] 读取采集点表: {point_table}")
-            df_p = pd.read_sql(text(f"SELECT * FROM `{point_table}`"), conn)
-
-            print(f"  [3/6] 读取设备表: {device_table}")
-            df_d = pd.read_sql(text(f"""
-                SELECT id, equipment_name, equipment_code, base_name, workshop, 
-                       workshop_section, production_processes, equipment_type, 
-                       equipment_sub_type, equipment_attribute 
-                FROM `{device_table}`
-            """), conn)
-
-            print(f"  [4/6] 读取数据源表: {source_table}")
-            df_g = pd.read_sql(text(f"SELECT id, device_name AS source_device_name FROM `{source_table}`"), conn)
-
-        # === 修改后的内存 JOIN 部分 ===
-        print(f"  [5/6] 内存中合并数据...")
-        start_merge = time.time()
-
-        # 指定需要保留的列，减少内存占用
-        keep_cols = ['point_id', 'tag_name', 'tag_code', 'tag_desc', 'ori_tag_name',
-                     'equipment_id', 'general_attribute', 'business_attribute',
-                     'classification', 'verify_status', 'device_id']  # 确保包含device_id
-
-        df_p_renamed = df_p.rename(columns={'id': 'point_id'})[keep_cols]
-
-        # 第一次合并（采集点+设备）
-        df_interim = df_p_renamed.merge(
-            df_d.rename(columns={'id': 'device_id_d'})[
-                ['device_id_d', 'equipment_name', 'equipment_code', 'base_name',
-                 'workshop', 'workshop_section', 'production_processes',
-                 'equipment_type', 'equipment_sub_type', 'equipment_attribute']
-            ],
-            left_on='equipment_id',
-            right_on='device_id_d',
-            how='left'
-        )
-
-        # 第二次合并（+数据源）- 修复连接键
-        df = df_interim.merge(
-            df_g.rename(columns={'id': 'source_id_g'})[
-                ['source_id_g', 'source_device_name']
-            ],
-            left_on='device_id',  # 关键修复：使用采集点表的device_id字段
-            right_on='source_id_g',
-            how='left'
-        )
+        export_path = export_settings.get(base, "")
+        filename = f"{merged_table}_{timestamp}.xlsx"
+        filepath = os.path.join(export_path, filename)
+        result = {
+            'base': base,
+            'index': i,
+            'filepath': filepath,
+            'filename': filename
+        }
 
-        # 删除冗余列
-        df.drop(columns=['device_id_d', 'source_id_g'], inplace=True, errors='ignore')
+        start_merge = time.time()
+        with engine.connect() as conn:
+            if join_location == "database":
+                # === 1. 在数据库中建合并表（持久化），再以服务端游标逐块读取并写出 Excel，不整表读入内存 ===
+                print(f"  [1/3] 清理并创建合并表: {merged_table}")
+                create_merged_table(conn, point_table, device_table, source_table, merged_table)
+                print(f"  合并完成, 耗时: {time.time() - start_merge:.2f}秒")
+                if not export_path:
+                    print(f"警告: {base}的导出路径未配置，跳过导出")
+                    return None
+
+                os.makedirs(export_path, exist_ok=True)
+                print(f"  [2/3] 逐块读取合并表: {merged_table}")
+                print(f"  [3/3] 导出Excel: {filename}")
+                chunks = (to_export_frame(chunk, column_mapping, column_order)
+                          for chunk in read_merged_table(conn, merged_table, config.get("chunk_size", 50000)))
+                # 各分块同时写入中间文件，合并步骤逐块读回（未指定中间目录时合并步骤回读 Excel）
+                chunk_file = os.path.join(intermediate_dir, f"{i}_{base}.chunks.pkl") if intermediate_dir else None
+                rows = write_base_excel(chunks, filepath, chunk_file)
+                print(f"已导出: {filename} ({rows}行)")
+                if chunk_file:
+                    result['chunks'] = chunk_file
+                return result
+
+            # === 1. 内存中合并，按需将结果写回数据库 ===
+            print(f"  [1/3] 内存中合并数据...")
+            df, merged = join_in_memory(conn, point_table, device_table, source_table)
+            if config.get("persist_merged_table", False):
+                print(f"  [2/3] 写回合并表: {merged_table}")
+                persist_merged_frame(conn, merged, point_table, device_table, source_table, merged_table)
+            del merged
 
         print(f"  合并完成, 耗时: {time.time() - start_merge:.2f}秒")
         print(f"  合并后数据大小: {len(df)}行 x {len(df.columns)}列")
 
-        # === 4. 重命名列 ===
-        df.rename(columns=column_mapping, inplace=True)
-
-        # === 5. 调整列顺序 ===
-        valid_columns = [col for col in column_order if col in df.columns]
-        df = df[valid_columns]
-
-        # === 6. 关键修复：去重列名（防止 df[col] 返回 DataFrame）===
-        df = df.loc[:, ~df.columns.duplicated(keep='first')].copy()
-        df.reset_index(drop=True, inplace=True)
+        # === 2. 重命名列、调整列顺序并去重列名 ===
+        df = to_export_frame(df, column_mapping, column_order)
 
-        # === 7. 导出 Excel ===
-        export_path = export_settings.get(base, "")
+        # === 3. 导出 Excel ===
         if not export_path:
             print(f"警告: {base}的导出路径未配置，跳过导出")
             return None
 
         os.makedirs(export_path, exist_ok=True)
-        filename = f"{merged_table}_{timestamp}.xlsx"
-        filepath = os.path.join(export_path, filename)
-
-        print(f"  [6/6] 导出Excel: {filename}")
-        with pd.ExcelWriter(filepath, engine='xlsxwriter') as writer:
-            sheet_name = "采集点+设备+数据源"
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            workbook = writer.book
-            worksheet = writer.sheets[sheet_name]
-
-            # === 安全设置列宽（终极修复版）===
-            for idx, col in enumerate(df.columns):
-                # 安全获取列数据（使用 .iloc 避免列名问题）
-                series = df.iloc[:, idx]
-                # 转为字符串并填充空值
-                str_series = series.astype(str).fillna('')
-                # 计算每行长度
-                lengths = str_series.str.len()
-                max_data_len = lengths.max()
-
-                # 确保 max_data_len 是标量（处理 Series 或 NaN）
-                if isinstance(max_data_len, pd.Series):
-                    max_data_len = max_data_len.max()  # 再取一次最大值
-                if pd.isna(max_data_len):
-                    max_data_len = 0
-
-                max_header_len = len(str(col))
-                max_len = max(max_data_len, max_header_len) + 2  # 增加 padding
-                worksheet.set_column(idx, idx, min(max_len, 50))  # 最大50字符宽
-
-            # === 添加表格样式（黄色表头）===
-            (max_row, max_col) = df.shape
-            column_settings = [{"header": column} for column in df.columns]
-            worksheet.add_table(0, 0, max_row, max_col - 1, {
-                'columns': column_settings,
-                'style': 'Table Style Light 11',
-                'autofilter': True
-            })
+        print(f"  [3/3] 导出Excel: {filename}")
+        write_base_excel(iter_frame_chunks(df), filepath)
 
         print(f"已导出: {filename}")
-        return {
-            'base': base,
-            'index': i,
-            'filepath': filepath,
-            'filename': filename
-        }
+        if intermediate_dir:
+            result['intermediate'] = os.path.join(intermediate_dir, f"{i}_{base}.pkl")
+            df.to_pickle(result['intermediate'])
+        else:
+            result['df'] = df
+        return result
 
     except Exception as e:
         print(f"处理{base}基地时出错: {str(e)}")
@@ -197,8 +256,26 @@ def process_base(i, base, config, timestamp):
             engine.dispose()
 
 
+def load_base_chunks(file_info):
+    """
+    逐块取回基地导出的数据：优先使用内存中的 DataFrame（取出后释放引用），其次分块中间文件（database 方式，逐块读回）
+    与整表中间文件（进程池），最后才回读 Excel
+    """
+    if 'df' in file_info:
+        return iter_frame_chunks(file_info.pop('df'))
+    if 'chunks' in file_info:
+        return iter_chunk_file(file_info['chunks'])
+    if 'intermediate' in file_info:
+        return iter_frame_chunks(pd.read_pickle(file_info['intermediate']))
+    return iter_frame_chunks(pd.read_excel(file_info['filepath']))
+
+
 def merge_generated_files(exported_files, merged_export_path, timestamp):
-    """合并所有生成的Excel文件到一个文件中（分页）"""
+    """
+    合并所有基地的导出结果到一个文件中（分页 + 汇总页），不再回读已生成的 Excel。
+    流式写入：各基地数据分块同时写入基地分页和汇总页，不拼接整张汇总表；超过行数上限的工作表自动分片。
+    汇总数据同时写出同名的 Parquet 快照，供下游工具直接读取。
+    """
     print("\n开始合并所有基地文件...")
     start_time = time.time()
 
@@ -207,40 +284,40 @@ def merge_generated_files(exported_files, merged_export_path, timestamp):
     merged_filepath = os.path.join(merged_export_path, merged_filename)
 
     try:
-        with pd.ExcelWriter(merged_filepath, engine='xlsxwriter') as writer:
-            all_dfs = []
-            for file_info in exported_files:
+        workbook = create_workbook(merged_filepath)
+        snapshot = SnapshotWriter(merged_filepath, "汇总")
+        try:
+            # 先按顺序创建全部分页和汇总页，保证工作表顺序
+            base_sheets = [
+                ShardedSheet(workbook, f"{file_info['index']}_{file_info['base']}"[:31],  # Excel 限制31字符
+                               table_style='Table Style Light 11', column_widths='auto', max_width=50)
+                for file_info in exported_files
+            ]
+            summary_sheet = ShardedSheet(workbook, "汇总", table_style='Table Style Medium 16',
+                                         column_widths='auto', max_width=50)
+
+            for file_info, sheet in zip(exported_files, base_sheets):
                 base = file_info['base']
                 print(f"正在读取合并: {base}...")
-                df = pd.read_excel(file_info['filepath'])
-                df.insert(0, '基地', base)
-                all_dfs.append(df)
-
-                # 写入分页
-                sheet_name = f"{file_info['index']}_{base}"[:31]  # Excel 限制31字符
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                worksheet = writer.sheets[sheet_name]
-                (max_row, max_col) = df.shape
-                column_settings = [{"header": column} for column in df.columns]
-                worksheet.add_table(0, 0, max_row, max_col - 1, {
-                    'columns': column_settings,
-                    'style': 'Table Style Light 11',
-                    'autofilter': True
-                })
-
-            # 写汇总页
-            if all_dfs:
-                summary_df = pd.concat(all_dfs, ignore_index=True)
-                summary_df.to_excel(writer, sheet_name="汇总", index=False)
-                worksheet = writer.sheets["汇总"]
-                (max_row, max_col) = summary_df.shape
-                column_settings = [{"header": column} for column in summary_df.columns]
-                worksheet.add_table(0, 0, max_row, max_col - 1, {
-                    'columns': column_settings,
-                    'style': 'Table Style Medium 16',
-                    'autofilter': True
-                })
-
+                for chunk in load_base_chunks(file_info):
+                    chunk = chunk.copy()
+                    chunk.insert(0, '基地', base)
+                    sheet.write_frame(chunk)
+                    summary_sheet.write_frame(chunk)
+                    snapshot.write(chunk)
+                sheet.close()
+
+            summary_sheet.close()
+
+            # 超过 Excel 行数上限的工作表已自动分片（汇总、汇总_2 …），追加分片索引页
+            for sheet in write_shard_index(workbook, base_sheets + [summary_sheet]):
+                print(f"{sheet.name} 页共 {sheet.row_count} 行，已分片为 {len(sheet.shards)} 页")
+        finally:
+            workbook.close()
+            snapshot_filepath = snapshot.close()
+
+        if snapshot_filepath:
+            print(f"Parquet 快照已保存: {snapshot_filepath}")
         print(f"合并完成! 耗时: {time.time() - start_time:.2f}秒")
         return merged_filepath
 
@@ -263,10 +340,17 @@ def merge_and_export():
         print(f"开始处理 {len(base_list)} 个基地...")
         start_time = time.time()
 
-        # 并行处理
-        max_workers = min(8, len(base_list))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            tasks = [(i + 1, base, config, timestamp) for i, base in enumerate(base_list)]
+        # 并行处理（进程池时每个进程自建数据库连接，只回传文件信息）
+        executor_name = config.get("executor", "thread")
+        if executor_name not in EXECUTORS:
+            raise ValueError(f"executor 仅支持: {', '.join(EXECUTORS)}")
+        max_workers = max(1, min(int(config.get("max_workers", 8)), len(base_list)))
+        print(f"并行方式: {executor_name}, 并行度: {max_workers}")
+        # 中间文件目录：进程池回传结果，以及 database 方式下逐块暂存导出数据供合并步骤读回
+        use_intermediate = executor_name == 'process' or config.get("join_location", "database") == "database"
+        intermediate_dir = tempfile.mkdtemp(prefix='merge_tables_') if use_intermediate else None
+        with EXECUTORS[executor_name](max_workers=max_workers) as executor:
+            tasks = [(i + 1, base, config, timestamp, intermediate_dir) for i, base in enumerate(base_list)]
             futures = [executor.submit(process_base, *task) for task in tasks]
             for future in futures:
                 result = future.result()
@@ -275,11 +359,15 @@ def merge_and_export():
 
         print(f"\n所有基地处理完成! 总耗时: {time.time() - start_time:.2f}秒")
 
-        if exported_files:
-            merged_filepath = merge_generated_files(exported_files, merged_export_path, timestamp)
-            print(f"\n合并文件已生成: {merged_filepath}")
-        else:
-            print("没有文件可合并")
+        try:
+            if exported_files:
+                merged_filepath = merge_generated_files(exported_files, merged_export_path, timestamp)
+                print(f"\n合并文件已生成: {merged_filepath}")
+            else:
+                print("没有文件可合并")
+        finally:
+            if intermediate_dir:
+                shutil.rmtree(intermediate_dir, ignore_errors=True)
 
     except FileNotFoundError:
         print("错误: 未找到配置文件 3_config.json")
@@ -291,6 +379,49 @@ def merge_and_export():
         traceback.print_exc()
 
 
+def make_benchmark_frame(rows, seed):
+    """生成与合并结果同结构的合成数据（含中文、空值），用于基准测试"""
+    data = {}
+    for n, col in enumerate(keep_cols):
+        values = [f"{col}_{seed}_{r % 997}_{'车间设备' * (r % 5)}" for r in range(rows)]
+        data[col] = [None if (r + n) % 13 == 0 else v for r, v in enumerate(values)]
+    return pd.DataFrame(data)
+
+
+def benchmark_task(index, rows, output_dir):
+    """基准测试任务：生成一个基地的数据并写出 Excel（与 process_base 的 CPU 部分一致），只回传耗时"""
+    start = time.time()
+    df = make_benchmark_frame(rows, index)
+    write_base_excel(iter_frame_chunks(df), os.path.join(output_dir, f"benchmark_{index}.xlsx"))
+    return time.time() - start
+
+
+def benchmark(base_count=12, rows=20000):
+    """对比线程池与进程池在不同并行度下生成 12 个基地 Excel 的总耗时"""
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({n for n in (1, 2, 4, 8, cpu_count) if n <= cpu_count})
+    print(f"基准测试: {base_count} 个基地 x {rows} 行, CPU 核数: {cpu_count}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for executor_name, executor_cls in EXECUTORS.items():
+            for workers in worker_counts:
+                start = time.time()
+                with executor_cls(max_workers=workers) as executor:
+                    futures = [executor.submit(benchmark_task, i, rows, output_dir) for i in range(base_count)]
+                    for future in futures:
+                        future.result()
+                results[(executor_name, workers)] = time.time() - start
+
+    baseline = results[('thread', 1)]
+    for (executor_name, workers), elapsed in results.items():
+        print(f"{executor_name:>7} x {workers:<2}: 耗时 {elapsed:.2f}秒, 相对单线程 {baseline / elapsed:.2f}x")
+    return results
+
+
 if __name__ == "__main__":
-    merge_and_export()
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        merge_and_export()
     print("程序已正常退出")
\ No newline at end of file
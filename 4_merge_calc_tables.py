@@ -1,9 +1,13 @@
 import pandas as pd
 import pymysql
+import itertools
+import json
 from sqlalchemy import create_engine
 from datetime import datetime
 import time
 import os
+from excel_export import ShardedSheet, create_workbook, write_shard_index
+from ledger_snapshot import LedgerStore, SnapshotWriter
 
 # 数据库连接配置
 db_config = {
@@ -33,6 +37,21 @@ tables = [
     '1_汇总表_12_巴彦淖尔'
 ]
 
+# 汇总表存储方式与统一汇总表表名读取自 2_table_aggregator.py 的配置文件（storage_mode / unified_table_name），
+# 配置文件不存在时使用下面的默认值
+# per_base: 逐表读取；partitioned: 从按 base_id 分区的统一汇总表一次读取
+aggregator_config_path = '2_table_aggregator_config.json'
+storage_mode = 'per_base'
+unified_table = '1_汇总表'
+
+# 逐表读取时每批行数
+read_chunk_size = 50000
+
+# 本地台账快照库（SQLite）：每次导出追加一个批次的汇总数据，供 6_daily_changelog.py 按批次对比
+snapshot_store = os.path.join(output_directory, 'ledger_snapshots.sqlite')
+# 快照库保留天数（更早的批次在导出后删除）
+snapshot_keep_days = 30
+
 
 # 创建数据库连接
 def create_db_connection():
@@ -46,6 +65,19 @@ def create_db_connection():
         return None
 
 
+# 读取聚合配置中的汇总表存储方式，与 2_table_aggregator.py 保持一致
+def load_storage_settings():
+    global storage_mode, unified_table
+    if not os.path.exists(aggregator_config_path):
+        print(f"未找到聚合配置 {aggregator_config_path}，按默认存储方式读取: {storage_mode}")
+        return
+    with open(aggregator_config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    storage_mode = config.get('storage_mode', storage_mode)
+    unified_table = config.get('unified_table_name', unified_table)
+    print(f"汇总表存储方式: {storage_mode}" + (f" ({unified_table})" if storage_mode == 'partitioned' else ""))
+
+
 # 确保输出目录存在
 def ensure_output_directory():
     try:
@@ -58,60 +90,146 @@ def ensure_output_directory():
         return False
 
 
-# 导出数据到Excel
+# 分区模式：一条查询按 base_id 顺序以服务端游标分块读取所有基地（WHERE base_id IN 只扫描涉及的分区）
+def read_unified_chunks(engine):
+    base_ids = ', '.join(str(int(table.split('_')[2])) for table in tables)
+    query = f"SELECT * FROM `{unified_table}` WHERE `base_id` IN ({base_ids}) ORDER BY `base_id`"
+    with engine.connect() as conn:
+        yield from pd.read_sql(query, conn.execution_options(stream_results=True), chunksize=read_chunk_size)
+
+
+# 分区模式：将统一汇总表的分块按 base_id 逐块拆分给各基地（同一基地的分块连续），内存占用与总行数无关；
+# 读取失败时抛出异常，由调用方放弃本次导出
+def read_unified_table(engine):
+    table_by_id = {int(table.split('_')[2]): table for table in tables}
+    failed = []
+    columns = []
+
+    def pieces():
+        try:
+            for chunk in read_unified_chunks(engine):
+                columns[:] = [col for col in chunk.columns if col != 'base_id']
+                for base_id, piece in chunk.groupby('base_id', sort=False):
+                    yield int(base_id), piece.drop(columns='base_id').reset_index(drop=True)
+        except Exception as e:
+            print(f"读取统一汇总表 {unified_table} 时出错: {e}")
+            failed.append(e)
+            raise
+
+    exported = set()
+    for base_id, group in itertools.groupby(pieces(), key=lambda item: item[0]):
+        exported.add(base_id)
+        yield table_by_id[base_id], (piece for _, piece in group)
+    if failed:
+        raise RuntimeError(f"统一汇总表 {unified_table} 读取中断") from failed[0]
+    print(f"统一汇总表 {unified_table} 读取完成")
+
+    # 没有数据的基地只写表头
+    for base_id, table in table_by_id.items():
+        if base_id not in exported:
+            yield table, [pd.DataFrame(columns=columns)]
+
+
+# 以服务端游标分块读取单张表
+def read_table_chunks(engine, table):
+    with engine.connect() as conn:
+        query = f"SELECT * FROM `{table}`"
+        yield from pd.read_sql(query, conn.execution_options(stream_results=True), chunksize=read_chunk_size)
+
+
+# 逐表读取各基地汇总表（分块）
+def read_per_base_tables(engine):
+    for table in tables:
+        yield table, read_table_chunks(engine, table)
+
+
+# 导出数据到Excel（constant_memory 流式写入：分块同时写入基地分页和汇总页，不拼接整张汇总表）
 def export_tables_to_excel():
     # 确保输出目录存在
     if not ensure_output_directory():
         return
 
     # 生成时间戳
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    run_time = datetime.now()
+    timestamp = run_time.strftime("%Y%m%d%H%M%S")
     filename = f'【合并】计算逻辑_{timestamp}.xlsx'
     filepath = os.path.join(output_directory, filename)
 
+    load_storage_settings()
+
     # 创建数据库连接
     engine = create_db_connection()
     if engine is None:
         return
 
-    # 创建一个ExcelWriter对象
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        all_data_frames = []  # 存储所有数据框用于汇总
+    workbook = create_workbook(filepath)
+    # 汇总数据同时写出同名的 Parquet 快照（保留列类型），变更日志优先读取快照
+    snapshot = SnapshotWriter(filepath, '汇总')
+    store = LedgerStore(snapshot_store)
+    store_run = store.begin_run(run_time, filepath)
+    try:
+        # 先按顺序创建各基地分页和汇总页（简化表名作为sheet名，去掉前缀）
+        # 超过 Excel 行数上限的工作表自动分片（如 汇总、汇总_2 …）
+        sheets = {table: ShardedSheet(workbook, table.split('_')[-1], column_widths='auto') for table in tables}
+        summary_sheet = ShardedSheet(workbook, '汇总', column_widths='auto')
 
         # 导出每个表的数据
-        for table in tables:
+        table_frames = read_unified_table(engine) if storage_mode == 'partitioned' else read_per_base_tables(engine)
+        for table, chunks in table_frames:
+            sheet = sheets[table]
+            sheet_name = table.split('_')[-1]
             try:
-                # 从数据库读取数据
-                query = f"SELECT * FROM `{table}`"
-                df = pd.read_sql(query, engine)
-
-                # 简化表名作为sheet名（去掉前缀）
-                sheet_name = table.split('_')[-1]
-
-                # 将数据写入到单独的sheet
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
+                for df in chunks:
+                    # 将数据写入到单独的sheet
+                    sheet.write_frame(df)
 
-                # 添加来源标识列
-                df['数据来源'] = sheet_name
-                all_data_frames.append(df)
+                    # 添加来源标识列后写入汇总sheet
+                    df['数据来源'] = sheet_name
+                    summary_sheet.write_frame(df)
+                    snapshot.write(df)
+                    store_run.write(df)
 
-                print(f"表 {table} 已导出到Sheet: {sheet_name}")
+                print(f"表 {table} 已导出到Sheet: {sheet_name} ({sheet.row_count} 行)")
 
             except Exception as e:
                 print(f"导出表 {table} 时出错: {e}")
+                # 缺少该基地的数据，快照与快照库批次不完整（变更日志会把整个基地当作删除），不予保留
+                if not store_run.failed:
+                    print("⚠️ 本次汇总数据不完整，已放弃 Parquet 快照与快照库批次（Excel 导出不受影响）")
+                snapshot.abort()
+                store_run.abort()
+            finally:
+                sheet.close()
 
-        # 创建汇总sheet（所有数据的拼接）
-        if all_data_frames:
-            try:
-                summary_df = pd.concat(all_data_frames, ignore_index=True)
-                summary_df.to_excel(writer, sheet_name='汇总', index=False)
-                print("汇总Sheet已创建")
-            except Exception as e:
-                print(f"创建汇总Sheet时出错: {e}")
+        summary_sheet.close()
+        if summary_sheet.row_count:
+            print(f"汇总Sheet已创建 ({summary_sheet.row_count} 行)")
         else:
             print("没有数据可以汇总")
+            # 空台账不作为快照库批次，否则下次变更日志会把全部数据当作删除
+            snapshot.abort()
+            store_run.abort()
+
+        # 有分片时追加分片索引页，列出各分片的行范围
+        for sheet in write_shard_index(workbook, list(sheets.values()) + [summary_sheet]):
+            print(f"{sheet.name} Sheet已分片为 {len(sheet.shards)} 页，见分片索引")
+    except Exception:
+        # 导出中断时不保留不完整的快照与快照库批次
+        snapshot.abort()
+        store_run.abort()
+        raise
+    finally:
+        workbook.close()
+        snapshot_filepath = snapshot.close()
+        if store_run.close():
+            pruned = store.prune(snapshot_keep_days)
+            print(f"快照库已追加批次 {store_run.run_id} ({store_run.row_count} 行)"
+                  + (f"，清理过期批次 {pruned} 个" if pruned else ""))
+        store.close()
 
     print(f"文件已保存为: {filepath}")
+    if snapshot_filepath:
+        print(f"Parquet 快照已保存为: {snapshot_filepath}")
     return filepath
 
 
@@ -1,8 +1,15 @@
+import numpy as np
 import pandas as pd
 import os
 import glob
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import sys
+from excel_export import ShardedSheet, create_workbook, read_sharded_sheet, write_frame_sheet
+from ledger_snapshot import (LedgerStore, has_snapshot, load_row_hashes, read_snapshot, run_frame,
+                             same_column_types, save_row_hashes, snapshot_path)
 
 # ================= 配置区域 =================
 
@@ -26,6 +33,31 @@ OUTPUT_DIR = os.path.join(CURRENT_DIR, "change_log")
 SCHEDULED_HOUR = 8
 SCHEDULED_MINUTE = 40
 
+# 7. 对比数据来源: 'store' 从本地快照库按批次对比（库不存在或不足两个批次时回退到按文件对比）；'file' 按台账文件对比
+COMPARE_SOURCE = 'store'
+
+# 8. 快照库路径 (与 4_merge_calc_tables.py 的 snapshot_store 一致)
+SNAPSHOT_STORE = os.path.join(INPUT_DIR, "ledger_snapshots.sqlite")
+
+# 9. 对比方式: 'memory' 两期数据整体读入内存对比；'streaming' 从快照库按主键顺序分批读取两个批次归并对比，
+#    边比较边写出日志，内存占用与台账规模无关（需要快照库，不可用时回退到 'memory'）
+DIFF_MODE = 'memory'
+
+# 10. 流式对比时每批读取/写出的行数
+STREAM_BATCH_ROWS = 5000
+
+# 11. 按基地分区对比的并行进程数: 主键首列为 基地，各基地的对比相互独立；默认 1 逐个基地顺序对比。
+#     大于 1 时在进程池中并行，但每个基地的两期数据都要序列化传给子进程，只有单个基地数据量很大且有多核时才值得开启
+DIFF_WORKERS = 1
+
+# 日志各页：(页名, 无记录时的提示)，前5列固定宽度15
+OUTPUT_SHEETS = [
+    ('修改明细', '本次无修改记录'),
+    ('新增记录', '本次无新增记录'),
+    ('删除记录', '本次无删除记录'),
+]
+OUTPUT_COLUMN_WIDTHS = {col: 15 for col in range(5)}
+
 
 # ===========================================
 
@@ -46,6 +78,12 @@ def parse_time_from_filename(filepath):
         return None
 
 
+def get_target_time(new_time):
+    """基准台账的目标时间：本期时间的前一天 08:40"""
+    target_date = new_time - timedelta(days=1)
+    return target_date.replace(hour=SCHEDULED_HOUR, minute=SCHEDULED_MINUTE, second=0, microsecond=0)
+
+
 def get_comparison_files(directory, pattern):
     """
     逻辑优化版文件查找：
@@ -72,9 +110,7 @@ def get_comparison_files(directory, pattern):
     new_file_path, new_file_time = valid_files[0]
 
     # 3. 计算“目标基准时间” (Target Time)
-    # 逻辑：昨天 + 08:40:00
-    target_date = new_file_time - timedelta(days=1)
-    target_time = target_date.replace(hour=SCHEDULED_HOUR, minute=SCHEDULED_MINUTE, second=0, microsecond=0)
+    target_time = get_target_time(new_file_time)
 
     print(f"🔍 文件定位逻辑:")
     print(f"   1. 选定最新文件: {os.path.basename(new_file_path)} ({new_file_time})")
@@ -100,16 +136,104 @@ def get_comparison_files(directory, pattern):
     return new_file_path, best_old_file
 
 
-def run_comparison():
-    print("=" * 60)
-    print(f"启动自动变更日志生成脚本 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+def read_ledgers(new_file, old_file):
+    """
+    读取本期与基准台账的汇总数据：两份台账都有 Parquet 快照时直接读快照（保留列类型，远快于解析 xlsx），
+    否则两份都读 Excel，避免两种来源的类型差异（如小数精度）被误判为修改。
+    返回 (本期数据, 基准数据, 数据来源 'parquet' / 'excel')。
+    """
+    if has_snapshot(new_file, TARGET_SHEET) and has_snapshot(old_file, TARGET_SHEET):
+        print("   📦 读取 Parquet 快照")
+        return read_snapshot(new_file), read_snapshot(old_file), 'parquet'
+    # 超过 Excel 行数上限时汇总页被分片为 汇总、汇总_2 …，按顺序拼接读取
+    return read_sharded_sheet(new_file, TARGET_SHEET), read_sharded_sheet(old_file, TARGET_SHEET), 'excel'
 
-    ensure_dir(OUTPUT_DIR)
 
+def get_row_hashes(ledger_file, df_idx, source):
+    """
+    行指纹：按主键对非主键列计算 64 位哈希。优先读取台账旁保存的指纹（基准台账在前一天作为本期时已保存），
+    没有或已失效（数据来源、文件修改时间、列不一致）时重新计算并保存，供下次作为基准时直接使用。
+    """
+    read_path = snapshot_path(ledger_file) if source == 'parquet' else ledger_file
+    info = {'source': source, 'source_mtime': os.path.getmtime(read_path),
+            'columns': [str(col) for col in df_idx.columns]}
+    hashes = load_row_hashes(ledger_file, info, KEY_COLS)
+    if hashes is not None:
+        return hashes
+
+    hashes = pd.util.hash_pandas_object(df_idx, index=False)
+    try:
+        save_row_hashes(ledger_file, hashes, info)
+    except Exception as e:
+        print(f"⚠️ 保存行指纹失败（不影响本次对比）: {e}")
+    return hashes
+
+
+def filter_changed_rows(common_indices, new_hashes, old_hashes):
+    """只保留行指纹不同的共同主键（重复主键取第一条，与字段级对比一致）"""
+    new_hashes = new_hashes[~new_hashes.index.duplicated()].reindex(common_indices)
+    old_hashes = old_hashes[~old_hashes.index.duplicated()].reindex(common_indices)
+    return common_indices[new_hashes.to_numpy() != old_hashes.to_numpy()]
+
+
+def column_differs(new_col, old_col):
+    """
+    整列比较（按行对齐），返回是否变更的布尔数组：两边都为空视为相同，否则按 str(值) 比较。
+    同为非 object 类型的列直接按值比较（值相等即文本相同），其余逐元素转文本后比较。
+    """
+    both_na = new_col.isna().to_numpy() & old_col.isna().to_numpy()
+    if new_col.dtype == old_col.dtype and new_col.dtype != object:
+        differs = new_col.to_numpy() != old_col.to_numpy()
+    else:
+        differs = new_col.map(str).to_numpy() != old_col.map(str).to_numpy()
+    return differs & ~both_na
+
+
+def diff_modified(df_new_idx, df_old_idx, common_indices):
+    """
+    向量化的字段级对比：按主键对齐一次后逐列整列比较，再展开为“每个变更字段一行”的明细
+    （与逐行逐列比较的结果一致：行按 common_indices 顺序，同一行内按列顺序）。
+    """
+    compare_columns = [c for c in df_new_idx.columns if c in df_old_idx.columns]
+    # 重复主键只保留第一条参与对比
+    new = df_new_idx[~df_new_idx.index.duplicated()].loc[common_indices]
+    old = df_old_idx[~df_old_idx.index.duplicated()].loc[common_indices, compare_columns]
+
+    row_parts, col_parts, old_parts, new_parts = [], [], [], []
+    for col_pos, col in enumerate(compare_columns):
+        rows = np.flatnonzero(column_differs(new[col], old[col]))
+        if len(rows):
+            row_parts.append(rows)
+            col_parts.append(np.full(len(rows), col_pos))
+            old_parts.append(old[col].to_numpy(dtype=object)[rows])
+            new_parts.append(new[col].to_numpy(dtype=object)[rows])
+    if not row_parts:
+        return pd.DataFrame()
+
+    row_pos = np.concatenate(row_parts)
+    col_pos = np.concatenate(col_parts)
+    order = np.lexsort((col_pos, row_pos))
+    row_pos = row_pos[order]
+
+    record = {key_name: new.index.get_level_values(i).to_numpy(dtype=object)[row_pos]
+              for i, key_name in enumerate(KEY_COLS)}
+    record.update({
+        '变更类型': '修改',
+        '变更字段': np.array(compare_columns, dtype=object)[col_pos[order]],
+        '旧值': np.concatenate(old_parts)[order],
+        '新值': np.concatenate(new_parts)[order],
+        '更新人': new['更新人'].to_numpy(dtype=object)[row_pos] if '更新人' in new.columns else '',
+        '更新时间': new['更新时间'].to_numpy(dtype=object)[row_pos] if '更新时间' in new.columns else '',
+    })
+    return pd.DataFrame(record)
+
+
+def compare_files():
+    """按台账文件对比（Parquet 快照或 Excel），返回 (新增, 删除, 修改明细)，失败时返回 None"""
     # 获取文件 (使用新的逻辑)
     new_file, old_file = get_comparison_files(INPUT_DIR, FILE_PATTERN)
     if not new_file or not old_file:
-        return
+        return None
 
     print(f"✅ 最终锁定文件:")
     print(f"   🆕 New (本期): {os.path.basename(new_file)}")
@@ -117,20 +241,19 @@ def run_comparison():
 
     # 3. 读取数据
     try:
-        df_new = pd.read_excel(new_file, sheet_name=TARGET_SHEET)
-        df_old = pd.read_excel(old_file, sheet_name=TARGET_SHEET)
+        df_new, df_old, source = read_ledgers(new_file, old_file)
     except ValueError as e:
         print(f"❌ 错误: 无法找到 Sheet 页 '{TARGET_SHEET}'")
-        return
+        return None
     except Exception as e:
         print(f"❌ 读取 Excel 失败: {e}")
-        return
+        return None
 
     # 4. 数据预处理
     for col in KEY_COLS:
         if col not in df_new.columns or col not in df_old.columns:
             print(f"❌ 错误: 文件中缺少主键列 '{col}'")
-            return
+            return None
 
     df_new[KEY_COLS] = df_new[KEY_COLS].fillna('未知')
     df_old[KEY_COLS] = df_old[KEY_COLS].fillna('未知')
@@ -141,8 +264,32 @@ def run_comparison():
     if df_new_idx.index.duplicated().any():
         print("⚠️ 警告: 新文件中存在重复的复合主键！对比结果可能不准确。")
 
-    # 5. 核心对比逻辑
+    # 5. 核心对比逻辑：行指纹整体计算（并保存），按基地分区后各自对比
+    new_hashes = get_row_hashes(new_file, df_new_idx, source)
+    if list(df_new_idx.columns) == list(df_old_idx.columns):
+        old_hashes = get_row_hashes(old_file, df_old_idx, source)
+    else:
+        print("   列结构有变化，跳过行指纹预筛")
+        new_hashes = old_hashes = None
+
     print("正在执行数据比对...")
+    new_parts = dict(tuple(df_new_idx.groupby(level=0, sort=False)))
+    old_parts = dict(tuple(df_old_idx.groupby(level=0, sort=False)))
+    tasks = []
+    bases = pd.unique(np.concatenate([df_new_idx.index.get_level_values(0), df_old_idx.index.get_level_values(0)]))
+    for base in bases:
+        part_new = new_parts.get(base, df_new_idx.iloc[:0])
+        part_old = old_parts.get(base, df_old_idx.iloc[:0])
+        hashes = (None, None) if new_hashes is None else (
+            new_hashes[new_hashes.index.get_level_values(0) == base],
+            old_hashes[old_hashes.index.get_level_values(0) == base])
+        tasks.append((base, part_new, part_old, *hashes))
+    return run_partitions(compare_partition, tasks)
+
+
+def compare_partition(base, df_new_idx, df_old_idx, new_hashes=None, old_hashes=None):
+    """单个基地的对比，返回 (基地, 新增, 删除, 修改明细, 耗时秒数)；有行指纹时只对指纹不同的行做字段级对比"""
+    start_time = time.time()
 
     # (1) 新增
     added_indices = df_new_idx.index.difference(df_old_idx.index)
@@ -154,77 +301,240 @@ def run_comparison():
 
     # (3) 修改
     common_indices = df_new_idx.index.intersection(df_old_idx.index)
-    compare_columns = [c for c in df_new.columns if c not in KEY_COLS]
+    if new_hashes is not None:
+        common_indices = filter_changed_rows(common_indices, new_hashes, old_hashes)
+    df_modified = diff_modified(df_new_idx, df_old_idx, common_indices)
+    return base, df_added, df_removed, df_modified, time.time() - start_time
+
 
-    modified_rows = []
+def concat_results(frames):
+    frames = [df for df in frames if not df.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
-    for idx in common_indices:
-        row_new = df_new_idx.loc[idx]
-        row_old = df_old_idx.loc[idx]
 
-        for col in compare_columns:
-            if col not in row_old: continue
+def run_partitions(func, tasks):
+    """
+    执行各基地的对比任务（DIFF_WORKERS > 1 时在进程池中并行），输出各基地的变更数与耗时（按变更数从多到少），
+    按任务顺序（基地在台账中首次出现的顺序）合并为 (新增, 删除, 修改明细)。
+    """
+    start_time = time.time()
+    workers = max(1, min(DIFF_WORKERS, len(tasks)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = [future.result() for future in [executor.submit(func, *task) for task in tasks]]
+    else:
+        results = [func(*task) for task in tasks]
+
+    print(f"   按基地对比完成（{len(results)} 个基地，{workers} 个进程，总耗时 {time.time() - start_time:.2f}秒）:")
+    for base, df_added, df_removed, df_modified, elapsed in sorted(
+            results, key=lambda result: len(result[1]) + len(result[2]) + len(result[3]), reverse=True):
+        print(f"     {base}: 新增 {len(df_added)}，删除 {len(df_removed)}，修改 {len(df_modified)}，耗时 {elapsed:.2f}秒")
 
-            val_new = row_new[col]
-            val_old = row_old[col]
+    return tuple(concat_results([result[i] for result in results]) for i in (1, 2, 3))
 
-            if pd.isna(val_new) and pd.isna(val_old): continue
 
-            if str(val_new) != str(val_old):
-                record = {}
-                if len(KEY_COLS) > 1:
-                    for i, key_name in enumerate(KEY_COLS):
-                        record[key_name] = idx[i]
-                else:
-                    record[KEY_COLS[0]] = idx
+def compare_store_runs():
+    """
+    从本地快照库按批次对比：最新批次为本期，离前一天 08:40 最近的批次为基准（按时间索引查找）；
+    新增/删除及行指纹不同的行都由 SQL 按主键索引求出，只有指纹不同的行参与字段级对比。
+    快照库不可用或批次不足时返回 None（回退到按文件对比）。
+    """
+    if not os.path.exists(SNAPSHOT_STORE):
+        print(f"ℹ️ 快照库不存在，按台账文件对比: {SNAPSHOT_STORE}")
+        return None
 
-                record.update({
-                    '变更类型': '修改',
-                    '变更字段': col,
-                    '旧值': val_old,
-                    '新值': val_new,
-                    '更新人': row_new.get('更新人', ''),
-                    '更新时间': row_new.get('更新时间', '')
-                })
-                modified_rows.append(record)
+    store = LedgerStore(SNAPSHOT_STORE)
+    try:
+        runs = select_store_runs(store)
+        if runs is None:
+            return None
+        new_run, old_run = runs
+        bases = store.partitions(new_run, old_run)
+    finally:
+        store.close()
+
+    # 按基地分区，各进程自行打开快照库只查询本基地的行
+    print("正在执行数据比对...")
+    return run_partitions(compare_store_partition,
+                          [(base, SNAPSHOT_STORE, new_run, old_run) for base in bases])
 
-    df_modified = pd.DataFrame(modified_rows)
 
-    # 6. 导出结果
+def compare_store_partition(base, store_path, new_run, old_run):
+    """快照库中单个基地的对比，返回 (基地, 新增, 删除, 修改明细, 耗时秒数)"""
+    start_time = time.time()
+    store = LedgerStore(store_path)
+    try:
+        df_added = store.rows_not_in(new_run, old_run, base)
+        df_removed = store.rows_not_in(old_run, new_run, base)
+        df_new_changed, df_old_changed = store.changed_rows(new_run, old_run, base)
+    finally:
+        store.close()
+
+    for df in (df_added, df_removed):
+        df[KEY_COLS] = df[KEY_COLS].fillna('未知')
+    df_modified = diff_changed_rows(df_new_changed, df_old_changed)
+    return base, df_added, df_removed, df_modified, time.time() - start_time
+
+
+def select_store_runs(store):
+    """最新批次为本期，离前一天 08:40 最近的批次为基准；不足两个批次时返回 None"""
+    new_run = store.latest_run()
+    old_run = store.closest_run(get_target_time(new_run['run_time']), new_run['run_id']) if new_run else None
+    if not old_run:
+        print("ℹ️ 快照库中已完成的批次不足2个，按台账文件对比")
+        return None
+
+    print(f"✅ 快照库批次:")
+    print(f"   🆕 New (本期): 批次 {new_run['run_id']} ({new_run['run_time']}, {new_run['row_count']} 行)")
+    print(f"   🕒 Old (基准): 批次 {old_run['run_id']} ({old_run['run_time']}, {old_run['row_count']} 行)")
+    return new_run, old_run
+
+
+def diff_changed_rows(df_new_changed, df_old_changed):
+    """对快照库中取出的、按主键一一对应的本期行与基准行做字段级对比"""
+    # 库中按文本主键关联，两边统一转为文本后一一对应
+    for df in (df_new_changed, df_old_changed):
+        df[KEY_COLS] = df[KEY_COLS].fillna('未知').astype(str)
+    df_new_idx = df_new_changed.set_index(KEY_COLS)
+    df_old_idx = df_old_changed.set_index(KEY_COLS)
+    return diff_modified(df_new_idx, df_old_idx, df_new_idx.index)
+
+
+def merge_join_runs(new_rows, old_rows):
+    """
+    归并两个按主键有序的行流（行为 (主键, 行指纹, 行 JSON)），逐个主键产出 (主键, 本期行列表, 基准行列表)；
+    一侧列表为空即为新增 / 删除。
+    """
+    new_groups = itertools.groupby(new_rows, key=lambda row: row[0])
+    old_groups = itertools.groupby(old_rows, key=lambda row: row[0])
+    new_item = next(new_groups, None)
+    old_item = next(old_groups, None)
+    while new_item is not None or old_item is not None:
+        if old_item is None or (new_item is not None and new_item[0] < old_item[0]):
+            yield new_item[0], list(new_item[1]), []
+            new_item = next(new_groups, None)
+        elif new_item is None or old_item[0] < new_item[0]:
+            yield old_item[0], [], list(old_item[1])
+            old_item = next(old_groups, None)
+        else:
+            yield new_item[0], list(new_item[1]), list(old_item[1])
+            new_item = next(new_groups, None)
+            old_item = next(old_groups, None)
+
+
+def compare_store_streaming(output_path):
+    """
+    流式对比：从快照库按主键顺序分批读取本期与基准批次做归并，新增/删除/修改明细攒满一批即写出到日志，
+    内存中只保留当前批次（与台账规模无关）。快照库不可用时返回 None，否则返回 (新增行数, 删除行数, 修改明细数)。
+    """
+    if not os.path.exists(SNAPSHOT_STORE):
+        print(f"ℹ️ 快照库不存在，改为内存对比: {SNAPSHOT_STORE}")
+        return None
+
+    store = LedgerStore(SNAPSHOT_STORE)
+    try:
+        runs = select_store_runs(store)
+        if runs is None:
+            return None
+        new_run, old_run = runs
+
+        print("正在执行流式数据比对...")
+        workbook = create_workbook(output_path)
+        sheets = {name: ShardedSheet(workbook, name, column_widths=OUTPUT_COLUMN_WIDTHS) for name, _ in OUTPUT_SHEETS}
+        added, removed, changed_new, changed_old = [], [], [], []
+        hash_filter = same_column_types(new_run, old_run)
+
+        def flush(final=False):
+            if added and (final or len(added) >= STREAM_BATCH_ROWS):
+                df = run_frame(added, new_run)
+                df[KEY_COLS] = df[KEY_COLS].fillna('未知')
+                sheets['新增记录'].write_frame(df)
+                added.clear()
+            if removed and (final or len(removed) >= STREAM_BATCH_ROWS):
+                df = run_frame(removed, old_run)
+                df[KEY_COLS] = df[KEY_COLS].fillna('未知')
+                sheets['删除记录'].write_frame(df)
+                removed.clear()
+            if changed_new and (final or len(changed_new) >= STREAM_BATCH_ROWS):
+                df = diff_changed_rows(run_frame(changed_new, new_run),
+                                       run_frame(changed_old, old_run))
+                if not df.empty:
+                    sheets['修改明细'].write_frame(df)
+                changed_new.clear()
+                changed_old.clear()
+
+        for key, new_rows, old_rows in merge_join_runs(store.iter_rows(new_run, STREAM_BATCH_ROWS),
+                                                       store.iter_rows(old_run, STREAM_BATCH_ROWS)):
+            if not old_rows:
+                added.extend(row[2] for row in new_rows)
+            elif not new_rows:
+                removed.extend(row[2] for row in old_rows)
+            elif not hash_filter or new_rows[0][1] != old_rows[0][1]:
+                # 行指纹不同才做字段级对比（重复主键取各自第一条）；两批次数值列类型不一致时逐行对比
+                changed_new.append(new_rows[0][2])
+                changed_old.append(old_rows[0][2])
+            flush()
+        flush(final=True)
+
+        counts = (sheets['新增记录'].row_count, sheets['删除记录'].row_count, sheets['修改明细'].row_count)
+        for name, empty_tip in OUTPUT_SHEETS:
+            if sheets[name].row_count == 0:
+                sheets[name].write_frame(pd.DataFrame({'提示': [empty_tip]}))
+            sheets[name].close()
+        workbook.close()
+    finally:
+        store.close()
+    return counts
+
+
+def run_comparison():
+    print("=" * 60)
+    print(f"启动自动变更日志生成脚本 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    ensure_dir(OUTPUT_DIR)
+
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_filename = f"日志_计算逻辑变更_{timestamp}.xlsx"
     output_path = os.path.join(OUTPUT_DIR, output_filename)
 
+    if DIFF_MODE == 'streaming':
+        try:
+            counts = compare_store_streaming(output_path)
+        except Exception as e:
+            print(f"❌ 流式对比失败: {e}")
+            return
+        if counts is not None:
+            print(f"📊 对比结果摘要:")
+            print(f"   ➕ 新增行数: {counts[0]}")
+            print(f"   ➖ 删除行数: {counts[1]}")
+            print(f"   ✏️ 修改明细: {counts[2]}")
+            print(f"✅ 日志文件已生成: {output_path}")
+            print("=" * 60)
+            return
+
+    result = compare_store_runs() if COMPARE_SOURCE == 'store' else None
+    if result is None:
+        result = compare_files()
+    if result is None:
+        return
+    df_added, df_removed, df_modified = result
+
+    # 6. 导出结果
     print(f"📊 对比结果摘要:")
     print(f"   ➕ 新增行数: {len(df_added)}")
     print(f"   ➖ 删除行数: {len(df_removed)}")
     print(f"   ✏️ 修改明细: {len(df_modified)}")
 
     try:
-        with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-            # 写入修改页
-            if not df_modified.empty:
-                df_modified.to_excel(writer, sheet_name='修改明细', index=False)
-            else:
-                pd.DataFrame({'提示': ['本次无修改记录']}).to_excel(writer, sheet_name='修改明细', index=False)
-
-            # 写入新增页
-            if not df_added.empty:
-                df_added.to_excel(writer, sheet_name='新增记录', index=False)
-            else:
-                pd.DataFrame({'提示': ['本次无新增记录']}).to_excel(writer, sheet_name='新增记录', index=False)
-
-            # 写入删除页
-            if not df_removed.empty:
-                df_removed.to_excel(writer, sheet_name='删除记录', index=False)
-            else:
-                pd.DataFrame({'提示': ['本次无删除记录']}).to_excel(writer, sheet_name='删除记录', index=False)
-
-            # 格式设置
-            workbook = writer.book
-            for sheet_name in writer.sheets:
-                worksheet = writer.sheets[sheet_name]
-                worksheet.set_column('A:E', 15)
+        workbook = create_workbook(output_path)
+        try:
+            # 修改页 / 新增页 / 删除页，无记录时写入提示
+            for (sheet_name, empty_tip), df in zip(OUTPUT_SHEETS, [df_modified, df_added, df_removed]):
+                if df.empty:
+                    df = pd.DataFrame({'提示': [empty_tip]})
+                write_frame_sheet(workbook, sheet_name, df, column_widths=OUTPUT_COLUMN_WIDTHS)
+        finally:
+            workbook.close()
 
         print(f"✅ 日志文件已生成: {output_path}")
 
@@ -235,4 +545,4 @@ def run_comparison():
 
 
 if __name__ == "__main__":
-    run_comparison()
\ No newline at end of file
+    run_comparison()
@@ -0,0 +1,341 @@
+import datetime as dt
+import itertools
+import math
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from xlsxwriter.utility import xl_range
+
+# 流式表格依赖 xlsxwriter 内部属性（见 _add_streaming_table），只接受已验证的版本，其他版本在导入时即报错
+XLSXWRITER_VERSION = '3.2.9'
+if xlsxwriter.__version__ != XLSXWRITER_VERSION:
+    raise ImportError(
+        f"excel_export 需要 xlsxwriter=={XLSXWRITER_VERSION}（当前 {xlsxwriter.__version__}）：流式表格依赖其内部属性，"
+        f"请安装该版本，或在新版本上通过 tests/test_excel_export.py 后更新 XLSXWRITER_VERSION"
+    )
+
+# 与 pandas.to_excel 一致的表头格式（未使用表格样式的工作表）
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+DATE_FORMAT = 'yyyy-mm-dd'
+
+# 单个工作表最多 1,048,576 行，除去表头后可写入的数据行数
+EXCEL_MAX_ROWS = 1048576
+MAX_DATA_ROWS = EXCEL_MAX_ROWS - 1
+# 工作表名最长 31 个字符
+MAX_SHEET_NAME = 31
+SHARD_INDEX_SHEET = '分片索引'
+
+# 自动列宽：每个工作表只抽样这么多行估算，成本与总行数无关
+WIDTH_SAMPLE_ROWS = 1000
+# 自动列宽缓存：列名 -> 宽度（同名列在各基地分页、汇总页及后续导出中直接复用）
+_width_cache = {}
+
+
+def create_workbook(filepath):
+    """
+    以 constant_memory 模式创建工作簿：每个工作表的行写完即落盘，内存占用不随行数增长。
+    该模式下每个工作表只能按行号递增顺序写入，多个工作表之间可以交替写入。
+    文本按原样写入（与 openpyxl / to_excel 一致）：关闭 xlsxwriter 默认的 URL 与公式识别，
+    否则 '=' 开头的文本会变成公式，单个工作表超过 65,530 个 URL 后的链接会被丢弃。
+    """
+    return xlsxwriter.Workbook(filepath, {'constant_memory': True, 'strings_to_urls': False,
+                                          'strings_to_formulas': False})
+
+
+def shard_name(name, number):
+    """分片工作表名：名称_序号（超长时截断名称部分）"""
+    suffix = f"_{number}"
+    return f"{name[:MAX_SHEET_NAME - len(suffix)]}{suffix}"
+
+
+def _frame_rows(df, columns):
+    """将 DataFrame 按给定表头对齐（缺少的列留空，多出的列丢弃）后转为行迭代器"""
+    if [str(col) for col in df.columns] != columns:
+        df = df.set_axis([str(col) for col in df.columns], axis=1).reindex(columns=columns)
+    return df.itertuples(index=False, name=None)
+
+
+def display_width(text):
+    """文本显示宽度：中日韩等全角字符按 2 计，其余按 1 计"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ('W', 'F') else 1 for ch in text)
+
+
+def sample_frame(df, sample_size=WIDTH_SAMPLE_ROWS):
+    """等间隔抽取至多 sample_size 行（覆盖首尾），用于估算列宽"""
+    if len(df) <= sample_size:
+        return df
+    return df.iloc[np.linspace(0, len(df) - 1, sample_size).astype(int)]
+
+
+def _is_missing(value):
+    """None / NaN / NaT 视为空值（与 to_excel 一致，空值不写入单元格）"""
+    if value is None or value is pd.NaT:
+        return True
+    return isinstance(value, float) and math.isnan(value)
+
+
+# constant_memory 模式下 xlsxwriter 的公开接口无法创建表格（add_table 直接拒绝），
+# 以下两个函数依赖 Worksheet.constant_memory / Worksheet.tables 及表格字典的 range 键，
+# 已按 XLSXWRITER_VERSION 验证（tests/test_excel_export.py），导入时校验版本，升级 xlsxwriter 前需重新验证
+def _add_streaming_table(worksheet, columns, style):
+    """以“表头 + 1 行”的范围创建表格（临时关闭该工作表的 constant_memory），返回表格定义"""
+    worksheet.constant_memory = False
+    try:
+        worksheet.add_table(0, 0, 1, len(columns) - 1, {
+            'columns': [{'header': col} for col in columns],
+            'style': style,
+            'autofilter': True
+        })
+    finally:
+        worksheet.constant_memory = True
+    return worksheet.tables[-1]
+
+
+def _resize_streaming_table(table, last_row, last_col):
+    """写完数据后将表格（及其筛选）范围扩展到实际行数"""
+    table_range = xl_range(0, 0, last_row, last_col)
+    table['range'] = table_range
+    table['a_range'] = table_range
+    table['autofilter'] = table_range
+
+
+class StreamingSheet:
+    """
+    流式写入单个工作表：表头 + 按顺序追加的数据行。
+    table_style 不为空时在结束时生成 Excel 表格（含筛选）；column_widths 为 'auto' 时按抽样估算列宽
+    （抽样行与表头的最大显示宽度 + 2，上限 max_width，按列名缓存），为 {列序号: 宽度} 时使用固定列宽。
+    创建即按顺序添加工作表，因此可先创建全部工作表、再按任意顺序交替写入以保证工作表顺序。
+    """
+
+    def __init__(self, workbook, name, table_style=None, column_widths=None, max_width=50):
+        self.workbook = workbook
+        self.worksheet = workbook.add_worksheet(name)
+        self.table_style = table_style
+        self.column_widths = column_widths
+        self.max_width = max_width
+        self.columns = None
+        self.row_count = 0
+        self._max_lengths = None
+        self._sampled_rows = 0
+        self._table = None
+        self._formats = {}
+
+    def _format(self, key, properties):
+        if key not in self._formats:
+            self._formats[key] = self.workbook.add_format(properties)
+        return self._formats[key]
+
+    def write_header(self, columns):
+        """写入表头（只能调用一次，须在写入数据行之前）"""
+        self.columns = [str(col) for col in columns]
+        self._max_lengths = [display_width(col) for col in self.columns]
+        if self.column_widths == 'auto' and all(col in _width_cache for col in self.columns):
+            # 全部列宽已缓存，无需抽样
+            self._sampled_rows = WIDTH_SAMPLE_ROWS
+
+        if self.table_style:
+            self._table = _add_streaming_table(self.worksheet, self.columns, self.table_style)
+            # add_table 按普通模式写入的表头单元格在 constant_memory 模式下无法落盘，按流式方式重写
+            for col, name in enumerate(self.columns):
+                self.worksheet.write_string(0, col, name)
+        else:
+            header_format = self._format('header', HEADER_FORMAT)
+            for col, name in enumerate(self.columns):
+                self.worksheet.write_string(0, col, name, header_format)
+
+    def _write_value(self, row, col, value):
+        if _is_missing(value):
+            return
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, dt.datetime):
+            if value.tzinfo is not None:
+                value = value.replace(tzinfo=None)
+            self.worksheet.write_datetime(row, col, value, self._format('datetime', {'num_format': DATETIME_FORMAT}))
+        elif isinstance(value, dt.date):
+            self.worksheet.write_datetime(row, col, value, self._format('date', {'num_format': DATE_FORMAT}))
+        elif isinstance(value, float) and math.isinf(value):
+            self.worksheet.write_string(row, col, 'inf' if value > 0 else '-inf')
+        elif isinstance(value, str):
+            self.worksheet.write_string(row, col, value)
+        else:
+            self.worksheet.write(row, col, value)
+
+    def _sample_widths(self, values):
+        for col, value in enumerate(values):
+            if not _is_missing(value):
+                length = display_width(str(value))
+                if length > self._max_lengths[col]:
+                    self._max_lengths[col] = length
+
+    def write_rows(self, rows):
+        """按顺序追加数据行（可迭代的行序列），返回写入行数；自动列宽时只抽样前 WIDTH_SAMPLE_ROWS 行"""
+        track_widths = self.column_widths == 'auto'
+        count = 0
+        for values in rows:
+            self.row_count += 1
+            count += 1
+            for col, value in enumerate(values):
+                self._write_value(self.row_count, col, value)
+            if track_widths and self._sampled_rows < WIDTH_SAMPLE_ROWS:
+                self._sample_widths(values)
+                self._sampled_rows += 1
+        return count
+
+    def write_frame(self, df):
+        """追加一个 DataFrame（分块），首次写入时以其列作为表头"""
+        if self.columns is None:
+            self.write_header(df.columns)
+        if self.column_widths == 'auto' and self._sampled_rows == 0 and len(df) > WIDTH_SAMPLE_ROWS:
+            # 首个分块较大时改为在整个分块上等间隔抽样，而不只看前几行
+            for values in _frame_rows(sample_frame(df), self.columns):
+                self._sample_widths(values)
+            self._sampled_rows = WIDTH_SAMPLE_ROWS
+        return self.write_rows(_frame_rows(df, self.columns))
+
+    def estimated_widths(self):
+        """按列名缓存的自动列宽（未缓存的列取抽样结果并写入缓存）"""
+        return [_width_cache.setdefault(col, min(length + 2, self.max_width))
+                for col, length in zip(self.columns, self._max_lengths)]
+
+    def close(self):
+        """补齐表格范围与列宽（工作簿关闭前调用）"""
+        if self.columns is None:
+            return
+        last_col = len(self.columns) - 1
+
+        if self._table is not None and self.row_count > 1:
+            # 无数据时保留创建时“表头 + 1 空行”的范围（Excel 表格至少含一行数据区）
+            _resize_streaming_table(self._table, self.row_count, last_col)
+
+        if self.column_widths == 'auto':
+            for col, width in enumerate(self.estimated_widths()):
+                self.worksheet.set_column(col, col, width)
+        elif self.column_widths:
+            for col, width in self.column_widths.items():
+                self.worksheet.set_column(col, col, width)
+
+
+class ShardedSheet:
+    """
+    超过单个工作表行数上限时自动分片的工作表：首个分片即 名称 本身（未超限时与 StreamingSheet 相同），
+    超限后的行依次写入 名称_2、名称_3 …（表头相同、列宽一致）；分片名在创建工作表时确定，不再改名。
+    新分片追加在工作簿末尾。其余参数同 StreamingSheet。
+    """
+
+    def __init__(self, workbook, name, max_rows=MAX_DATA_ROWS, **options):
+        self.workbook = workbook
+        self.name = name
+        self.max_rows = max_rows
+        self.options = options
+        self.columns = None
+        self.shards = [StreamingSheet(workbook, name, **options)]
+
+    @property
+    def row_count(self):
+        return sum(shard.row_count for shard in self.shards)
+
+    def _add_shard(self):
+        shard = StreamingSheet(self.workbook, shard_name(self.name, len(self.shards) + 1), **self.options)
+        shard.write_header(self.columns)
+        self.shards.append(shard)
+
+    def write_header(self, columns):
+        """写入表头（只能调用一次，须在写入数据行之前）"""
+        self.shards[0].write_header(columns)
+        self.columns = self.shards[0].columns
+
+    def write_rows(self, rows):
+        """按顺序追加数据行，当前分片写满时切换到新分片，返回写入行数"""
+        rows = iter(rows)
+        count = 0
+        while True:
+            remaining = self.max_rows - self.shards[-1].row_count
+            if remaining <= 0:
+                # 只在确实还有数据时才新建分片
+                first = next(rows, None)
+                if first is None:
+                    return count
+                self._add_shard()
+                rows = itertools.chain([first], rows)
+                continue
+            written = self.shards[-1].write_rows(itertools.islice(rows, remaining))
+            count += written
+            if written < remaining:
+                return count
+
+    def write_frame(self, df):
+        """追加一个 DataFrame（分块），首次写入时以其列作为表头"""
+        if self.columns is None:
+            self.write_header(df.columns)
+        return self.write_rows(_frame_rows(df, self.columns))
+
+    def ranges(self):
+        """各分片的 (工作表名, 起始行, 结束行)，行号为整张逻辑表中的数据行序号（从 1 开始）"""
+        result = []
+        start = 1
+        for shard in self.shards:
+            result.append((shard.worksheet.name, start, start + shard.row_count - 1))
+            start += shard.row_count
+        return result
+
+    def close(self):
+        """关闭全部分片；自动列宽时各分片统一取最大值"""
+        if self.columns is not None and len(self.shards) > 1 and self.options.get('column_widths') == 'auto':
+            max_lengths = [max(lengths) for lengths in zip(*(shard._max_lengths for shard in self.shards))]
+            for shard in self.shards:
+                shard._max_lengths = list(max_lengths)
+        for shard in self.shards:
+            shard.close()
+
+
+def write_shard_index(workbook, sheets, name=SHARD_INDEX_SHEET):
+    """有工作表被分片时，追加一页分片索引，列出每个分片对应的数据行范围；返回被分片的工作表（没有时不写索引页）"""
+    sharded = [sheet for sheet in sheets if len(sheet.shards) > 1]
+    rows = [
+        (sheet.name, shard, start, end, end - start + 1)
+        for sheet in sharded
+        for shard, start, end in sheet.ranges()
+    ]
+    if not rows:
+        return sharded
+    index_sheet = StreamingSheet(workbook, name, column_widths='auto')
+    index_sheet.write_header(['工作表', '分片', '起始行', '结束行', '行数'])
+    index_sheet.write_rows(rows)
+    index_sheet.close()
+    return sharded
+
+
+def read_sharded_sheet(filepath, name):
+    """读取工作表及其后续分片 名称_2、名称_3 …，按顺序拼接（兼容首个分片名为 名称_1 的旧文件）"""
+    with pd.ExcelFile(filepath) as book:
+        if name in book.sheet_names:
+            shard_names = [name]
+        elif shard_name(name, 1) in book.sheet_names:
+            shard_names = [shard_name(name, 1)]
+        else:
+            raise ValueError(f"Worksheet named '{name}' not found")
+        while shard_name(name, len(shard_names) + 1) in book.sheet_names:
+            shard_names.append(shard_name(name, len(shard_names) + 1))
+        if len(shard_names) == 1:
+            return pd.read_excel(book, sheet_name=shard_names[0])
+        return pd.concat([pd.read_excel(book, sheet_name=sheet) for sheet in shard_names], ignore_index=True)
+
+
+def iter_frame_chunks(df, chunk_size=50000):
+    """将 DataFrame 切分为顺序的分块"""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def write_frame_sheet(workbook, name, df, **options):
+    """将单个 DataFrame 流式写入新工作表（超过行数上限时自动分片），参数同 ShardedSheet"""
+    sheet = ShardedSheet(workbook, name, **options)
+    sheet.write_header(df.columns)
+    for chunk in iter_frame_chunks(df):
+        sheet.write_frame(chunk)
+    sheet.close()
+    return sheet
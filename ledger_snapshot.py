@@ -0,0 +1,426 @@
+import itertools
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 快照结构版本：列含义或存储格式变化时递增，读取方遇到不一致的版本时回退读取 Excel
+SNAPSHOT_SCHEMA_VERSION = 1
+SNAPSHOT_COMPRESSION = 'zstd'
+# Parquet 文件元数据中记录快照信息（结构版本、对应的工作表）的键
+_METADATA_KEY = b'ledger_snapshot'
+# 行指纹文件中哈希值所在列
+ROW_HASH_COLUMN = '_row_hash'
+
+# 快照库中建索引的主键列（与 6_daily_changelog.py 的 KEY_COLS 保持一致）
+STORE_KEY_COLS = ['基地', '聚合名称', '采集点ID']
+STORE_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def snapshot_path(excel_path):
+    """与 Excel 台账同名（同一时间戳）的 Parquet 快照路径"""
+    return os.path.splitext(excel_path)[0] + '.parquet'
+
+
+def _column_array(series, field):
+    """按快照结构转换单列；字符串列遇到其他类型的值时转为文本（空值保持为空）"""
+    try:
+        return pa.array(series, type=field.type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        if not pa.types.is_string(field.type):
+            raise
+        return pa.array(series.where(series.isna(), series.astype(str)), type=pa.string(), from_pandas=True)
+
+
+class SnapshotWriter:
+    """
+    与 Excel 台账同时写出的 Parquet 快照（压缩、保留列类型），分块追加为行组，内存占用与总行数无关。
+    首个分块确定列结构（全空列按字符串处理），后续分块按该结构转换；
+    写入出错时删除不完整的快照并停止写入，不影响 Excel 导出。
+    """
+
+    def __init__(self, excel_path, sheet):
+        self.path = snapshot_path(excel_path)
+        self.sheet = sheet
+        self.row_count = 0
+        self.failed = False
+        self._schema = None
+        self._writer = None
+
+    def _create_writer(self, df):
+        schema = pa.Table.from_pandas(df.head(0) if df.empty else df, preserve_index=False).schema
+        fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema]
+        metadata = dict(schema.metadata or {})
+        metadata[_METADATA_KEY] = json.dumps(
+            {'schema_version': SNAPSHOT_SCHEMA_VERSION, 'sheet': self.sheet}, ensure_ascii=False
+        ).encode('utf-8')
+        self._schema = pa.schema(fields, metadata=metadata)
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression=SNAPSHOT_COMPRESSION)
+
+    def write(self, df):
+        """追加一个分块"""
+        if self.failed:
+            return
+        try:
+            if self._writer is None:
+                self._create_writer(df)
+            if list(df.columns) != self._schema.names:
+                raise ValueError(f"列与快照结构不一致: {list(df.columns)}")
+            arrays = [_column_array(df[field.name], field) for field in self._schema]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+            self.row_count += len(df)
+        except (pa.ArrowException, ValueError, OSError) as e:
+            print(f"⚠️ Parquet 快照写入失败，已放弃快照（Excel 导出不受影响）: {e}")
+            self.abort()
+
+    def abort(self):
+        """放弃快照：关闭并删除不完整的文件"""
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except (pa.ArrowException, OSError):
+                pass
+            self._writer = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """结束写入，返回快照路径；未写入任何数据或写入失败时返回 None"""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        return self.path
+
+
+def snapshot_info(path):
+    """读取快照元数据（结构版本、工作表），不是台账快照时返回 None"""
+    metadata = pq.read_schema(path).metadata or {}
+    if _METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[_METADATA_KEY].decode('utf-8'))
+
+
+def has_snapshot(excel_path, sheet=None):
+    """Excel 台账旁是否存在当前结构版本（且对应指定工作表）的 Parquet 快照"""
+    path = snapshot_path(excel_path)
+    if not os.path.exists(path):
+        return False
+    try:
+        info = snapshot_info(path)
+    except (pa.ArrowException, OSError):
+        return False
+    return (info is not None and info.get('schema_version') == SNAPSHOT_SCHEMA_VERSION
+            and (sheet is None or info.get('sheet') == sheet))
+
+
+def read_snapshot(excel_path, columns=None):
+    """读取 Excel 台账对应的 Parquet 快照（可只读指定列）"""
+    return pq.read_table(snapshot_path(excel_path), columns=columns).to_pandas()
+
+
+def row_hash_path(excel_path):
+    """与 Excel 台账同名的行指纹文件路径"""
+    return os.path.splitext(excel_path)[0] + '.row_hashes.parquet'
+
+
+def save_row_hashes(excel_path, hashes, info):
+    """
+    保存行指纹（以主键为索引的 64 位哈希 Series）到台账旁的 Parquet 文件。
+    info 为计算指纹时的条件（数据来源、参与计算的列等），读取时不一致即视为失效。
+    """
+    table = pa.Table.from_pandas(hashes.rename(ROW_HASH_COLUMN).reset_index(), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[_METADATA_KEY] = json.dumps(
+        {'schema_version': SNAPSHOT_SCHEMA_VERSION, **info}, ensure_ascii=False
+    ).encode('utf-8')
+    pq.write_table(table.replace_schema_metadata(metadata), row_hash_path(excel_path),
+                   compression=SNAPSHOT_COMPRESSION)
+
+
+def load_row_hashes(excel_path, info, key_cols):
+    """读取台账旁保存的行指纹，不存在或与 info 不一致时返回 None"""
+    path = row_hash_path(excel_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        if snapshot_info(path) != {'schema_version': SNAPSHOT_SCHEMA_VERSION, **info}:
+            return None
+        df = pq.read_table(path).to_pandas()
+    except (pa.ArrowException, OSError, ValueError):
+        return None
+    return df.set_index(key_cols)[ROW_HASH_COLUMN]
+
+
+def run_frame(row_jsons, run):
+    """
+    由批次的行 JSON 构造 DataFrame，数值列按批次记录的类型转换：快照库按分块保存各自的类型，
+    转换后与同一次导出的 Parquet 快照读回的类型一致（如含空值的整数列为浮点）
+    """
+    df = pd.DataFrame([json.loads(row_json) for row_json in row_jsons], columns=run['columns'])
+    for col, column_type in run['column_types'].items():
+        if col in df.columns:
+            try:
+                df[col] = df[col].astype('int64' if column_type == 'int' else 'float64')
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def same_column_types(run, other_run):
+    """两个批次的数值列类型是否一致（一致时行指纹相同即取值文本相同）"""
+    return bool(run['column_types']) and run['column_types'] == other_run['column_types']
+
+
+class LedgerStore:
+    """
+    本地台账快照库（SQLite）：每次导出追加一个运行批次（run_id + 导出时间）及其汇总数据，
+    行按主键列建索引并带行指纹，变更日志可直接用 SQL 按批次求新增/删除/指纹不同的行。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self._ensure_tables()
+
+    def _ensure_tables(self):
+        keys = ', '.join(f'"{col}" TEXT' for col in STORE_KEY_COLS)
+        key_index = ', '.join(f'"{col}"' for col in STORE_KEY_COLS)
+        self.connection.executescript(f"""
+        CREATE TABLE IF NOT EXISTS ledger_runs (
+            run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_time TEXT NOT NULL,
+            ledger_file TEXT,
+            columns_json TEXT,
+            column_types_json TEXT,
+            row_count INTEGER,
+            finished INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_ledger_runs_time ON ledger_runs (finished, run_time);
+        CREATE TABLE IF NOT EXISTS ledger_rows (
+            run_id INTEGER NOT NULL,
+            {keys},
+            row_hash INTEGER,
+            row_json TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_ledger_rows_key ON ledger_rows (run_id, {key_index});
+        """)
+        # 旧版快照库没有列类型字段，补建后旧批次按未知类型处理
+        run_columns = [row[1] for row in self.connection.execute("PRAGMA table_info(ledger_runs)")]
+        if 'column_types_json' not in run_columns:
+            self.connection.execute("ALTER TABLE ledger_runs ADD COLUMN column_types_json TEXT")
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def begin_run(self, run_time, ledger_file=None):
+        """开始一个运行批次，返回用于分块写入的 StoreRun"""
+        cursor = self.connection.execute(
+            "INSERT INTO ledger_runs (run_time, ledger_file) VALUES (?, ?)",
+            (run_time.strftime(STORE_TIME_FORMAT), ledger_file)
+        )
+        return StoreRun(self, cursor.lastrowid)
+
+    def prune(self, keep_days):
+        """删除早于 keep_days 天的批次及未完成的批次，返回删除的批次数"""
+        cutoff = (datetime.now() - timedelta(days=keep_days)).strftime(STORE_TIME_FORMAT)
+        run_ids = [row[0] for row in self.connection.execute(
+            "SELECT run_id FROM ledger_runs WHERE run_time < ? OR finished = 0", (cutoff,)
+        )]
+        for run_id in run_ids:
+            self.connection.execute("DELETE FROM ledger_rows WHERE run_id = ?", (run_id,))
+            self.connection.execute("DELETE FROM ledger_runs WHERE run_id = ?", (run_id,))
+        self.connection.commit()
+        return len(run_ids)
+
+    def _run(self, where, params, order):
+        row = self.connection.execute(
+            f"SELECT run_id, run_time, ledger_file, columns_json, row_count, column_types_json FROM ledger_runs "
+            f"WHERE finished = 1 AND {where} ORDER BY run_time {order} LIMIT 1", params
+        ).fetchone()
+        if not row:
+            return None
+        return {'run_id': row[0], 'run_time': datetime.strptime(row[1], STORE_TIME_FORMAT),
+                'ledger_file': row[2], 'columns': json.loads(row[3]), 'row_count': row[4],
+                'column_types': json.loads(row[5]) if row[5] else {}}
+
+    def latest_run(self):
+        """最新的已完成批次，没有时返回 None"""
+        return self._run("1 = 1", (), 'DESC')
+
+    def closest_run(self, target_time, exclude_run_id):
+        """除 exclude_run_id 外离 target_time 最近的已完成批次（按时间索引前后各取一条比较）"""
+        target = target_time.strftime(STORE_TIME_FORMAT)
+        candidates = [
+            self._run("run_time <= ? AND run_id <> ?", (target, exclude_run_id), 'DESC'),
+            self._run("run_time >= ? AND run_id <> ?", (target, exclude_run_id), 'ASC'),
+        ]
+        candidates = [run for run in candidates if run]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda run: abs(run['run_time'] - target_time))
+
+    def _key_join(self, left, right):
+        return ' AND '.join(f'{left}."{col}" = {right}."{col}"' for col in STORE_KEY_COLS)
+
+    def _frame(self, rows, run):
+        return run_frame([row[0] for row in rows], run)
+
+    def _partition_filter(self, alias, partition):
+        """按分区列（主键首列，即基地）过滤的条件及参数，partition 为 None 时不过滤"""
+        if partition is None:
+            return '', ()
+        return f' AND {alias}."{STORE_KEY_COLS[0]}" = ?', (partition,)
+
+    def partitions(self, *runs):
+        """各批次中出现的分区值（基地），按批次顺序、批次内首次出现的顺序排列（与台账行顺序一致）"""
+        bases = {}
+        for run in runs:
+            for row in self.connection.execute(
+                f'SELECT "{STORE_KEY_COLS[0]}" FROM ledger_rows WHERE run_id = ? '
+                f'GROUP BY "{STORE_KEY_COLS[0]}" ORDER BY MIN(rowid)',
+                (run['run_id'],)
+            ):
+                bases.setdefault(row[0], None)
+        return list(bases)
+
+    def rows_not_in(self, run, other_run, partition=None):
+        """run 中有而 other_run 中没有的主键对应的行（新增 / 删除），可只取一个分区（基地）"""
+        condition, params = self._partition_filter('n', partition)
+        rows = self.connection.execute(f"""
+            SELECT n.row_json FROM ledger_rows n
+            WHERE n.run_id = ?{condition} AND NOT EXISTS (
+                SELECT 1 FROM ledger_rows o WHERE o.run_id = ? AND {self._key_join('o', 'n')}
+            )
+            ORDER BY n.rowid
+        """, (run['run_id'], *params, other_run['run_id'])).fetchall()
+        return self._frame(rows, run)
+
+    def iter_rows(self, run, batch_size=5000):
+        """
+        按主键顺序（沿主键索引，无需排序）分批读取批次的全部行，逐行产出 (主键元组, 行指纹, 行 JSON)，
+        内存中只保留当前一批。
+        """
+        key_select = ', '.join(f'"{col}"' for col in STORE_KEY_COLS)
+        cursor = self.connection.execute(
+            f"SELECT {key_select}, row_hash, row_json FROM ledger_rows WHERE run_id = ? ORDER BY {key_select}",
+            (run['run_id'],)
+        )
+        key_count = len(STORE_KEY_COLS)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row[:key_count], row[key_count], row[key_count + 1]
+        finally:
+            cursor.close()
+
+    def changed_rows(self, new_run, old_run, partition=None):
+        """
+        两个批次中主键相同但行指纹不同（或数值列类型不一致）的行，返回 (本期行, 基准行)，两者按主键一一对应；
+        重复主键取各自第一条（与按文件对比时一致）。可只取一个分区（基地）。
+        """
+        key_select = ', '.join(f'n."{col}"' for col in STORE_KEY_COLS)
+        condition, params = self._partition_filter('n', partition)
+        # 两个批次的数值列类型不一致时指纹不能说明取值文本相同，所有共同主键都做字段级对比
+        hash_condition = ' AND n.row_hash <> o.row_hash' if same_column_types(new_run, old_run) else ''
+        rows = self.connection.execute(f"""
+            SELECT {key_select}, n.row_json, o.row_json FROM ledger_rows n
+            JOIN ledger_rows o ON o.run_id = ? AND {self._key_join('o', 'n')}
+            WHERE n.run_id = ?{condition}{hash_condition}
+            ORDER BY n.rowid, o.rowid
+        """, (old_run['run_id'], new_run['run_id'], *params)).fetchall()
+        key_count = len(STORE_KEY_COLS)
+        seen = set()
+        new_rows, old_rows = [], []
+        for row in rows:
+            if row[:key_count] in seen:
+                continue
+            seen.add(row[:key_count])
+            new_rows.append((row[key_count],))
+            old_rows.append((row[key_count + 1],))
+        return self._frame(new_rows, new_run), self._frame(old_rows, old_run)
+
+
+class StoreRun:
+    """快照库中的一个运行批次：分块追加汇总数据，close() 时标记完成；出错时删除本批次并停止写入"""
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.row_count = 0
+        self.columns = None
+        self.column_types = {}
+        self.failed = False
+
+    def write(self, df):
+        """追加一个分块（需包含 STORE_KEY_COLS 各列）"""
+        if self.failed:
+            return
+        try:
+            if self.columns is None:
+                self.columns = [str(col) for col in df.columns]
+            self._track_column_types(df)
+            keys = [df[col].astype(object).where(df[col].notna(), '未知').map(str) for col in STORE_KEY_COLS]
+            value_columns = [col for col in df.columns if col not in STORE_KEY_COLS]
+            # 数值列统一按浮点计算指纹，分块各自的整数/浮点类型不影响指纹
+            values = df[value_columns].astype({col: 'float64' for col in value_columns
+                                               if df[col].dtype.kind in 'iuf'})
+            hashes = pd.util.hash_pandas_object(values, index=False).to_numpy().view(np.int64)
+            records = df.astype(object).where(df.notna(), None).to_dict('records')
+            self.store.connection.executemany(
+                f"INSERT INTO ledger_rows VALUES ({', '.join(['?'] * (len(STORE_KEY_COLS) + 3))})",
+                zip(itertools.repeat(self.run_id), *keys, hashes.tolist(),
+                    (json.dumps(record, ensure_ascii=False, default=str) for record in records))
+            )
+            self.row_count += len(df)
+        except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
+            print(f"⚠️ 快照库写入失败，已放弃本批次（Excel 导出不受影响）: {e}")
+            self.abort()
+
+    def _track_column_types(self, df):
+        """
+        按与 Parquet 快照相同的规则记录数值列在整个批次中的类型：首个分块确定整数/浮点，
+        整数列在任一分块中有空值时读回为浮点
+        """
+        for col in df.columns:
+            name = str(col)
+            kind = df[col].dtype.kind
+            if self.row_count == 0 and name not in self.column_types:
+                if kind in 'iu':
+                    self.column_types[name] = 'int'
+                elif kind == 'f':
+                    self.column_types[name] = 'float'
+            if self.column_types.get(name) == 'int' and kind not in 'iu':
+                values = pd.to_numeric(df[col], errors='coerce')
+                if values.isna().any() or (values % 1 != 0).any():
+                    self.column_types[name] = 'float'
+
+    def abort(self):
+        self.failed = True
+        self.store.connection.rollback()
+        self.store.connection.execute("DELETE FROM ledger_rows WHERE run_id = ?", (self.run_id,))
+        self.store.connection.execute("DELETE FROM ledger_runs WHERE run_id = ?", (self.run_id,))
+        self.store.connection.commit()
+
+    def close(self):
+        """标记批次完成并提交，返回是否写入成功"""
+        if self.failed:
+            return False
+        self.store.connection.execute(
+            "UPDATE ledger_runs SET columns_json = ?, column_types_json = ?, row_count = ?, finished = 1 "
+            "WHERE run_id = ?",
+            (json.dumps(self.columns or [], ensure_ascii=False), json.dumps(self.column_types, ensure_ascii=False),
+             self.row_count, self.run_id)
+        )
+        self.store.connection.commit()
+        return True
@@ -0,0 +1,145 @@
+import json
+import os
+import tempfile
+import time
+
+# LOAD DATA 默认转义规则（ESCAPED BY '\\'）下需要转义的字节，反斜杠需最先处理
+_ESCAPES = (
+    (b'\\', b'\\\\'),
+    (b'\t', b'\\t'),
+    (b'\n', b'\\n'),
+    (b'\r', b'\\r'),
+    (b'\x00', b'\\0'),
+)
+_NULL_FIELD = b'\\N'
+
+# 可选的本地库写入方式
+LOAD_BACKENDS = ('insert', 'load_data')
+
+
+def encode_field(value):
+    """将单个值编码为 LOAD DATA 文本字段（UTF-8 字节），None 写为 \\N"""
+    if value is None:
+        return _NULL_FIELD
+    if isinstance(value, bool):
+        value = int(value)
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        raw = bytes(value)
+    else:
+        raw = str(value).encode('utf-8')
+    for char, escaped in _ESCAPES:
+        if char in raw:
+            raw = raw.replace(char, escaped)
+    return raw
+
+
+def write_rows(fp, rows):
+    """将行数据以制表符分隔写入二进制文件对象，返回写入行数"""
+    count = 0
+    for row in rows:
+        fp.write(b'\t'.join(encode_field(value) for value in row))
+        fp.write(b'\n')
+        count += 1
+    return count
+
+
+def load_file(cursor, table, columns, path, replace=False):
+    """
+    以 LOAD DATA LOCAL INFILE 导入已按上述转义规则写好的 TSV 文件（UTF-8）。
+    连接需以 local_infile=True 建立，服务端需开启 local_infile。
+    replace=True 时按唯一键覆盖已有行（等价于增量同步的 upsert）。
+    """
+    columns_str = ', '.join([f"`{col}`" for col in columns])
+    cursor.execute(
+        f"LOAD DATA LOCAL INFILE %s {'REPLACE' if replace else ''} INTO TABLE `{table}` "
+        f"CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+        f"LINES TERMINATED BY '\\n' ({columns_str})",
+        (path.replace('\\', '/'),)
+    )
+
+
+def load_rows(cursor, table, columns, rows, replace=False):
+    """通过临时 TSV 文件 + LOAD DATA LOCAL INFILE 批量写入本地 MySQL，返回写入行数"""
+    fd, path = tempfile.mkstemp(prefix='bulk_load_', suffix='.tsv')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            count = write_rows(fp, rows)
+        if count > 0:
+            load_file(cursor, table, columns, path, replace=replace)
+        return count
+    finally:
+        os.remove(path)
+
+
+def benchmark(conn, row_count=100000, batch_size=5000):
+    """对比 executemany INSERT 与 LOAD DATA 两种写入方式的吞吐量（使用临时表与合成数据）"""
+    table = '_bulk_load_benchmark'
+    columns = ['id', 'tag_name', 'tag_desc', 'update_time']
+    rows = [
+        (str(i), f"TAG_{i:07d}", f"{i}号采集点\t描述\\含特殊字符\n第二行" if i % 10 == 0 else None,
+         '2025-01-01 08:40:00')
+        for i in range(row_count)
+    ]
+    placeholders = ', '.join(['%s'] * len(columns))
+    insert_sql = f"INSERT INTO `{table}` ({', '.join(columns)}) VALUES ({placeholders})"
+
+    results = {}
+    with conn.cursor() as cursor:
+        for backend in LOAD_BACKENDS:
+            cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+            cursor.execute(f"""
+            CREATE TABLE `{table}` (
+                `id` VARCHAR(200), `tag_name` VARCHAR(200), `tag_desc` TEXT, `update_time` VARCHAR(200)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+            """)
+            start = time.time()
+            for i in range(0, row_count, batch_size):
+                batch = rows[i:i + batch_size]
+                if backend == 'load_data':
+                    load_rows(cursor, table, columns, batch)
+                else:
+                    cursor.executemany(insert_sql, batch)
+            conn.commit()
+            elapsed = time.time() - start
+
+            # 校验写入结果，确保 NULL / 制表符 / 中文 原样落库
+            cursor.execute(f"SELECT COUNT(*), COUNT(`tag_desc`) FROM `{table}`")
+            total, non_null = cursor.fetchone()
+            cursor.execute(f"SELECT `tag_desc` FROM `{table}` WHERE `id` = '0'")
+            sample = cursor.fetchone()[0]
+            ok = total == row_count and non_null == (row_count + 9) // 10 and sample == rows[0][2]
+
+            results[backend] = elapsed
+            print(f"{backend:>9}: {row_count} 行, 耗时 {elapsed:.2f}秒, "
+                  f"{row_count / elapsed:.0f} 行/秒, 校验{'通过' if ok else '失败'}")
+        cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+
+    print(f"LOAD DATA 相对 INSERT 提速: {results['insert'] / results['load_data']:.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    # 基准测试：使用 1_copy_to_local_config.json 中的本地库配置
+    import pymysql
+
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '1_copy_to_local_config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        local_db = json.load(f)['local_database']
+
+    connection = pymysql.connect(
+        host=local_db['host'],
+        port=local_db['port'],
+        user=local_db['user'],
+        password=local_db['password'],
+        database=local_db['database'],
+        charset='utf8mb4',
+        local_infile=True
+    )
+    try:
+        benchmark(connection)
+    finally:
+        connection.close()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+# 本地库中缓存源表结构及目标表 DDL 的表
+SCHEMA_CACHE_TABLE = '0_表结构缓存'
+
+
+def build_create_sql(target_table, column_defs, key_defs=()):
+    """根据列定义（列名 -> 类型定义）和索引定义构建建表语句，统一字符集和校对规则"""
+    definitions = [f"`{name}` {definition}" for name, definition in column_defs.items()] + list(key_defs)
+    return f"""
+    CREATE TABLE `{target_table}` (
+        {', '.join(definitions)}
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+    """
+
+
+def ddl_hash(column_defs, key_defs=()):
+    """计算目标表 DDL 的哈希，列顺序、类型或索引任一变化都会改变哈希"""
+    payload = json.dumps([list(column_defs.items()), list(key_defs)], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def ensure_cache_table(cursor):
+    """确保表结构缓存表存在"""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS `{SCHEMA_CACHE_TABLE}` (
+        `source_key` VARCHAR(255) NOT NULL PRIMARY KEY,
+        `target_table` VARCHAR(255),
+        `schema_json` LONGTEXT,
+        `ddl_hash` CHAR(40),
+        `refreshed_at` DATETIME
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+    """)
+
+
+def load_schema_cache(cursor, source_key):
+    """
+    读取源表的结构缓存，不存在时返回 None。
+    返回 {'source_columns': 源表列信息, 'column_defs': 目标列定义, 'key_defs': 目标索引定义,
+          'ddl_hash': DDL 哈希, 'refreshed_at': 最近一次从源库刷新的时间}
+    """
+    cursor.execute(
+        f"SELECT `schema_json`, `ddl_hash`, `refreshed_at` FROM `{SCHEMA_CACHE_TABLE}` WHERE `source_key` = %s",
+        (source_key,)
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None
+    cache = json.loads(row[0])
+    cache['source_columns'] = [tuple(col) for col in cache['source_columns']]
+    cache['ddl_hash'] = row[1]
+    cache['refreshed_at'] = row[2]
+    return cache
+
+
+def save_schema_cache(cursor, source_key, target_table, source_columns, column_defs, key_defs=(),
+                      refreshed_at=None):
+    """写入源表结构缓存（source_columns 为源库返回的列信息，仅保存可 JSON 序列化的部分）"""
+    schema_json = json.dumps({
+        'source_columns': [[str(value) if value is not None else None for value in col] for col in source_columns],
+        'column_defs': column_defs,
+        'key_defs': list(key_defs),
+    }, ensure_ascii=False)
+    cursor.execute(
+        f"""
+        INSERT INTO `{SCHEMA_CACHE_TABLE}` (`source_key`, `target_table`, `schema_json`, `ddl_hash`, `refreshed_at`)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE `target_table` = VALUES(`target_table`),
+                                `schema_json` = VALUES(`schema_json`),
+                                `ddl_hash` = VALUES(`ddl_hash`),
+                                `refreshed_at` = VALUES(`refreshed_at`)
+        """,
+        (source_key, target_table, schema_json, ddl_hash(column_defs, key_defs), refreshed_at or datetime.now())
+    )
+
+
+def is_cache_fresh(cache, ttl_hours):
+    """缓存是否仍在有效期内（有效期内直接使用缓存的源表结构，不再查询源库）"""
+    if not cache or not ttl_hours or cache['refreshed_at'] is None:
+        return False
+    return datetime.now() - cache['refreshed_at'] < timedelta(hours=float(ttl_hours))
+
+
+def diff_column_definitions(old_defs, new_defs):
+    """对比新旧列定义，返回 ALTER TABLE 子句列表"""
+    clauses = [f"DROP COLUMN `{name}`" for name in old_defs if name not in new_defs]
+    for name, definition in new_defs.items():
+        if name not in old_defs:
+            clauses.append(f"ADD COLUMN `{name}` {definition}")
+        elif old_defs[name] != definition:
+            clauses.append(f"MODIFY COLUMN `{name}` {definition}")
+    return clauses
+
+
+def table_exists(cursor, table_name):
+    """检查当前库中是否存在指定表"""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+        (table_name,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def prepare_table(cursor, target_table, column_defs, key_defs=(), cache=None):
+    """
+    按缓存的 DDL 准备目标表，返回执行的动作：
+    truncate: DDL 未变化，仅清空数据；
+    alter: 仅列定义变化，清空后按差异 ALTER TABLE；
+    create: 无缓存、目标表不存在或索引定义变化，删表重建。
+    """
+    if cache and table_exists(cursor, target_table):
+        if cache['ddl_hash'] == ddl_hash(column_defs, key_defs):
+            cursor.execute(f"TRUNCATE TABLE `{target_table}`")
+            return 'truncate'
+        if cache['key_defs'] == list(key_defs):
+            # 先清空再 ALTER：空表上变更列类型无需转换旧数据
+            cursor.execute(f"TRUNCATE TABLE `{target_table}`")
+            clauses = diff_column_definitions(cache['column_defs'], column_defs)
+            if clauses:
+                cursor.execute(f"ALTER TABLE `{target_table}` {', '.join(clauses)}")
+            return 'alter'
+
+    cursor.execute(f"DROP TABLE IF EXISTS `{target_table}`")
+    cursor.execute(build_create_sql(target_table, column_defs, key_defs))
+    return 'create'
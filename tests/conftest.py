@@ -0,0 +1,21 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 各脚本之间按同目录模块导入（mysql_bulk_load / schema_cache / excel_export …）
+sys.path.insert(0, ROOT)
+
+_scripts = {}
+
+
+def load_script(filename):
+    """按文件名加载数字开头的脚本模块（不能直接 import）"""
+    if filename not in _scripts:
+        name = 'script_' + os.path.splitext(filename)[0].replace(' ', '_')
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        _scripts[filename] = module
+    return _scripts[filename]
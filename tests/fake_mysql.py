@@ -0,0 +1,156 @@
+"""
+1_copy_to_local.py 测试用的最小 MySQL 替身：只识别同步流程实际执行的语句，
+表数据保存在内存中，足以验证全量 / 增量同步及状态表的读写。
+"""
+import re
+from datetime import datetime
+
+
+class FakeTable:
+    def __init__(self, columns, unique_key=None, rows=None):
+        self.columns = list(columns)
+        self.unique_key = unique_key
+        self.rows = [dict(row) for row in rows or []]
+
+
+class FakeDatabase:
+    """一个库：tables 为 表名 -> FakeTable，state 为同步状态表（target_table -> 状态字段）"""
+
+    def __init__(self, state_table='0_同步状态表'):
+        self.state_table = state_table
+        self.tables = {}
+        self.state = {}
+        self.column_types = {}
+        self.executed = []
+        self.inserted = []
+
+    def connect(self, **kwargs):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _names(text):
+    return re.findall(r'`([^`]+)`', text)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def close(self):
+        pass
+
+    def fetchone(self):
+        return self._result.pop(0) if self._result else None
+
+    def fetchall(self):
+        result, self._result = self._result, []
+        return result
+
+    def fetchmany(self, size):
+        result, self._result = self._result[:size], self._result[size:]
+        return result
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.db.executed.append((sql, params))
+        db = self.db
+        self._result = []
+
+        if sql.startswith('SHOW COLUMNS FROM'):
+            table = db.tables[_names(sql)[0]]
+            self._result = [(col, db.column_types.get(col, 'varchar(64)'), 'YES', '', None, '')
+                            for col in table.columns]
+        elif sql.startswith(f'CREATE TABLE IF NOT EXISTS `{db.state_table}`'):
+            pass
+        elif sql.startswith('SELECT column_name FROM information_schema.columns'):
+            self._result = [(col,) for col in ('watermark', 'last_full_sync', 'fingerprint')]
+        elif sql.startswith('SELECT COUNT(*) FROM information_schema.statistics'):
+            table = db.tables.get(params[0])
+            self._result = [(1 if table and table.unique_key == params[1] else 0,)]
+        elif sql.startswith('SELECT DISTINCT index_name FROM information_schema.statistics'):
+            pass
+        elif sql.startswith('ALTER TABLE') and 'ADD INDEX' in sql:
+            pass
+        elif sql.startswith('SELECT COUNT(*) FROM information_schema.tables'):
+            self._result = [(1 if params[0] in db.tables else 0,)]
+        elif sql.startswith('SELECT COUNT(*), MAX('):
+            table = db.tables[_names(sql)[-1]]
+            column = _names(sql)[0]
+            values = [row[column] for row in table.rows if row[column] is not None]
+            self._result = [(len(table.rows), max(values) if values else None)]
+        elif sql.startswith(f'INSERT INTO `{db.state_table}`'):
+            columns = _names(sql.split(')')[0])[1:]
+            state = db.state.setdefault(params[0], {})
+            for col, value in zip(columns[1:], params[1:]):
+                # 水位 / 指纹列为 VARCHAR，datetime 按 MySQL 的文本格式保存
+                state[col] = str(value) if value is not None and col != 'last_full_sync' else value
+        elif sql.startswith('SELECT') and f'FROM `{db.state_table}`' in sql:
+            state = db.state.get(params[0])
+            if state is not None:
+                columns = _names(sql.split(' FROM ')[0])
+                self._result = [tuple(state.get(col) for col in columns)]
+        elif sql.startswith('DROP TABLE IF EXISTS'):
+            db.tables.pop(_names(sql)[0], None)
+        elif sql.startswith('CREATE TABLE'):
+            names = _names(sql)
+            unique = re.search(r'UNIQUE KEY `[^`]+` \(`([^`]+)`\)', sql)
+            columns = [name for name in names[1:] if not name.startswith('uk_')]
+            if unique:
+                columns.remove(unique.group(1))
+            db.tables[names[0]] = FakeTable(columns, unique.group(1) if unique else None)
+        elif sql.startswith('SELECT'):
+            # 源表读取：SELECT `a`, `b` FROM `t` [WHERE `col` >= %s]
+            select, rest = sql.split(' FROM ', 1)
+            columns = _names(select)
+            table = db.tables[_names(rest)[0]]
+            rows = table.rows
+            where = re.search(r'WHERE `([^`]+)` >= %s', rest)
+            if where:
+                rows = [row for row in rows
+                        if row[where.group(1)] is not None and str(row[where.group(1)]) >= str(params[0])]
+            self._result = [tuple(row[col] for col in columns) for row in rows]
+        else:
+            raise NotImplementedError(sql)
+
+    def executemany(self, sql, rows):
+        sql = ' '.join(sql.split())
+        match = re.match(r'INSERT INTO `([^`]+)` \(([^)]*)\)', sql)
+        table = self.db.tables[match.group(1)]
+        columns = _names(match.group(2))
+        for values in rows:
+            row = dict(zip(columns, values))
+            self.db.inserted.append((match.group(1), row))
+            if 'ON DUPLICATE KEY UPDATE' in sql and table.unique_key:
+                existing = [r for r in table.rows if r[table.unique_key] == row[table.unique_key]]
+                if existing:
+                    existing[0].update(row)
+                    continue
+            table.rows.append(row)
+
+
+def ts(text):
+    return datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,125 @@
+import pytest
+
+from conftest import load_script
+from fake_mysql import FakeDatabase, FakeTable, ts
+
+copy_to_local = load_script('1_copy_to_local.py')
+
+BASE = {'id': 1, 'name': '扬州'}
+TARGET = '1_采集点_1_扬州'
+
+
+@pytest.fixture
+def databases(monkeypatch):
+    source, local = FakeDatabase(), FakeDatabase()
+    source.tables['tag'] = FakeTable(['id', 'tag_name', 'update_time'], rows=[
+        {'id': 1, 'tag_name': 'A', 'update_time': ts('2025-01-01 08:00:00')},
+        {'id': 2, 'tag_name': 'B', 'update_time': ts('2025-01-02 08:00:00')},
+        {'id': 3, 'tag_name': 'C', 'update_time': ts('2025-01-03 08:00:00')},
+    ])
+    source.column_types = {'id': 'bigint', 'update_time': 'datetime'}
+
+    def connect(**kwargs):
+        return (local if kwargs['database'] == 'local' else source).connect(**kwargs)
+
+    monkeypatch.setattr(copy_to_local.pymysql, 'connect', connect)
+    return source, local
+
+
+def run_sync(**options):
+    sync_options = copy_to_local.get_sync_options({'sync_mode': 'incremental', **options})
+    local_db_config = {'host': 'local', 'port': 3306, 'user': 'u', 'password': 'p', 'database': 'local'}
+    copy_to_local.prepare_local_database(local_db_config, sync_options)
+    result = copy_to_local.sync_table(
+        BASE, {'host': 'src', 'port': 3306, 'user': 'u', 'password': 'p', 'database': 'src'},
+        {'tag': '1_采集点'}, local_db_config, sync_options
+    )
+    assert result['success'], result['error']
+    return result
+
+
+def is_incremental_run(source):
+    return any('WHERE `update_time` >= %s' in sql for sql, _ in source.executed)
+
+
+def test_save_sync_state_keeps_datetimes(databases):
+    _, local = databases
+    with local.connect().cursor() as cursor:
+        copy_to_local.save_sync_state(cursor, TARGET, watermark=ts('2025-01-03 08:00:00'),
+                                      last_full_sync=ts('2025-01-04 00:00:00'), fingerprint=None)
+        state = copy_to_local.load_sync_state(cursor, TARGET)
+    assert state == {'watermark': '2025-01-03 08:00:00', 'last_full_sync': ts('2025-01-04 00:00:00'),
+                     'fingerprint': None}
+
+
+def test_second_run_takes_incremental_path(databases):
+    source, local = databases
+    run_sync()
+    state = local.state[TARGET]
+    assert state['watermark'] == '2025-01-03 08:00:00'
+    assert state['last_full_sync'] is not None
+    assert not is_incremental_run(source)
+
+    local.executed.clear()
+    run_sync()
+    assert is_incremental_run(source)
+    assert not any(sql.startswith('DROP TABLE') for sql, _ in local.executed)
+
+
+def test_incremental_sync_copies_only_rows_from_watermark(databases):
+    source, local = databases
+    run_sync()
+    assert local.state[TARGET]['watermark'] == '2025-01-03 08:00:00'
+
+    # 源端：修改 id=2、新增 id=4，id=1 未变化
+    rows = source.tables['tag'].rows
+    rows[1].update(tag_name='B2', update_time=ts('2025-01-05 08:00:00'))
+    rows.append({'id': 4, 'tag_name': 'D', 'update_time': ts('2025-01-04 08:00:00')})
+
+    local.inserted.clear()
+    result = run_sync()
+
+    # 只复制水位（含边界行）之后的数据，按 id 覆盖写入
+    copied = sorted(row['id'] for _, row in local.inserted)
+    assert copied == ['2', '3', '4']
+    assert result['rows'] == 3
+    assert local.state[TARGET]['watermark'] == '2025-01-05 08:00:00'
+    target = sorted((row['id'], row['tag_name']) for row in local.tables[TARGET].rows)
+    assert target == [('1', 'A'), ('2', 'B2'), ('3', 'C'), ('4', 'D')]
+
+
+def test_skip_unchanged_still_applies_schema_changes(databases):
+    source, local = databases
+    run_sync(sync_mode='full', skip_unchanged=True)
+    run_sync(sync_mode='full', skip_unchanged=True)
+    assert TARGET in run_sync(sync_mode='full', skip_unchanged=True)['skipped']
+
+    # 行数与 MAX(update_time) 不变，但源表新增一列：不能跳过
+    source.tables['tag'].columns.append('tag_desc')
+    for row in source.tables['tag'].rows:
+        row['tag_desc'] = None
+    result = run_sync(sync_mode='full', skip_unchanged=True)
+    assert result['skipped'] == []
+    assert 'tag_desc' in local.tables[TARGET].columns
+
+    # 切换 schema_mode 同样不能跳过
+    result = run_sync(sync_mode='full', skip_unchanged=True, schema_mode='typed')
+    assert result['skipped'] == []
+
+
+def test_state_table_is_prepared_once_before_workers(databases, monkeypatch):
+    calls = []
+    ensure_state_table = copy_to_local.ensure_state_table
+    monkeypatch.setattr(copy_to_local, 'ensure_state_table',
+                        lambda cursor: calls.append(cursor) or ensure_state_table(cursor))
+    monkeypatch.setattr(copy_to_local, 'load_config', lambda: {
+        'bases': [BASE, {'id': 2, 'name': '东台'}],
+        'common_db_config': {'host': 'src', 'port': 3306, 'user': 'u', 'password': 'p', 'database': 'src'},
+        'table_mappings': {'tag': '1_采集点'},
+        'local_database': {'host': 'local', 'port': 3306, 'user': 'u', 'password': 'p', 'database': 'local'},
+        'sync_mode': 'incremental', 'max_workers': 2,
+    })
+    copy_to_local.main()
+    # 两个基地并发同步，状态表只在启动前准备一次
+    assert len(calls) == 1
+    assert {'1_采集点_1_扬州', '1_采集点_2_东台'} <= set(databases[1].state)
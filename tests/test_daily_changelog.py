@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from conftest import load_script
+from ledger_snapshot import SnapshotWriter, read_snapshot
+
+changelog = load_script('6_daily_changelog.py')
+KEY_COLS = changelog.KEY_COLS
+
+
+def diff_modified_loop(df_new_idx, df_old_idx, common_indices):
+    """向量化之前逐行逐列比较的实现，作为对照"""
+    compare_columns = [c for c in df_new_idx.columns]
+    modified_rows = []
+    for idx in common_indices:
+        row_new = df_new_idx.loc[idx]
+        row_old = df_old_idx.loc[idx]
+        for col in compare_columns:
+            if col not in row_old:
+                continue
+            val_new = row_new[col]
+            val_old = row_old[col]
+            if pd.isna(val_new) and pd.isna(val_old):
+                continue
+            if str(val_new) != str(val_old):
+                record = {key_name: idx[i] for i, key_name in enumerate(KEY_COLS)}
+                record.update({
+                    '变更类型': '修改',
+                    '变更字段': col,
+                    '旧值': val_old,
+                    '新值': val_new,
+                    '更新人': row_new.get('更新人', ''),
+                    '更新时间': row_new.get('更新时间', '')
+                })
+                modified_rows.append(record)
+    return pd.DataFrame(modified_rows)
+
+
+def make_frames():
+    old = pd.DataFrame({
+        '基地': ['扬州', '扬州', '东台', '东台', '东台'],
+        '聚合名称': ['G1', 'G1', 'G2', 'G2', 'G3'],
+        '采集点ID': ['1', '2', '3', '4', '5'],
+        '数值': [1.0, np.nan, 3.0, np.nan, 5.0],
+        '描述': ['a', None, 'c', None, 'e'],
+        '混合': pd.Series([1, '1', 2.5, None, 'x'], dtype=object),
+        '仅旧表': ['o1', 'o2', 'o3', 'o4', 'o5'],
+        '更新人': ['u1', 'u1', 'u2', 'u2', 'u3'],
+        '更新时间': ['2025-01-01'] * 5,
+    })
+    new = old.drop(columns='仅旧表').copy()
+    new['仅新表'] = 1
+    new.loc[0, '数值'] = 9.0                 # 数值变化
+    new.loc[1, '数值'] = 2.0                 # 空 -> 有值
+    new.loc[2, '描述'] = None                # 有值 -> 空
+    new['混合'] = pd.Series(['1', 1, '2.5', np.nan, 'x'], dtype=object)   # 数字 / 文本互换
+    new.loc[4, '更新人'] = 'u9'
+    # 第 4 行（东台/G2/4）只有 None -> NaN，不算变化
+    return new, old
+
+
+def test_diff_modified_matches_row_loop():
+    new, old = make_frames()
+    new_idx = new.set_index(KEY_COLS)
+    old_idx = old.set_index(KEY_COLS)
+    common = new_idx.index.intersection(old_idx.index)
+
+    expected = diff_modified_loop(new_idx, old_idx, common)
+    actual = changelog.diff_modified(new_idx, old_idx, common)
+
+    assert list(actual.columns) == list(expected.columns)
+    assert len(actual) == len(expected) > 0
+    # 逐单元格比较：都为空，或文本一致
+    for col in expected.columns:
+        for value_expected, value_actual in zip(expected[col], actual[col]):
+            assert (pd.isna(value_expected) and pd.isna(value_actual)) or str(value_expected) == str(value_actual)
+    # 未变化的行不产生记录
+    assert '4' not in set(actual['采集点ID'])
+
+
+def test_store_and_file_sources_give_the_same_diff(tmp_path):
+    def ledger(base, values):
+        return pd.DataFrame({'基地': base, '聚合名称': 'G', '采集点ID': ['1', '2'], '数值': values,
+                             '名称': [f'{base}1', f'{base}2']})
+
+    # 首日整数列在东台分块中有空值，次日没有：Parquet 快照读回分别为浮点 / 整数
+    runs = [(datetime(2025, 1, 1, 8, 40), [ledger('扬州', [1, 2]), ledger('东台', [1.0, np.nan])]),
+            (datetime(2025, 1, 2, 8, 40), [ledger('扬州', [1, 9]), ledger('东台', [1, 2])]),
+            (datetime(2025, 1, 3, 8, 40), [ledger('扬州', [1, 9]), ledger('东台', [1, 3]).assign(名称='x')])]
+    path = str(tmp_path / 'store.sqlite')
+    store = changelog.LedgerStore(path)
+    frames = []
+    try:
+        for run_time, chunks in runs:
+            run = store.begin_run(run_time)
+            snapshot = SnapshotWriter(str(tmp_path / f'{run_time:%Y%m%d}.xlsx'), changelog.TARGET_SHEET)
+            for chunk in chunks:
+                run.write(chunk)
+                snapshot.write(chunk)
+            run.close()
+            frames.append(read_snapshot(snapshot.close().replace('.parquet', '.xlsx')).set_index(KEY_COLS))
+        store_runs = [store.closest_run(run_time, 0) for run_time, _ in runs]
+    finally:
+        store.close()
+
+    diffs = []
+    for (old_run, new_run), (old_idx, new_idx) in zip(zip(store_runs, store_runs[1:]), zip(frames, frames[1:])):
+        _, _, from_store = changelog.run_partitions(
+            changelog.compare_store_partition, [(base, path, new_run, old_run) for base in ['扬州', '东台']])
+        from_file = changelog.diff_modified(new_idx, old_idx, new_idx.index.intersection(old_idx.index))
+        assert from_store.astype(str).equals(from_file.astype(str))
+        diffs.append(from_file)
+
+    # 首日到次日数值列由浮点变为整数，按文本对比 1.0 与 1 不同；次日到第三日类型一致，按行指纹筛选
+    assert [str(value) for value in diffs[0]['旧值']] == ['1.0', '2.0', '1.0', 'nan']
+    assert [str(value) for value in diffs[1]['新值']] == ['x', '3', 'x']
+
+
+def test_diff_modified_without_changes_is_empty():
+    new, _ = make_frames()
+    new_idx = new.set_index(KEY_COLS)
+    assert changelog.diff_modified(new_idx, new_idx.copy(), new_idx.index).empty
+
+
+def test_store_partitions_follow_ledger_order(tmp_path):
+    store = changelog.LedgerStore(str(tmp_path / 'store.sqlite'))
+    try:
+        for run_time, bases in ((datetime(2025, 1, 1, 8, 40), ['东台', '扬州', '金坛']),
+                                (datetime(2025, 1, 2, 8, 40), ['扬州', '东台', '盐城'])):
+            run = store.begin_run(run_time)
+            run.write(pd.DataFrame({'基地': bases, '聚合名称': 'G', '采集点ID': '1', '数值': 1.0}))
+            run.close()
+        new_run = store.latest_run()
+        old_run = store.closest_run(datetime(2025, 1, 1, 8, 40), new_run['run_id'])
+        # 本期首次出现的顺序在前，只在基准中出现的基地排在最后
+        assert store.partitions(new_run, old_run) == ['扬州', '东台', '盐城', '金坛']
+    finally:
+        store.close()
+
+    df_added, df_removed, _ = changelog.run_partitions(
+        changelog.compare_store_partition,
+        [(base, str(tmp_path / 'store.sqlite'), new_run, old_run) for base in ['扬州', '东台', '盐城', '金坛']])
+    assert list(df_added['基地']) == ['盐城']
+    assert list(df_removed['基地']) == ['金坛']
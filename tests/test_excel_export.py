@@ -0,0 +1,86 @@
+import importlib
+
+import openpyxl
+import pandas as pd
+import pytest
+import xlsxwriter
+
+import excel_export
+
+
+def write_sheets(path, frames, **options):
+    workbook = excel_export.create_workbook(str(path))
+    try:
+        sheets = {name: excel_export.ShardedSheet(workbook, name, **options) for name in frames}
+        for name, df in frames.items():
+            sheets[name].write_frame(df)
+            sheets[name].close()
+        excel_export.write_shard_index(workbook, list(sheets.values()))
+    finally:
+        workbook.close()
+    return sheets
+
+
+def frame(rows):
+    return pd.DataFrame({'基地': ['扬州'] * rows, '采集点ID': [str(i) for i in range(rows)]})
+
+
+def test_table_range_covers_streamed_rows(tmp_path):
+    path = tmp_path / 'table.xlsx'
+    write_sheets(path, {'有数据': frame(5), '无数据': frame(0)}, table_style='Table Style Light 11')
+
+    book = openpyxl.load_workbook(path)
+    table = next(iter(book['有数据'].tables.values()))
+    assert table.ref == 'A1:B6'
+    assert table.autoFilter.ref == 'A1:B6'
+    assert [cell.value for cell in book['有数据'][1]] == ['基地', '采集点ID']
+    # 无数据时表格保留“表头 + 1 空行”
+    assert next(iter(book['无数据'].tables.values())).ref == 'A1:B2'
+
+
+def test_shards_keep_first_sheet_name(tmp_path):
+    path = tmp_path / 'shards.xlsx'
+    sheets = write_sheets(path, {'汇总': frame(5)}, max_rows=2, table_style='Table Style Medium 16')
+
+    book = openpyxl.load_workbook(path)
+    assert book.sheetnames == ['汇总', '汇总_2', '汇总_3', excel_export.SHARD_INDEX_SHEET]
+    assert sheets['汇总'].ranges() == [('汇总', 1, 2), ('汇总_2', 3, 4), ('汇总_3', 5, 5)]
+    assert next(iter(book['汇总_3'].tables.values())).ref == 'A1:B2'
+
+    df = excel_export.read_sharded_sheet(path, '汇总')
+    assert list(df['采集点ID'].astype(str)) == [str(i) for i in range(5)]
+
+
+
+def test_shard_index_reports_only_sharded_sheets(tmp_path):
+    workbook = excel_export.create_workbook(str(tmp_path / 'index.xlsx'))
+    try:
+        sheets = [excel_export.ShardedSheet(workbook, name, max_rows=2) for name in ('扬州', '汇总')]
+        for sheet, rows in zip(sheets, (5, 2)):
+            sheet.write_frame(frame(rows))
+            sheet.close()
+        assert excel_export.write_shard_index(workbook, sheets[1:]) == []
+        sharded = excel_export.write_shard_index(workbook, sheets)
+    finally:
+        workbook.close()
+    assert [sheet.name for sheet in sharded] == ['扬州']
+
+def test_strings_are_written_verbatim(tmp_path):
+    # 超过单个工作表 65,530 个 URL 的上限，且含 '=' 开头的文本
+    urls = [f'http://host/api/{i}' for i in range(70000)]
+    values = urls + ['=1+1', 'mailto:a@b.c']
+    path = tmp_path / 'strings.xlsx'
+    write_sheets(path, {'汇总': pd.DataFrame({'接口URL': values})})
+
+    book = openpyxl.load_workbook(path, read_only=True)
+    cells = [row[0] for row in book['汇总'].iter_rows(min_row=2, values_only=True)]
+    book.close()
+    assert cells == values
+
+
+def test_rejects_unverified_xlsxwriter(monkeypatch):
+    monkeypatch.setattr(xlsxwriter, '__version__', '9.9.9')
+    with pytest.raises(ImportError, match='xlsxwriter==3.2.9'):
+        importlib.reload(excel_export)
+    monkeypatch.undo()
+    importlib.reload(excel_export)
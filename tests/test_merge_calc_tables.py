@@ -0,0 +1,100 @@
+import json
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from conftest import load_script
+from ledger_snapshot import LedgerStore
+
+merge_calc = load_script('4_merge_calc_tables.py')
+
+
+@pytest.fixture
+def export_env(tmp_path, monkeypatch):
+    monkeypatch.setattr(merge_calc, 'output_directory', str(tmp_path))
+    monkeypatch.setattr(merge_calc, 'snapshot_store', str(tmp_path / 'ledger_snapshots.sqlite'))
+    monkeypatch.setattr(merge_calc, 'aggregator_config_path', str(tmp_path / 'aggregator_config.json'))
+    monkeypatch.setattr(merge_calc, 'tables', ['1_汇总表_1_扬州', '1_汇总表_2_东台'])
+    monkeypatch.setattr(merge_calc, 'storage_mode', 'per_base')
+    return tmp_path
+
+
+def frame(base):
+    return pd.DataFrame({'基地': [base], '聚合名称': ['G'], '采集点ID': ['1']})
+
+
+def store_runs(tmp_path):
+    store = LedgerStore(str(tmp_path / 'ledger_snapshots.sqlite'))
+    try:
+        return store.connection.execute("SELECT COUNT(*) FROM ledger_runs").fetchone()[0]
+    finally:
+        store.close()
+
+
+def test_storage_mode_follows_aggregator_config(export_env):
+    (export_env / 'aggregator_config.json').write_text(
+        json.dumps({'storage_mode': 'partitioned', 'unified_table_name': '汇总_统一'}), encoding='utf-8')
+    merge_calc.load_storage_settings()
+    assert (merge_calc.storage_mode, merge_calc.unified_table) == ('partitioned', '汇总_统一')
+
+
+def unified_chunk(base_id, base, rows):
+    df = frame(base)
+    return pd.concat([df] * rows, ignore_index=True).assign(采集点ID=[str(i) for i in range(rows)], base_id=base_id)
+
+
+def test_unified_table_is_split_chunk_by_chunk(export_env, monkeypatch):
+    monkeypatch.setattr(merge_calc, 'storage_mode', 'partitioned')
+    # 东台 跨两个分块，扬州 与 东台 共用一个分块
+    chunks = [unified_chunk(1, '扬州', 2), pd.concat([unified_chunk(1, '扬州', 1), unified_chunk(2, '东台', 2)]),
+              unified_chunk(2, '东台', 1)]
+    monkeypatch.setattr(merge_calc, 'read_unified_chunks', lambda engine: iter(chunks))
+
+    pieces = [(table, [len(df) for df in dfs]) for table, dfs in merge_calc.read_unified_table(None)]
+    assert pieces == [('1_汇总表_1_扬州', [2, 1]), ('1_汇总表_2_东台', [2, 1])]
+
+    filepath = merge_calc.export_tables_to_excel()
+    book = openpyxl.load_workbook(filepath, read_only=True)
+    assert {name: book[name].max_row for name in ('扬州', '东台', '汇总')} == {'扬州': 4, '东台': 4, '汇总': 7}
+    book.close()
+    assert store_runs(export_env) == 1
+
+
+def test_failed_unified_read_keeps_no_store_run(export_env, monkeypatch):
+    monkeypatch.setattr(merge_calc, 'storage_mode', 'partitioned')
+
+    def read_unified_chunks(engine):
+        yield unified_chunk(1, '扬州', 2)
+        raise RuntimeError('connection lost')
+
+    monkeypatch.setattr(merge_calc, 'read_unified_chunks', read_unified_chunks)
+    with pytest.raises(RuntimeError):
+        merge_calc.export_tables_to_excel()
+    assert store_runs(export_env) == 0
+
+
+def test_failed_base_discards_snapshot_and_store_run(export_env, monkeypatch):
+    def failing_chunks():
+        raise RuntimeError('table missing')
+        yield
+
+    def read_per_base_tables(engine):
+        yield '1_汇总表_1_扬州', [frame('扬州')]
+        yield '1_汇总表_2_东台', failing_chunks()
+
+    monkeypatch.setattr(merge_calc, 'read_per_base_tables', read_per_base_tables)
+    filepath = merge_calc.export_tables_to_excel()
+    assert filepath and (export_env / filepath).exists()
+    assert store_runs(export_env) == 0
+    assert not list(export_env.glob('*.parquet'))
+
+
+def test_complete_export_appends_store_run(export_env, monkeypatch):
+    def read_per_base_tables(engine):
+        yield '1_汇总表_1_扬州', [frame('扬州')]
+        yield '1_汇总表_2_东台', [frame('东台')]
+
+    monkeypatch.setattr(merge_calc, 'read_per_base_tables', read_per_base_tables)
+    merge_calc.export_tables_to_excel()
+    assert store_runs(export_env) == 1
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from conftest import load_script
+
+merge_tables = load_script('3_merge_tables.py')
+
+POINT, DEVICE, SOURCE = 'a采集点表_1_扬州', 'f设备表_1_扬州', 'g数据源表_1_扬州'
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine('sqlite://')
+    with engine.connect() as conn:
+        pd.DataFrame({
+            'id': [1, 2, 3], 'tag_name': ['t1', 't2', 't3'], 'tag_code': ['c1', 'c2', 'c3'],
+            'tag_desc': ['d1', None, 'd3'], 'ori_tag_name': ['o1', 'o2', 'o3'], 'equipment_id': [10, 20, None],
+            'general_attribute': ['g', 'g', 'g'], 'business_attribute': ['b', 'b', 'b'],
+            'classification': ['x', 'y', 'z'], 'verify_status': [1, 0, 1], 'device_id': [100, 999, 100],
+        }).to_sql(POINT, conn, index=False)
+        pd.DataFrame({'id': [10], **{col: [f'{col}_10'] for col in merge_tables.DEVICE_COLUMNS}}).to_sql(
+            DEVICE, conn, index=False)
+        pd.DataFrame({'id': [100], 'device_name': ['源100']}).to_sql(SOURCE, conn, index=False)
+        yield conn
+
+
+def table_schema(conn, table):
+    return [(row[1], row[2]) for row in conn.execute(text(f"PRAGMA table_info(`{table}`)"))]
+
+
+def test_both_join_locations_persist_the_same_table(conn):
+    merge_tables.create_merged_table(conn, POINT, DEVICE, SOURCE, 'merged_db')
+    df_db = pd.concat(merge_tables.read_merged_table(conn, 'merged_db', 2), ignore_index=True)
+
+    df_memory, merged = merge_tables.join_in_memory(conn, POINT, DEVICE, SOURCE)
+    merge_tables.persist_merged_frame(conn, merged, POINT, DEVICE, SOURCE, 'merged_memory')
+
+    assert table_schema(conn, 'merged_memory') == table_schema(conn, 'merged_db')
+    assert [name for name, _ in table_schema(conn, 'merged_db')] == \
+        [alias for _, alias in merge_tables.MERGED_TABLE_COLUMNS]
+
+    rows = {table: pd.read_sql(text(f"SELECT * FROM `{table}` ORDER BY point_id"), conn)
+            for table in ('merged_db', 'merged_memory')}
+    assert rows['merged_memory'].astype(str).equals(rows['merged_db'].astype(str))
+
+    # 两种方式导出的数据一致
+    assert list(df_memory.columns) == list(df_db.columns) == merge_tables.keep_cols
+    assert df_memory.astype(str).equals(df_db.astype(str))
+
+
+def test_merged_table_is_exported_chunk_by_chunk(conn, tmp_path):
+    merge_tables.create_merged_table(conn, POINT, DEVICE, SOURCE, 'merged_db')
+    chunks = list(merge_tables.read_merged_table(conn, 'merged_db', 2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+    chunk_file = str(tmp_path / 'base.chunks.pkl')
+    rows = merge_tables.write_base_excel(iter(chunks), str(tmp_path / 'base.xlsx'), chunk_file)
+    assert rows == 3
+
+    # 中间文件按写入顺序逐块读回
+    restored = list(merge_tables.iter_chunk_file(chunk_file))
+    assert [len(chunk) for chunk in restored] == [2, 1]
+    assert pd.concat(restored, ignore_index=True).astype(str).equals(
+        pd.concat(chunks, ignore_index=True).astype(str))
+    assert len(pd.read_excel(str(tmp_path / 'base.xlsx'))) == 3
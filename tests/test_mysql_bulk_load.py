@@ -0,0 +1,62 @@
+import io
+import re
+
+import mysql_bulk_load
+
+# LOAD DATA 按 ESCAPED BY '\\' 读取字段时的反转义
+_UNESCAPES = {b'\\\\': b'\\', b'\\t': b'\t', b'\\n': b'\n', b'\\r': b'\r', b'\\0': b'\x00'}
+
+
+def decode_line(line):
+    """按 MySQL 的规则还原一行 TSV 字段（\\N 为 NULL）"""
+    return [None if field == b'\\N' else re.sub(rb'\\.', lambda m: _UNESCAPES[m.group()], field).decode('utf-8')
+            for field in line.split(b'\t')]
+
+
+class RecordingCursor:
+    """记录 LOAD DATA 语句，并在执行时读取临时文件内容"""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, sql, params):
+        with open(params[0], 'rb') as f:
+            self.executed.append((sql, f.read()))
+
+
+def test_encode_field_escapes_special_bytes():
+    assert mysql_bulk_load.encode_field(None) == b'\\N'
+    assert mysql_bulk_load.encode_field('a\tb\nc\\d') == b'a\\tb\\nc\\\\d'
+    # 反斜杠先于其他字符转义，已有的 "\t" 文本不会被误还原为制表符
+    assert mysql_bulk_load.encode_field('\\t') == b'\\\\t'
+    assert mysql_bulk_load.encode_field('\\N') == b'\\\\N'
+    assert mysql_bulk_load.encode_field('行1\r\n\x00') == '行1'.encode('utf-8') + b'\\r\\n\\0'
+    assert mysql_bulk_load.encode_field(True) == b'1'
+    assert mysql_bulk_load.encode_field(b'x\ty') == b'x\\ty'
+    assert mysql_bulk_load.encode_field({'k': '值'}) == '{"k": "值"}'.encode('utf-8')
+
+
+def test_written_rows_round_trip():
+    rows = [('1', 'TAG\t1', '第一行\n第二行\\结尾', None), ('2', '', '\\N', 'None')]
+    fp = io.BytesIO()
+    assert mysql_bulk_load.write_rows(fp, rows) == 2
+
+    data = fp.getvalue()
+    assert data == (b'1\tTAG\\t1\t' + '第一行\\n第二行\\\\结尾'.encode('utf-8') + b'\t\\N\n'
+                    b'2\t\t\\\\N\tNone\n')
+    assert [decode_line(line) for line in data.split(b'\n')[:-1]] == [list(row) for row in rows]
+
+
+def test_load_rows_loads_escaped_file():
+    cursor = RecordingCursor()
+    assert mysql_bulk_load.load_rows(cursor, 'dst', ['id', 'tag_desc'], [('1', 'a\tb'), ('2', None)],
+                                     replace=True) == 2
+
+    (sql, data), = cursor.executed
+    assert "REPLACE INTO TABLE `dst`" in sql
+    assert "ESCAPED BY '\\\\'" in sql
+    assert "(`id`, `tag_desc`)" in sql
+    assert data == b'1\ta\\tb\n2\t\\N\n'
+    # 没有行时不执行 LOAD DATA
+    assert mysql_bulk_load.load_rows(cursor, 'dst', ['id'], []) == 0
+    assert len(cursor.executed) == 1
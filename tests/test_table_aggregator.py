@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+from conftest import load_script
+
+aggregator = load_script('2_table_aggregator.py')
+
+TABLES = {alias: alias for alias in ('c', 'a', 'b', 'f')}
+
+
+class SqliteCursor:
+    """以 sqlite3 执行 MySQL 风格（%s 占位符、反引号）的查询"""
+
+    def __init__(self, connection):
+        self.cursor = connection.cursor()
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql.replace('%s', '?'), params)
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+@pytest.fixture
+def cursor():
+    connection = sqlite3.connect(':memory:')
+    connection.executescript("""
+    CREATE TABLE c (id INTEGER, tag_id INTEGER, aggregation_relation_id INTEGER, update_time TEXT);
+    CREATE TABLE a (id INTEGER, equipment_id INTEGER, update_time TEXT);
+    CREATE TABLE b (id INTEGER, update_time TEXT);
+    CREATE TABLE f (id INTEGER, update_time TEXT);
+    CREATE TABLE s (tag INTEGER);
+    -- 采集点 1 关联两个聚合关系；采集点 9 长期关联不到 a 表（且早于各表水位，不会作为水位边界行重算）
+    INSERT INTO c VALUES (1, 1, 10, '2025-01-01'), (2, 1, 20, '2025-01-01'), (3, 9, NULL, '2024-12-01');
+    INSERT INTO a VALUES (1, 100, '2025-01-01');
+    INSERT INTO b VALUES (10, '2025-01-01'), (20, '2025-01-01');
+    INSERT INTO f VALUES (100, '2025-01-01');
+    INSERT INTO s VALUES (1), (1), (9);
+    """)
+    yield SqliteCursor(connection)
+    connection.close()
+
+
+def stats(cursor):
+    schemas = {table: [('id', ''), ('update_time', '')] for table in TABLES.values()}
+    return aggregator.collect_source_stats(cursor, TABLES, schemas)
+
+
+def refresh_reason(previous, current, deleted):
+    state = {'plan_hash': 'h', 'source_stats': previous, 'summary_rows': 3,
+             'last_full_refresh': aggregator.datetime.now()}
+    return aggregator.get_full_refresh_reason({}, state, 'h', current, 3, 'tag', deleted)
+
+
+def changed_tags(cursor, previous, deleted):
+    sql, params = aggregator.build_changed_tags_sql(TABLES, previous, 's', '', 'tag', deleted)
+    cursor.execute(sql, params)
+    return sorted(row[0] for row in cursor.fetchall())
+
+
+def test_c_delete_offset_by_insert_forces_full_refresh(cursor):
+    previous = stats(cursor)
+    # 删除 (1, R20) 并新增一行：c 表行数不变、采集点 1 仍存在、无 update_time 变化指向采集点 1
+    cursor.execute("DELETE FROM c WHERE id = 2")
+    cursor.execute("INSERT INTO c VALUES (4, 5, 10, '2025-01-02')")
+    current = stats(cursor)
+    assert current['c'][0] == previous['c'][0]
+
+    deleted = aggregator.detect_deleted_tables(cursor, TABLES, previous, current)
+    assert deleted == {'c'}
+    assert refresh_reason(previous, current, deleted) == "c表有删除"
+
+
+def test_updates_and_inserts_are_not_deletes(cursor):
+    previous = stats(cursor)
+    cursor.execute("UPDATE c SET aggregation_relation_id = 20, update_time = '2025-01-02' WHERE id = 1")
+    cursor.execute("INSERT INTO a VALUES (2, NULL, '2025-01-02')")
+    current = stats(cursor)
+
+    deleted = aggregator.detect_deleted_tables(cursor, TABLES, previous, current)
+    assert deleted == set()
+    assert refresh_reason(previous, current, deleted) is None
+    # 长期关联不到 a 表的采集点 9 不参与重算
+    assert changed_tags(cursor, previous, deleted) == [1]
+
+
+def test_a_delete_recomputes_referencing_tags(cursor):
+    previous = stats(cursor)
+    cursor.execute("DELETE FROM a WHERE id = 1")
+    cursor.execute("INSERT INTO a VALUES (2, NULL, '2025-01-02')")
+    current = stats(cursor)
+
+    deleted = aggregator.detect_deleted_tables(cursor, TABLES, previous, current)
+    assert deleted == {'a'}
+    assert refresh_reason(previous, current, deleted) is None
+    assert changed_tags(cursor, previous, deleted) == [1, 9]
+
+
+def test_previous_state_without_max_id_falls_back_to_row_count(cursor):
+    previous = {alias: value[:2] for alias, value in stats(cursor).items()}
+    cursor.execute("DELETE FROM c WHERE id = 2")
+    assert aggregator.detect_deleted_tables(cursor, TABLES, previous, stats(cursor)) == {'c'}